@@ -1,4 +1,5 @@
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 import os
 import dj_database_url  # Install this if not already installed
 from dotenv import load_dotenv
@@ -30,12 +31,14 @@ INSTALLED_APPS = [
 
 # Middleware
 MIDDLEWARE = [
+    "breiflyplatform.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "breiflyplatform.user_context.UserContextMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -46,7 +49,7 @@ ROOT_URLCONF = "breifly.urls"
 # Templates
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "breiflyplatform.template_backend.InstrumentedDjangoTemplates",  # Times renders for metrics.py
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -64,14 +67,137 @@ TEMPLATES = [
 WSGI_APPLICATION = "breifly.wsgi.application"
 
 # Database (Use Render Environment Variables)
+# Connections are kept open between requests for DB_CONN_MAX_AGE seconds (0 closes
+# them after every request) and checked before being reused. DB_POOL=True uses a
+# psycopg 3 pool instead (needs psycopg[pool]); prefer it under ASGI, where
+# persistent connections aren't reused across requests.
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "60"))  # seconds
+DB_CONN_HEALTH_CHECKS = os.environ.get("DB_CONN_HEALTH_CHECKS", "True") == "True"
+DB_POOL = os.environ.get("DB_POOL", "False") == "True"
+
 DATABASES = {
-    "default": dj_database_url.config(default=os.environ.get("DATABASE_URL"))
+    "default": dj_database_url.config(
+        default=os.environ.get("DATABASE_URL"),
+        conn_max_age=0 if DB_POOL else DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
+    ),
+    # Background job bookkeeping, kept off the main database connection (see breiflyplatform/routers.py).
+    # The default SQLite file, like the uploads under MEDIA_ROOT, is local to one host: deployments
+    # running several instances must set JOBS_DATABASE_URL to a shared database and keep MEDIA_ROOT
+    # on shared storage, or a job queued on one instance can't be run or recovered by another.
+    "jobs": dj_database_url.parse(
+        os.environ.get("JOBS_DATABASE_URL", f"sqlite:///{BASE_DIR / 'jobs.sqlite3'}")
+    ),
+}
+DATABASE_ROUTERS = ["breiflyplatform.routers.JobsRouter"]
+if DB_POOL:
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),  # seconds to wait for a free connection
+    }
+# Needed behind PgBouncer / the Supabase transaction pooler (port 6543)
+DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = os.environ.get("DB_DISABLE_SERVER_SIDE_CURSORS", "False") == "True"
+# Same backend, timing connection setup (see breiflyplatform/connection_metrics.py)
+if DATABASES["default"].get("ENGINE") == "django.db.backends.postgresql":
+    DATABASES["default"]["ENGINE"] = "breiflyplatform.db.postgresql"
+
+# Cache (per-process by default; point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached so invalidations reach every worker)
+SHARED_CACHE_BACKENDS = (
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+)
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "breifly-default"),
+    }
+}
+# Roles are memoized across requests (see breiflyplatform/authorization.py) only when
+# the default cache is shared: a role change deletes the entry there, which a
+# per-process cache would only do in the worker that handled it
+ROLE_CACHE_SHARED = CACHES["default"]["BACKEND"] in SHARED_CACHE_BACKENDS
+ROLE_CACHE_TTL = int(os.environ.get("ROLE_CACHE_TTL", "300"))  # seconds
+# Cached parts of the admin pages (see breiflyplatform/page_cache.py). Writes change
+# the cache key, so this only bounds how long unused fragments take memory.
+PAGE_FRAGMENT_CACHE_TIMEOUT = int(os.environ.get("PAGE_FRAGMENT_CACHE_TIMEOUT", "600"))  # seconds
+
+# Sessions (they only hold the access token and the user's id / email). SESSION_BACKEND:
+# - db (default): Django's database backend, shared by every worker
+# - cached_db: read from the "sessions" cache, falling back to the database; writes go
+#   to both, and only happen when the session changes (login, logout)
+# - cache: the "sessions" cache only; sessions are lost when it is cleared
+# - signed_cookies: kept in the browser, signed with SECRET_KEY (readable, not
+#   editable, by the client); no server side storage at all
+# - file: Django's file backend
+# cached_db and cache need SESSION_CACHE_BACKEND / SESSION_CACHE_LOCATION pointing at a
+# cache every worker sees: Redis or Memcached, or, when everything runs on one host,
+# django.core.cache.backends.filebased.FileBasedCache with a directory such as
+# /dev/shm/breifly-sessions. With a per-process cache (or a file cache on several hosts)
+# a logout on one worker would leave the session alive in the others' copies, so
+# per-process backends are refused.
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "file": "django.contrib.sessions.backends.file",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
 }
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "db")
+SESSION_ENGINE = SESSION_ENGINES[SESSION_BACKEND]
+SESSION_CACHE_ALIAS = "sessions"
+CACHES[SESSION_CACHE_ALIAS] = {
+    "BACKEND": os.environ.get("SESSION_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+    "LOCATION": os.environ.get("SESSION_CACHE_LOCATION", "breifly-sessions"),
+    "TIMEOUT": None,  # entries expire with the session (SESSION_COOKIE_AGE)
+}
+SESSION_CACHE_BACKENDS = (*SHARED_CACHE_BACKENDS, "django.core.cache.backends.filebased.FileBasedCache")
+if SESSION_BACKEND in ("cached_db", "cache") and CACHES[SESSION_CACHE_ALIAS]["BACKEND"] not in SESSION_CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"SESSION_BACKEND={SESSION_BACKEND} needs SESSION_CACHE_BACKEND set to a cache shared by "
+        f"the workers ({', '.join(SESSION_CACHE_BACKENDS)})"
+    )
+SESSION_COOKIE_HTTPONLY = True
 
 # Supabase Configuration (Use Environment Variables)
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://your-default-url.supabase.co")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "your-default-api-key")
 
+# Local access-token verification (see breiflyplatform/token_verification.py)
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")  # HS256 projects
+SUPABASE_JWT_AUDIENCE = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+SUPABASE_JWKS_URL = os.environ.get(
+    "SUPABASE_JWKS_URL", f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+)  # RS256/ES256 projects
+TOKEN_CACHE_TTL = int(os.environ.get("TOKEN_CACHE_TTL", "300"))  # seconds
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get("TOKEN_CACHE_MAX_SIZE", "1024"))
+TOKEN_CLOCK_LEEWAY = int(os.environ.get("TOKEN_CLOCK_LEEWAY", "10"))  # seconds
+
+# Where users sign in (see breiflyplatform/auth_backends.py). "local" keeps users and
+# passwords in this database and issues its own HS256 tokens signed with
+# SUPABASE_JWT_SECRET, for CI and load tests without the hosted service.
+AUTH_BACKENDS_BY_NAME = {
+    "supabase": "breiflyplatform.auth_backends.SupabaseAuthBackend",
+    "local": "breiflyplatform.auth_backends.LocalAuthBackend",
+}
+AUTH_BACKEND = os.environ.get("AUTH_BACKEND", "supabase")
+AUTH_BACKEND = AUTH_BACKENDS_BY_NAME.get(AUTH_BACKEND, AUTH_BACKEND)  # a name above or a dotted path
+LOCAL_AUTH_TOKEN_TTL = int(os.environ.get("LOCAL_AUTH_TOKEN_TTL", "3600"))  # seconds
+
+# Request metrics (see breiflyplatform/metrics.py). /metrics/ is only served when
+# METRICS_TOKEN is set, to scrapers sending it as a bearer token.
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "True") == "True"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+METRICS_QUERY_WARNING = int(os.environ.get("METRICS_QUERY_WARNING", "50"))  # queries per request
+
+# Async views (see breiflyplatform/async_views.py). Turn on when serving breifly.asgi
+# with uvicorn; under WSGI every async view would spin up its own event loop.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "False") == "True"
+SUPABASE_HTTP_TIMEOUT = float(os.environ.get("SUPABASE_HTTP_TIMEOUT", "10"))  # seconds
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_HTTP_MAX_CONNECTIONS", "100"))
+
 # Internationalization
 LANGUAGE_CODE = "es"
 TIME_ZONE = "UTC"
@@ -80,6 +206,33 @@ USE_L10N = True
 USE_TZ = True
 
 
+# CSV import
+CSV_IMPORT_BATCH_SIZE = int(os.environ.get("CSV_IMPORT_BATCH_SIZE", "1000"))  # rows per bulk insert
+# Import jobs are queued in the import_jobs table. IMPORT_WORKERS threads per web
+# process pick them up right away; `manage.py run_import_jobs` also runs them, and
+# re-queues (or, after IMPORT_JOB_MAX_ATTEMPTS, fails) jobs whose worker stopped
+# reporting progress for IMPORT_JOB_STALE_AFTER seconds, e.g. after a restart.
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", "2"))  # background import threads per process, 0 for none
+IMPORT_JOB_STALE_AFTER = int(os.environ.get("IMPORT_JOB_STALE_AFTER", "300"))  # seconds without progress
+IMPORT_JOB_MAX_ATTEMPTS = int(os.environ.get("IMPORT_JOB_MAX_ATTEMPTS", "3"))
+
+# Item change feed (/items/changes/)
+ITEM_CHANGES_PAGE_SIZE = int(os.environ.get("ITEM_CHANGES_PAGE_SIZE", "1000"))  # log entries per page
+ITEM_CHANGES_MAX_PAGE_SIZE = int(os.environ.get("ITEM_CHANGES_MAX_PAGE_SIZE", "10000"))
+
+# Offers
+OFFER_MAX_LINES = int(os.environ.get("OFFER_MAX_LINES", "2000"))
+OFFERS_PER_PAGE = int(os.environ.get("OFFERS_PER_PAGE", "20"))
+
+# Batch item operations
+ITEM_BATCH_MAX_OPERATIONS = int(os.environ.get("ITEM_BATCH_MAX_OPERATIONS", "5000"))
+ITEM_BATCH_WRITE_SIZE = int(os.environ.get("ITEM_BATCH_WRITE_SIZE", "500"))  # rows per bulk statement
+
+# CSV export
+EXPORT_FETCH_SIZE = int(os.environ.get("EXPORT_FETCH_SIZE", "2000"))  # rows per server-side cursor fetch
+EXPORT_BUFFER_SIZE = int(os.environ.get("EXPORT_BUFFER_SIZE", str(64 * 1024)))  # characters per streamed chunk
+EXPORT_ARROW_BATCH_ROWS = int(os.environ.get("EXPORT_ARROW_BATCH_ROWS", "65536"))  # rows per Parquet row group / Arrow batch
+
 # Media files settings (for CSV storage)
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
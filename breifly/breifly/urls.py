@@ -2,25 +2,39 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path
 import breiflyplatform.views as views
+import breiflyplatform.async_views as async_views
 import breiflyplatform.error_handlers as error_handler
+import breiflyplatform.metrics as metrics
+
+# Busiest pages: async versions when served over ASGI (settings.ASYNC_VIEWS)
+pages = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.landing_page, name='home'),
-    path('home/', views.landing_page, name='home'),
+    path('', pages.landing_page, name='home'),
+    path('home/', pages.landing_page, name='home'),
     path('custom-admin/dashboard/', views.admin_page, name='admin'),
     path('custom-admin/dashboard/users', views.user_management_page, name='user_management_page'),
-    path('custom-admin/dashboard/items', views.item_management_page, name='item_management_page'),
+    path('custom-admin/dashboard/items', pages.item_management_page, name='item_management_page'),
     path('download/csv/', views.download_csv, name='download_item'),
+    path('download/items/', views.download_csv, name='download_items'),
     path('upload/csv/', views.upload_csv, name='upload_csv'),
+    path('upload/csv/jobs/<uuid:job_id>/', views.import_csv_status, name='import_csv_status'),
     path('update-item/<uuid:id>/', views.item_management_page, name='update_item'),
     path('create-item/', views.item_management_page, name='create_item'),
     path('delete-items/<uuid:id>/', views.item_management_page, name='delete_item'),
+    path('items/batch/', views.item_batch_page, name='item_batch'),
+    path('items/aggregates/', views.item_aggregates_page, name='item_aggregates'),
+    path('items/valuation/', views.item_valuation_page, name='item_valuation'),
+    path('items/changes/', views.item_changes_page, name='item_changes'),
+    path('offers/', views.offers_page, name='offers'),
+    path('offers/<uuid:id>/', views.offers_page, name='offer'),
     path('update-user/<uuid:id>/', views.user_management_page, name='update_user'),
     path('delete-user/<uuid:id>/', views.user_management_page, name='delete_user'),
 
-    path('login/', views.login_view, name='login'),
+    path('login/', pages.login_view, name='login'),
     path('logout/', views.logout_view, name='logout_view'),
     path('error/page/', views.error_page, name="error_page"),
+    path('metrics/', metrics.metrics_view, name='metrics'),
 
 ]
 
@@ -0,0 +1,131 @@
+from collections import defaultdict
+from django.db import connection, transaction
+from django.db.models import Count, Sum, TextField, Value
+from django.db.models.functions import Coalesce
+from .models import Item, ItemAggregate
+from .pricing import PRICE_CENTS, from_cents, to_cents
+
+DIMENSIONS = (ItemAggregate.CATEGORY, ItemAggregate.PROVIDER)
+# Item fields that move the totals when they change
+AGGREGATE_FIELDS = frozenset(('category', 'provider', 'price'))
+
+
+def _value(item, field):
+    value = item[field] if isinstance(item, dict) else getattr(item, field)
+    return value or ''
+
+
+def _price_cents(item):
+    return to_cents(item['price'] if isinstance(item, dict) else item.price)
+
+
+class AggregateChanges:
+    """
+    Collects how a set of item writes moves the per-category / per-provider totals,
+    then applies them with one statement. Items can be model instances or dicts
+    with category, provider and price. Prices are summed in cents (see pricing.py).
+
+    Collect the changes of the whole transaction and apply them once, after the
+    item writes and before bump_inventory_version, so the totals commit or roll
+    back with the items.
+    """
+    def __init__(self):
+        # (dimension, value) -> [count delta, price delta in cents]
+        self.deltas = defaultdict(lambda: [0, 0])
+
+    def _move(self, item, sign):
+        cents = _price_cents(item)
+        for dimension in DIMENSIONS:
+            delta = self.deltas[(dimension, _value(item, dimension))]
+            delta[0] += sign
+            delta[1] += sign * cents
+
+    def add(self, item):
+        self._move(item, 1)
+
+    def remove(self, item):
+        self._move(item, -1)
+
+    def replace(self, old, new):
+        self.remove(old)
+        self.add(new)
+
+    def apply(self):
+        rows = sorted(
+            (dimension, value, count, cents)
+            for (dimension, value), (count, cents) in self.deltas.items()
+            if count or cents
+        )
+        if not rows:
+            return
+        table = connection.ops.quote_name(ItemAggregate._meta.db_table)
+        placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+        # Rows are sorted so concurrent writers lock aggregates in the same order.
+        # That only rules out deadlocks if each transaction applies once: two
+        # sorted batches in a row don't lock in sorted order overall.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (dimension, value, item_count, price_cents) VALUES {placeholders} "
+                f"ON CONFLICT (dimension, value) DO UPDATE SET "
+                f"item_count = {table}.item_count + EXCLUDED.item_count, "
+                f"price_cents = {table}.price_cents + EXCLUDED.price_cents",
+                [field for row in rows for field in row],
+            )
+        if any(count < 0 for _, _, count, _ in rows):
+            ItemAggregate.objects.filter(item_count__lte=0).delete()
+        self.deltas.clear()
+
+
+def record_item_changes(added=(), removed=()):
+    changes = AggregateChanges()
+    for item in removed:
+        changes.remove(item)
+    for item in added:
+        changes.add(item)
+    changes.apply()
+
+
+def rebuild_item_aggregates():
+    """
+    Recomputes every aggregate from the items table with one GROUP BY per
+    dimension, e.g. after items were edited outside the app. Writers wait on the
+    table lock meanwhile.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {ItemAggregate._meta.db_table} IN EXCLUSIVE MODE')
+        ItemAggregate.objects.all().delete()
+        changes = AggregateChanges()
+        for dimension in DIMENSIONS:
+            totals = (
+                Item.objects.annotate(group=Coalesce(dimension, Value(''), output_field=TextField()))
+                .values('group')
+                .annotate(count=Count('id'), cents=Sum(PRICE_CENTS))
+                .order_by()
+            )
+            for row in totals:
+                changes.deltas[(dimension, row['group'])] = [row['count'], row['cents'] or 0]
+        changes.apply()
+
+
+def get_item_aggregates():
+    """
+    Stock count and value per category and provider, plus overall totals.
+    Reads only the aggregate rows, not the items table.
+    """
+    result = {dimension: [] for dimension in DIMENSIONS}
+    total_cents = 0
+    for aggregate in ItemAggregate.objects.order_by('dimension', '-item_count', 'value'):
+        result[aggregate.dimension].append({
+            'value': aggregate.value,
+            'item_count': aggregate.item_count,
+            'price_total': from_cents(aggregate.price_cents),
+        })
+        if aggregate.dimension == ItemAggregate.CATEGORY:
+            total_cents += aggregate.price_cents
+    result['totals'] = {
+        'item_count': sum(row['item_count'] for row in result[ItemAggregate.CATEGORY]),
+        'price_total': from_cents(total_cents),
+    }
+    return result
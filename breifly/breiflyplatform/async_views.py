@@ -0,0 +1,137 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import render, redirect
+from django.views.decorators.csrf import csrf_protect
+from .authorization import aresolve_request_roles
+from .helper_functions import sanitize, wants_json_response
+from .auth_backends import get_auth_backend
+from . import views
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Async versions of the busiest views, used when settings.ASYNC_VIEWS is on (see urls.py).
+# Authentication is the network-bound part, so it is awaited here; database work and
+# template rendering still run in Django's sync thread.
+arender = sync_to_async(render)
+
+
+# --------------------------------
+# User - Pages
+# --------------------------------
+async def landing_page(request):
+    """
+    Async version of views.landing_page.
+    """
+    try:
+        user_authenticated, user_data, roles = await aresolve_request_roles(request)
+
+        if not user_authenticated:
+            if wants_json_response(request):
+                return JsonResponse({'error': 'Not authenticated'}, status=401)
+            return redirect('/login')
+
+        if 'user' in roles:
+            if request.method == 'GET':
+                return await arender(request, 'main_page.html', {
+                    'title': 'Briefly - Home',
+                    'user_authenticated': user_authenticated,
+                    'user': user_data,
+                    'roles': roles,
+                    'navbar_partial': 'partials/authenticated_navbar.html',
+                })
+            else:
+                return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+        elif 'admin' in roles:
+            if request.method == 'GET':
+                return redirect('/custom-admin/dashboard/')
+            else:
+                return JsonResponse({'error': 'Method not allowed'}, status=405)
+        else:
+            if wants_json_response(request):
+                return JsonResponse({'error': 'User role not recognized'}, status=500)
+            return await arender(request, '404.html', status=500)
+    except Exception as e:
+        if wants_json_response(request):
+            return JsonResponse({'error': str(e)}, status=500)
+        return await arender(request, '404.html', status=500)
+
+
+# --------------------------------
+# Admin View
+# --------------------------------
+async def item_management_page(request, id=None):
+    """
+    Async version of views.item_management_page. Writes go through the sync view,
+    which reuses the roles resolved here.
+    """
+    try:
+        user_authenticated, user_data, roles = await aresolve_request_roles(request)
+
+        if not user_authenticated:
+            if wants_json_response(request):
+                return JsonResponse({'error': 'Not authenticated'}, status=401)
+            return redirect('/login')
+
+        if "admin" not in roles:
+            if wants_json_response(request):
+                return JsonResponse({'error': 'Not authorized'}, status=403)
+            return await arender(request, '404.html', status=403)
+
+        if request.method == "GET":
+            return await sync_to_async(views.item_listing)(request, user_authenticated, user_data, roles)
+        return await sync_to_async(views.item_management_page)(request, id=id)
+    except Exception as e:
+        if wants_json_response(request):
+            return JsonResponse({'error': str(e)}, status=500)
+        return await arender(request, '404.html', status=500)
+
+
+# --------------------------------
+# Login
+# --------------------------------
+@csrf_protect
+async def login_view(request):
+    """
+    Async version of views.login_view.
+    """
+    try:
+        if request.method == 'GET':
+            return await arender(request, 'loginForm.html', {
+                'title': 'Invecta - Login',
+                'navbar_partial': 'partials/not_authenticated_navbar.html'
+            })
+
+        elif request.method == 'POST':
+            try:
+                data = json.loads(request.body)
+            except json.JSONDecodeError:
+                return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+
+            email = sanitize(data.get('email'))
+            password = sanitize(data.get('password'))
+            if not email or not password:
+                return JsonResponse({'error': 'Email and password are required'}, status=400)
+
+            try:
+                session = await get_auth_backend().asign_in(email, password)
+            except Exception as e:
+                logger.error(f"Authentication failed: {str(e)}")
+                return JsonResponse({'error': f'Authentication failed: {str(e)}'}, status=500)
+            if not session:
+                return JsonResponse({'error': 'Invalid email or password'}, status=400)
+
+            await request.session.aset('access_token', session.access_token)
+            await request.session.aset('user', {
+                "id": session.user_id,
+                "email": session.email,
+            })
+            return JsonResponse({'success': True, 'redirect_url': '/en-us/home/'}, status=200)
+
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    except Exception as e:
+        if wants_json_response(request):
+            return JsonResponse({'error': str(e)}, status=500)
+        return await arender(request, '404.html', status=500)
@@ -0,0 +1,169 @@
+from abc import ABC, abstractmethod
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from .models import LocalCredential, Role, User, UserRole
+from .page_cache import bump_user_directory_version
+from .supabase_client import async_supabase_auth, supabase_auth
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import time
+import uuid
+
+
+class AuthSession:
+    """
+    What a successful sign in returns: the access token to keep in the session and
+    who it belongs to.
+    """
+    def __init__(self, access_token, user_id, email):
+        self.access_token = access_token
+        self.user_id = str(user_id)
+        self.email = email
+
+    def __repr__(self):
+        return f"AuthSession(user_id={self.user_id!r}, email={self.email!r})"
+
+
+class AuthBackend(ABC):
+    """
+    Where users sign in and where access tokens that can't be verified locally are
+    checked (see token_verification.py). Selected with settings.AUTH_BACKEND.
+    Subclasses must implement sign_in and get_user.
+    """
+    @abstractmethod
+    def sign_in(self, email, password):
+        """
+        Returns an AuthSession, or None on bad credentials.
+        """
+
+    @abstractmethod
+    def get_user(self, access_token):
+        """
+        Returns the user the token belongs to as a dict (id, email, ...), or None.
+        """
+
+    async def asign_in(self, email, password):
+        return await sync_to_async(self.sign_in, thread_sensitive=False)(email, password)
+
+    async def aget_user(self, access_token):
+        return await sync_to_async(self.get_user, thread_sensitive=False)(access_token)
+
+
+# --------------------------------
+# Supabase
+# --------------------------------
+class SupabaseAuthBackend(AuthBackend):
+    """
+    The hosted Supabase Auth service.
+    """
+    def __init__(self):
+        self.client = supabase_auth
+        self.async_client = async_supabase_auth
+
+    def sign_in(self, email, password):
+        return self._session(self.client.sign_in_with_password(email, password))
+
+    def get_user(self, access_token):
+        return self.client.get_user(access_token)
+
+    async def asign_in(self, email, password):
+        return self._session(await self.async_client.sign_in_with_password(email, password))
+
+    async def aget_user(self, access_token):
+        return await self.async_client.get_user(access_token)
+
+    @staticmethod
+    def _session(data):
+        if not data or not data.get('user'):
+            return None
+        return AuthSession(data['access_token'], data['user']['id'], data['user'].get('email'))
+
+
+# --------------------------------
+# Local
+# --------------------------------
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class LocalAuthBackend(AuthBackend):
+    """
+    Offline stand-in for Supabase Auth, for CI and load tests.
+
+    Passwords are kept (hashed with Django's PASSWORD_HASHERS) in the local_credentials
+    table, and sign in issues HS256 tokens with the same claims Supabase puts in its
+    tokens, signed with SUPABASE_JWT_SECRET, so the token verifier checks them without
+    any network call. Users are added with `manage.py create_local_user`.
+    """
+    def __init__(self):
+        if not settings.SUPABASE_JWT_SECRET:
+            raise ImproperlyConfigured('The local auth backend signs tokens with SUPABASE_JWT_SECRET, set it.')
+        self.secret = settings.SUPABASE_JWT_SECRET.encode('utf-8')
+        self.audience = settings.SUPABASE_JWT_AUDIENCE
+        self.token_ttl = settings.LOCAL_AUTH_TOKEN_TTL
+
+    def sign_in(self, email, password):
+        credential = LocalCredential.objects.filter(email__iexact=email).first()
+        if credential is None or not check_password(password, credential.password):
+            return None
+        return AuthSession(self.issue_token(credential.user_id, credential.email), credential.user_id, credential.email)
+
+    def get_user(self, access_token):
+        # Every token this backend issues is verified locally, anything else is not ours
+        return None
+
+    def issue_token(self, user_id, email):
+        now = int(time.time())
+        header = _b64encode(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())
+        claims = _b64encode(json.dumps({
+            'sub': str(user_id),
+            'email': email,
+            'aud': self.audience,
+            'role': 'authenticated',
+            'iat': now,
+            'exp': now + self.token_ttl,
+        }).encode())
+        signature = hmac.new(self.secret, f'{header}.{claims}'.encode(), hashlib.sha256).digest()
+        return f'{header}.{claims}.{_b64encode(signature)}'
+
+    @staticmethod
+    def create_user(email, password, roles=('user',)):
+        """
+        Adds (or resets the password of) a user: the auth.users row the rest of the
+        app reads, the local credential and the given roles.
+        """
+        with transaction.atomic():
+            user = User.objects.filter(email__iexact=email).first()
+            if user is None:
+                user = User.objects.create(id=uuid.uuid4(), email=email)
+            LocalCredential.objects.update_or_create(
+                user_id=user.id, defaults={'email': email, 'password': make_password(password)}
+            )
+            for name in roles:
+                role, _ = Role.objects.get_or_create(name=name)
+                UserRole.objects.get_or_create(user=user, role=role)
+            bump_user_directory_version()
+        # Imported here: authorization imports this module through the token verifier
+        from .authorization import invalidate_user_roles
+        invalidate_user_roles(user.id)
+        return user
+
+
+@functools.lru_cache(maxsize=None)
+def get_auth_backend():
+    return import_string(settings.AUTH_BACKEND)()
+
+
+@receiver(setting_changed)
+def _reset_auth_backend(setting, **kwargs):
+    if setting in ('AUTH_BACKEND', 'SUPABASE_JWT_SECRET', 'LOCAL_AUTH_TOKEN_TTL'):
+        get_auth_backend.cache_clear()
@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.core.cache import cache
+from .helper_functions import aget_access_token, get_access_token
+from .metrics import metric_lines, registry, timed
+from .models import UserRole
+import threading
+import time
+
+# Roles are memoized per request on the request object and, when the cache is shared
+# by every worker (settings.ROLE_CACHE_SHARED), per user in the cache. Anything that
+# changes a user's roles must call invalidate_user_roles() once it committed.
+ROLE_CACHE_KEY = 'authz:roles:{}'
+
+
+class AuthorizationStats:
+    """
+    Counters for the role lookups, so authz cost can be read in one place.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.request_hits = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.lookup_seconds = 0.0
+
+    def record(self, field, seconds=0.0):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+            self.lookup_seconds += seconds
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'request_hits': self.request_hits,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'lookup_seconds': self.lookup_seconds,
+            }
+
+
+authz_stats = AuthorizationStats()
+
+
+def authz_metrics():
+    """
+    The role lookup counters for /metrics/ (see metrics.py).
+    """
+    stats = authz_stats.as_dict()
+    return [
+        *metric_lines(
+            'breifly_authz_role_lookups_total', 'Role lookups, by where the roles came from.', 'counter', [
+                ({'source': 'request'}, stats['request_hits']),
+                ({'source': 'cache'}, stats['cache_hits']),
+                ({'source': 'database'}, stats['cache_misses']),
+            ],
+        ),
+        *metric_lines(
+            'breifly_authz_lookup_seconds_total', 'Time spent looking up roles.', 'counter',
+            [({}, f"{stats['lookup_seconds']:.6f}")],
+        ),
+    ]
+
+
+registry.register(authz_metrics)
+
+
+def get_user_roles(user_id):
+    """
+    Returns the list of role names for a user, from the shared cache when there is one.
+    """
+    start = time.perf_counter()
+    key = ROLE_CACHE_KEY.format(user_id)
+    if settings.ROLE_CACHE_SHARED:
+        roles = cache.get(key)
+        if roles is not None:
+            authz_stats.record('cache_hits', time.perf_counter() - start)
+            return roles
+
+    roles = list(UserRole.objects.filter(user_id=user_id).values_list('role__name', flat=True))
+    if settings.ROLE_CACHE_SHARED:
+        cache.set(key, roles, settings.ROLE_CACHE_TTL)
+    authz_stats.record('cache_misses', time.perf_counter() - start)
+    return roles
+
+
+async def aget_user_roles(user_id):
+    """
+    Async version of get_user_roles.
+    """
+    start = time.perf_counter()
+    key = ROLE_CACHE_KEY.format(user_id)
+    if settings.ROLE_CACHE_SHARED:
+        roles = await cache.aget(key)
+        if roles is not None:
+            authz_stats.record('cache_hits', time.perf_counter() - start)
+            return roles
+
+    roles = [name async for name in UserRole.objects.filter(user_id=user_id).values_list('role__name', flat=True)]
+    if settings.ROLE_CACHE_SHARED:
+        await cache.aset(key, roles, settings.ROLE_CACHE_TTL)
+    authz_stats.record('cache_misses', time.perf_counter() - start)
+    return roles
+
+
+def invalidate_user_roles(user_id):
+    """
+    Drops the cached roles of a user after their roles changed or they were deleted.
+    Call it after the transaction committed, so no worker caches the old roles again.
+    """
+    cache.delete(ROLE_CACHE_KEY.format(user_id))
+
+
+def resolve_request_roles(request):
+    """
+    Authenticates the request and resolves the caller's roles once; later calls
+    during the same request reuse the result stored on the request.
+    """
+    resolved = getattr(request, '_authz', None)
+    if resolved is not None:
+        authz_stats.record('request_hits')
+        return resolved
+
+    with timed('auth_seconds'):
+        user_authenticated, user_data = get_access_token(request)
+        roles = get_user_roles(user_data.id) if user_authenticated else []
+    request._authz = (user_authenticated, user_data, roles)
+    return request._authz
+
+
+async def aresolve_request_roles(request):
+    """
+    Async version of resolve_request_roles. Stores the result on the request the same
+    way, so sync code called later in the request doesn't authenticate again.
+    """
+    resolved = getattr(request, '_authz', None)
+    if resolved is not None:
+        authz_stats.record('request_hits')
+        return resolved
+
+    with timed('auth_seconds'):
+        user_authenticated, user_data = await aget_access_token(request)
+        roles = await aget_user_roles(user_data.id) if user_authenticated else []
+    request._authz = (user_authenticated, user_data, roles)
+    return request._authz
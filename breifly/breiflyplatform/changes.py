@@ -0,0 +1,84 @@
+from django.conf import settings
+from .models import Item, ItemChange
+
+# Every write to the items table appends one ItemChange per item touched: 'upsert'
+# for creates and updates, 'delete' (a tombstone keeping the serial number) for
+# deletes. A sync client keeps the id of the last change it read and asks for the
+# ones after it, so a sync costs as much as the changes made since, not the size
+# of the inventory.
+#
+# Writers log their changes after bump_inventory_version, in the same transaction.
+# The version row stays locked until commit, so change ids are handed out in
+# commit order and a client never skips a change that committed late.
+
+# Item fields sent with every upsert
+FEED_FIELDS = ('serial_number', 'provider', 'name', 'category', 'price', 'version')
+
+
+def log_item_changes(upserted_ids=(), deleted=()):
+    """
+    Appends the changes of one write: ids of the items created or updated, and the
+    deleted items (instances, for their serial number).
+    """
+    changes = [ItemChange(item_id=item_id, action=ItemChange.UPSERT) for item_id in upserted_ids]
+    changes += [
+        ItemChange(item_id=item.id, action=ItemChange.DELETE, serial_number=item.serial_number) for item in deleted
+    ]
+    if changes:
+        ItemChange.objects.bulk_create(changes, batch_size=settings.ITEM_BATCH_WRITE_SIZE)
+
+
+def get_changes_cursor():
+    """
+    The id of the latest change, to start following the feed from, e.g. right
+    before a full export.
+    """
+    return ItemChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+class ChangePage:
+    def __init__(self, changes, next_cursor, has_more):
+        self.changes = changes
+        self.next_cursor = next_cursor
+        self.has_more = has_more
+
+    def as_dict(self):
+        return {'changes': self.changes, 'next_cursor': self.next_cursor, 'has_more': self.has_more}
+
+
+def changes_since(cursor=0, limit=None):
+    """
+    The changes after `cursor`, at most `limit` log entries per page.
+
+    Entries for the same item are collapsed into the latest one, and upserts carry
+    the item as it is now (read with one query), so replaying pages in order
+    brings a copy up to date. An upsert whose item has since been deleted is left
+    out; its tombstone comes later in the feed.
+    """
+    limit = limit or settings.ITEM_CHANGES_PAGE_SIZE
+    rows = list(
+        ItemChange.objects.filter(id__gt=cursor).order_by('id')
+        .values_list('id', 'item_id', 'action', 'serial_number')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for change_id, item_id, action, serial_number in rows:
+        latest.pop(item_id, None)  # Re-inserted so the dict stays in change order
+        latest[item_id] = (change_id, action, serial_number)
+
+    upserted_ids = [item_id for item_id, (_, action, _) in latest.items() if action == ItemChange.UPSERT]
+    items = {row['id']: row for row in Item.objects.filter(id__in=upserted_ids).values('id', *FEED_FIELDS)}
+
+    changes = []
+    for item_id, (change_id, action, serial_number) in latest.items():
+        if action == ItemChange.DELETE:
+            changes.append({
+                'cursor': change_id, 'action': action, 'id': str(item_id), 'serial_number': serial_number,
+            })
+        elif item_id in items:
+            changes.append({
+                'cursor': change_id, 'action': action, **items[item_id], 'id': str(item_id),
+            })
+    return ChangePage(changes, rows[-1][0] if rows else cursor, has_more)
@@ -0,0 +1,56 @@
+from .metrics import metric_lines, record_db_connect, registry
+import threading
+
+
+class ConnectionStats:
+    """
+    Process-wide count and total time of database connects, per alias.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = {}
+
+    def record(self, alias, seconds):
+        with self._lock:
+            count, total = self.connects.get(alias, (0, 0.0))
+            self.connects[alias] = (count + 1, total + seconds)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                alias: {'connects': count, 'connect_seconds': total}
+                for alias, (count, total) in self.connects.items()
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+def record_connect(alias, seconds):
+    """
+    Called by the database backend (see db/postgresql/base.py) each time it opens
+    a connection or checks one out of the pool. Reported per request in Server-Timing
+    and in total on /metrics/.
+    """
+    connection_stats.record(alias, seconds)
+    record_db_connect(seconds)
+
+
+def connection_metrics():
+    """
+    Connects per database alias for /metrics/ (see metrics.py).
+    """
+    stats = connection_stats.as_dict()
+    return [
+        *metric_lines(
+            'breifly_db_connects_total', 'Database connections opened or checked out of the pool.', 'counter',
+            [({'alias': alias}, row['connects']) for alias, row in stats.items()],
+        ),
+        *metric_lines(
+            'breifly_db_connect_seconds_total', 'Time spent opening or checking out database connections.', 'counter',
+            [({'alias': alias}, row['connect_seconds']) for alias, row in stats.items()],
+        ),
+    ]
+
+
+registry.register(connection_metrics)
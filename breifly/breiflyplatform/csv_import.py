@@ -0,0 +1,217 @@
+from django.conf import settings
+from django.db import connection, transaction
+from .aggregates import AggregateChanges
+from .changes import log_item_changes
+from .helper_functions import sanitize
+from .inventory_state import bump_inventory_version
+from .models import Item
+from io import TextIOWrapper
+import csv
+import time
+import uuid
+
+# Columns expected in an import file, after the header row
+CSV_COLUMNS = ('serial_number', 'provider', 'name', 'category', 'price')
+# Columns an upsert overwrites on an existing serial number
+UPSERT_COLUMNS = ('provider', 'name', 'category', 'price')
+# Only the first errors are returned in full, the rest are just counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class _Rollback(Exception):
+    pass
+
+
+class ImportResult:
+    """
+    Outcome of an import: counts plus a per-row error report.
+    """
+    def __init__(self):
+        self.rows_processed = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+        self.committed = False
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+
+    def add_error(self, row_number, serial_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'serial_number': serial_number, 'error': message})
+
+    @property
+    def rows_per_second(self):
+        return self.rows_processed / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows_processed': self.rows_processed,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'committed': self.committed,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+class CsvItemImporter:
+    """
+    Streams a CSV upload into the items table.
+
+    Rows are read in chunks of `batch_size`; each chunk costs one query to find
+    serial numbers that already exist and one `bulk_create`. The whole file runs in
+    a single transaction. With on_error='abort' any bad row rolls back the import;
+    with on_error='skip' bad rows are reported and the rest is committed.
+    `progress` is called with the running ImportResult after every chunk.
+
+    mode='upsert' updates items whose serial number already exists instead of
+    rejecting them, using INSERT ... ON CONFLICT (serial_number) DO UPDATE
+    (needs the unique index from migration 0003). Rows identical to what is
+    stored are left alone and counted as unchanged.
+    """
+    ON_ERROR_CHOICES = ('abort', 'skip')
+    MODE_CHOICES = ('insert', 'upsert')
+
+    def __init__(self, batch_size=None, on_error='abort', mode='insert', progress=None):
+        if on_error not in self.ON_ERROR_CHOICES:
+            raise ValueError(f"on_error must be one of {', '.join(self.ON_ERROR_CHOICES)}")
+        if mode not in self.MODE_CHOICES:
+            raise ValueError(f"mode must be one of {', '.join(self.MODE_CHOICES)}")
+        self.batch_size = batch_size or settings.CSV_IMPORT_BATCH_SIZE
+        self.on_error = on_error
+        self.mode = mode
+        self.progress = progress
+
+    def run(self, binary_file):
+        result = ImportResult()
+        reader = csv.reader(TextIOWrapper(binary_file, encoding='utf-8-sig', newline=''))
+        next(reader, None)  # Skip header row
+
+        try:
+            with transaction.atomic():
+                seen = set()
+                # Ids of the items written, for the change log
+                written = []
+                # Stock totals of the whole import, applied once (see AggregateChanges)
+                totals = AggregateChanges()
+                chunk = []
+                # Row 1 is the header
+                for row_number, row in enumerate(reader, start=2):
+                    if not any(field.strip() for field in row):
+                        continue
+                    chunk.append((row_number, row))
+                    if len(chunk) >= self.batch_size:
+                        self._import_chunk(chunk, seen, result, written, totals)
+                        chunk = []
+                if chunk:
+                    self._import_chunk(chunk, seen, result, written, totals)
+
+                if result.error_count and self.on_error == 'abort':
+                    raise _Rollback()
+                if result.created or result.updated:
+                    totals.apply()
+                    bump_inventory_version()
+                    log_item_changes(upserted_ids=written)
+                result.committed = True
+        except _Rollback:
+            result.created = result.updated = 0
+        finally:
+            result.elapsed = time.monotonic() - result.started_at
+        return result
+
+    def _import_chunk(self, chunk, seen, result, written, totals):
+        parsed = []
+        for row_number, row in chunk:
+            fields = self._parse_row(row_number, row, result)
+            if fields is None:
+                continue
+            if fields['serial_number'] in seen:
+                result.add_error(row_number, fields['serial_number'], 'Numero de serie duplicado en el archivo')
+                continue
+            seen.add(fields['serial_number'])
+            parsed.append((row_number, fields))
+
+        existing = Item.objects.filter(serial_number__in=[fields['serial_number'] for _, fields in parsed])
+        if self.mode == 'upsert':
+            # Locked until the import commits, so an edit can't land between this
+            # read and the upsert (the stock totals are computed from it)
+            existing = existing.select_for_update()
+        existing = {row[0]: row[1:] for row in existing.values_list('serial_number', *UPSERT_COLUMNS, 'id')}
+        new_items = []
+        changed_items = []
+        for row_number, fields in parsed:
+            current = existing.get(fields['serial_number'])
+            if current is None:
+                new_items.append(Item(id=uuid.uuid4(), **fields))
+            elif self.mode == 'insert':
+                result.add_error(row_number, fields['serial_number'], f"Numero de serie {fields['serial_number']} ya existe.")
+            elif current[:-1] == tuple(fields[column] for column in UPSERT_COLUMNS):
+                result.unchanged += 1
+            else:
+                changed_items.append(Item(id=current[-1], **fields))
+                totals.replace(dict(zip(UPSERT_COLUMNS, current)), fields)
+
+        # Once the import is going to be rolled back there is no point writing more rows
+        if not (result.error_count and self.on_error == 'abort'):
+            if self.mode == 'upsert' and (new_items or changed_items):
+                written.extend(self._upsert(new_items + changed_items))
+            elif new_items:
+                Item.objects.bulk_create(new_items, batch_size=self.batch_size)
+                written.extend(item.id for item in new_items)
+            for item in new_items:
+                totals.add(item)
+            result.created += len(new_items)
+            result.updated += len(changed_items)
+
+        result.rows_processed += len(chunk)
+        if self.progress:
+            result.elapsed = time.monotonic() - result.started_at
+            self.progress(result)
+
+    def _upsert(self, items):
+        """
+        INSERT ... ON CONFLICT (serial_number) DO UPDATE, in batches. A conflicting
+        row keeps its id and gets its version bumped by the database, as
+        update_item does, so a concurrent edit is never overwritten with the same
+        version number. Returns the ids of the rows written.
+        """
+        table = connection.ops.quote_name(Item._meta.db_table)
+        columns = ('id', 'serial_number', *UPSERT_COLUMNS)
+        updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in UPSERT_COLUMNS)
+        fields = [Item._meta.get_field(column) for column in columns]
+        row_placeholder = f"({', '.join(['%s'] * len(columns))}, 1)"
+        ids = []
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}, version) "
+                    f"VALUES {', '.join([row_placeholder] * len(batch))} "
+                    f"ON CONFLICT (serial_number) DO UPDATE SET {updates}, version = {table}.version + 1 "
+                    f"RETURNING id",
+                    [field.get_db_prep_save(getattr(item, field.attname), connection) for item in batch for field in fields],
+                )
+                ids.extend(uuid.UUID(str(row[0])) for row in cursor.fetchall())
+        return ids
+
+    @staticmethod
+    def _parse_row(row_number, row, result):
+        if len(row) < len(CSV_COLUMNS):
+            result.add_error(row_number, sanitize(row[0]) if row else '', f'Se esperaban {len(CSV_COLUMNS)} columnas')
+            return None
+        fields = {column: sanitize(value) for column, value in zip(CSV_COLUMNS, row)}
+        if not fields['serial_number']:
+            result.add_error(row_number, '', 'Numero de serie es obligatorio')
+            return None
+        try:
+            fields['price'] = float(fields['price']) if fields['price'] else 0
+        except ValueError:
+            result.add_error(row_number, fields['serial_number'], 'Formato invalido de precio')
+            return None
+        return fields
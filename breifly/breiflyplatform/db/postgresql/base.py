@@ -0,0 +1,16 @@
+from django.db.backends.postgresql import base
+from breiflyplatform.connection_metrics import record_connect
+import time
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The stock PostgreSQL backend, timing how long it takes to get a connection
+    (a new TCP/TLS handshake, or a checkout from the pool) for connection_metrics.
+    """
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        try:
+            return super().get_new_connection(conn_params)
+        finally:
+            record_connect(self.alias, time.perf_counter() - start)
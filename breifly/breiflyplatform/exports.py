@@ -0,0 +1,215 @@
+from django.conf import settings
+from .models import Item
+from io import RawIOBase, StringIO
+from itertools import islice
+import csv
+import json
+import zlib
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Columnar formats are optional
+    pyarrow = None
+
+# Columns written to an export, in order, and their header labels
+EXPORT_COLUMNS = ('serial_number', 'provider', 'name', 'category', 'price')
+EXPORT_HEADER = ["Serial Number", "Provider", "Name", "Category", "Price"]
+# Rows handed to csv.writerows at a time
+WRITE_BATCH_SIZE = 500
+
+
+def iter_item_rows(queryset=None, chunk_size=None):
+    """
+    Yields export rows as plain tuples.
+    Uses a server-side cursor on Postgres, so only `chunk_size` rows are held at once.
+    """
+    if queryset is None:
+        queryset = Item.objects.order_by('serial_number')
+    return queryset.values_list(*EXPORT_COLUMNS).iterator(
+        chunk_size=chunk_size or settings.EXPORT_FETCH_SIZE
+    )
+
+
+def stream_csv(rows, header=EXPORT_HEADER, buffer_size=None):
+    """
+    Turns rows into CSV text chunks of roughly `buffer_size` characters.
+    """
+    buffer_size = buffer_size or settings.EXPORT_BUFFER_SIZE
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(header)
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, WRITE_BATCH_SIZE))
+        if not batch:
+            break
+        writer.writerows(batch)
+        if output.tell() >= buffer_size:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    if output.tell():
+        yield output.getvalue()
+
+
+def stream_ndjson(rows, buffer_size=None):
+    """
+    Turns rows into newline-delimited JSON objects, keeping numbers as numbers.
+    """
+    buffer_size = buffer_size or settings.EXPORT_BUFFER_SIZE
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    lines = []
+    size = 0
+    for row in rows:
+        line = encode(dict(zip(EXPORT_COLUMNS, row)))
+        lines.append(line)
+        size += len(line) + 1
+        if size >= buffer_size:
+            lines.append('')
+            yield '\n'.join(lines)
+            lines = []
+            size = 0
+    if lines:
+        lines.append('')
+        yield '\n'.join(lines)
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Gzip-compresses a stream of text or byte chunks on the fly.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# --------------------------------
+# Columnar formats (pyarrow)
+# --------------------------------
+class _ChunkSink(RawIOBase):
+    """
+    Write-only file object that keeps what was written until it is drained,
+    so pyarrow writers can be streamed out batch by batch.
+    """
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def arrow_schema():
+    return pyarrow.schema([
+        ('serial_number', pyarrow.string()),
+        ('provider', pyarrow.string()),
+        ('name', pyarrow.string()),
+        ('category', pyarrow.string()),
+        ('price', pyarrow.float64()),
+    ])
+
+
+def iter_record_batches(rows, batch_rows=None):
+    """
+    Groups rows into Arrow record batches of `batch_rows` rows.
+    """
+    schema = arrow_schema()
+    batch_rows = batch_rows or settings.EXPORT_ARROW_BATCH_ROWS
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_rows))
+        if not batch:
+            break
+        columns = list(zip(*batch))
+        yield pyarrow.record_batch(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+
+def stream_arrow(rows):
+    """
+    Arrow IPC stream, one message per record batch.
+    """
+    sink = _ChunkSink()
+    with pyarrow.ipc.new_stream(sink, arrow_schema()) as writer:
+        for batch in iter_record_batches(rows):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_parquet(rows):
+    """
+    Parquet file, one row group per record batch. The footer goes out last.
+    """
+    sink = _ChunkSink()
+    with pyarrow.parquet.ParquetWriter(sink, arrow_schema(), compression='snappy') as writer:
+        for batch in iter_record_batches(rows):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+# --------------------------------
+# Format selection
+# --------------------------------
+class ExportFormat:
+    def __init__(self, name, content_type, extension, stream, media_types=(), columnar=False):
+        self.name = name
+        self.content_type = content_type
+        self.extension = extension
+        self.stream = stream
+        self.media_types = (content_type,) + tuple(media_types)
+        self.columnar = columnar
+
+    @property
+    def available(self):
+        return not self.columnar or pyarrow is not None
+
+
+EXPORT_FORMATS = {
+    f.name: f for f in (
+        ExportFormat('csv', 'text/csv', 'csv', stream_csv),
+        ExportFormat('ndjson', 'application/x-ndjson', 'ndjson', stream_ndjson, ('application/ndjson', 'application/jsonl')),
+        ExportFormat('parquet', 'application/vnd.apache.parquet', 'parquet', stream_parquet, ('application/x-parquet',), columnar=True),
+        ExportFormat('arrow', 'application/vnd.apache.arrow.stream', 'arrows', stream_arrow, columnar=True),
+    )
+}
+
+
+def negotiate_export_format(format_name=None, accept=''):
+    """
+    Picks the export format from a ?format= value, else from the Accept header.
+    Falls back to CSV; returns None when an explicitly requested format is unknown.
+    """
+    if format_name:
+        return EXPORT_FORMATS.get(format_name.lower())
+    for media_range in accept.split(','):
+        media_type = media_range.split(';')[0].strip().lower()
+        for export_format in EXPORT_FORMATS.values():
+            if media_type in export_format.media_types:
+                return export_format
+    return EXPORT_FORMATS['csv']
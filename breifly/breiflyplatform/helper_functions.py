@@ -1,8 +1,11 @@
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
-from .supabase_client import supabase
+from .token_verification import token_verifier
 from django.utils.html import strip_tags
 from django.middleware.csrf import CsrfViewMiddleware
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Helper functions
 
@@ -20,22 +23,43 @@ def get_access_token(request):
 
     if access_token:
         try:
-            # Fetch user data using the access token
-            user_response = supabase.auth.get_user(access_token)
+            # Verify the token locally, only asking Supabase when the signing key is unknown
+            user = token_verifier.verify(access_token)
 
-            if user_response.user:
+            if user:
                 # If valid, mark the user as authenticated and fetch user details
                 user_authenticated = True
-                user_data = user_response.user  # Access the user object
+                user_data = user
             else:
                 # If invalid, clear the session
                 request.session.flush()
         except Exception as e:
-            print(f"Error verifying token: {e}")
+            logger.warning(f"Error verifying token: {e}")
             request.session.flush()
 
     return user_authenticated, user_data
 
+# Async version of get_access_token, for the async views
+async def aget_access_token(request):
+    access_token = await request.session.aget('access_token')
+    user_authenticated = False
+    user_data = None
+
+    if access_token:
+        try:
+            user = await token_verifier.averify(access_token)
+
+            if user:
+                user_authenticated = True
+                user_data = user
+            else:
+                await request.session.aflush()
+        except Exception as e:
+            logger.warning(f"Error verifying token: {e}")
+            await request.session.aflush()
+
+    return user_authenticated, user_data
+
 # Helper function to sanitize user input
 def sanitize(value):
     """
@@ -46,6 +70,28 @@ def sanitize(value):
     return strip_tags(value).strip()
 
 
+# Columns an admin can edit on an item
+ITEM_EDITABLE_FIELDS = ('serial_number', 'provider', 'name', 'category', 'price')
+
+# Helper function to sanitize item input
+def clean_item_fields(data, partial=False):
+    """
+    Sanitizes the editable item fields present in `data`.
+    With partial=True missing fields are left out instead of defaulted.
+    Raises ValueError on an invalid price.
+    """
+    fields = {}
+    for field in ITEM_EDITABLE_FIELDS:
+        if partial and field not in data:
+            continue
+        value = data.get(field)
+        if field == 'price':
+            fields['price'] = float(value) if value not in [None, ''] else 0
+        else:
+            fields[field] = sanitize(value)
+    return fields
+
+
 # Helper function to check if the request is for JSON
 def wants_json_response(request):
     """
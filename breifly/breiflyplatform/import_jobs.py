@@ -0,0 +1,211 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils.timezone import now
+from .csv_import import CsvItemImporter
+from .models import ImportJob
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import logging
+import os
+import socket
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Recorded on the jobs a worker claims, for debugging
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process-wide worker pool, created on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMPORT_WORKERS, thread_name_prefix='csv-import'
+            )
+        return _executor
+
+
+def enqueue_import(uploaded_file, user_id=None, on_error='abort', mode='insert'):
+    """
+    Stores the upload and records a pending job. The jobs table is the queue:
+    workers claim pending rows (see claim_next_job), so a job outlives the process
+    that accepted the upload.
+    """
+    # Validate up front so a bad option fails the upload, not the job
+    CsvItemImporter(on_error=on_error, mode=mode)
+
+    job_id = uuid.uuid4()
+    file_path = default_storage.save(f'imports/{job_id}.csv', uploaded_file)
+    job = ImportJob.objects.create(
+        id=job_id,
+        file_name=uploaded_file.name,
+        file_path=file_path,
+        on_error=on_error,
+        mode=mode,
+        created_by=user_id,
+    )
+    transaction.on_commit(start_workers, using='jobs')
+    return job
+
+
+def start_workers():
+    """
+    Has the in-process pool work through the pending jobs. No-op with IMPORT_WORKERS=0,
+    when `manage.py run_import_jobs` runs them instead.
+    """
+    if settings.IMPORT_WORKERS > 0:
+        get_executor().submit(run_pending_jobs)
+
+
+# --------------------------------
+# Queue
+# --------------------------------
+def claim_next_job(worker=None):
+    """
+    Marks the oldest pending job as running and returns it, or None when there is
+    nothing to do. The claim is a conditional UPDATE, so two workers never get the
+    same job (and it works on SQLite, which has no SELECT ... FOR UPDATE).
+    """
+    worker = worker or WORKER_ID
+    while True:
+        job_id = ImportJob.objects.filter(status=ImportJob.PENDING).order_by('created_at').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        claimed = ImportJob.objects.filter(id=job_id, status=ImportJob.PENDING).update(
+            status=ImportJob.RUNNING, worker=worker, attempts=F('attempts') + 1, started_at=now(), heartbeat_at=now(),
+        )
+        if claimed:
+            return ImportJob.objects.get(id=job_id)
+        # Another worker got it first, try the next one
+
+
+def recover_stale_jobs():
+    """
+    Running jobs whose worker stopped sending heartbeats (the process restarted,
+    was recycled or crashed) go back to pending, or fail once they used up
+    IMPORT_JOB_MAX_ATTEMPTS. The import itself ran in one transaction, so a job
+    that died half way left no items behind. Returns (requeued, failed).
+    """
+    stale = ImportJob.objects.filter(
+        status=ImportJob.RUNNING,
+        heartbeat_at__lt=now() - datetime.timedelta(seconds=settings.IMPORT_JOB_STALE_AFTER),
+    )
+    requeued = stale.filter(attempts__lt=settings.IMPORT_JOB_MAX_ATTEMPTS).update(
+        status=ImportJob.PENDING, worker='', message='Reintentando: el proceso que lo importaba se detuvo.',
+    )
+    failed = 0
+    for job in stale.filter(attempts__gte=settings.IMPORT_JOB_MAX_ATTEMPTS):
+        # Conditional, in case the worker came back to life in the meantime
+        if ImportJob.objects.filter(id=job.id, status=ImportJob.RUNNING, heartbeat_at=job.heartbeat_at).update(
+            status=ImportJob.FAILED, finished_at=now(),
+            message=f'Importacion abandonada tras {job.attempts} intentos.',
+        ):
+            failed += 1
+            _delete_file(job)
+    if requeued or failed:
+        logger.warning(f"Recovered stale import jobs: {requeued} requeued, {failed} failed")
+    return requeued, failed
+
+
+def run_pending_jobs(worker=None):
+    """
+    Recovers stale jobs, then runs pending ones until there are none left.
+    Returns the number of jobs run.
+    """
+    close_old_connections()
+    try:
+        recover_stale_jobs()
+        count = 0
+        while True:
+            job = claim_next_job(worker)
+            if job is None:
+                return count
+            run_import_job(job)
+            count += 1
+    finally:
+        # Worker threads outlive the job, don't leave their connections open
+        connections.close_all()
+
+
+def run_import_job(job):
+    """
+    Runs one claimed job, writing progress (and the heartbeat) to the job row.
+    """
+    def progress(result):
+        ImportJob.objects.filter(id=job.id).update(
+            rows_processed=result.rows_processed,
+            created_items=result.created,
+            updated_items=result.updated,
+            unchanged_items=result.unchanged,
+            error_count=result.error_count,
+            rows_per_second=result.rows_per_second,
+            heartbeat_at=now(),
+        )
+
+    try:
+        importer = CsvItemImporter(on_error=job.on_error, mode=job.mode, progress=progress)
+        with default_storage.open(job.file_path, 'rb') as csv_file:
+            result = importer.run(csv_file)
+
+        job.rows_processed = result.rows_processed
+        job.created_items = result.created
+        job.updated_items = result.updated
+        job.unchanged_items = result.unchanged
+        job.error_count = result.error_count
+        job.errors = result.errors
+        job.rows_per_second = result.rows_per_second
+        if result.committed:
+            job.status = ImportJob.SUCCEEDED
+            job.message = 'CSV importado correctamente.'
+        else:
+            job.status = ImportJob.FAILED
+            job.message = f'CSV no importado: {result.error_count} filas con errores.'
+    except Exception as e:
+        logger.exception(f"Import job {job.id} failed")
+        job.status = ImportJob.FAILED
+        job.message = str(e)
+
+    job.finished_at = now()
+    job.save()
+    _delete_file(job)
+
+
+def _delete_file(job):
+    try:
+        default_storage.delete(job.file_path)
+    except Exception as e:
+        logger.warning(f"Could not remove import file {job.file_path}: {e}")
+
+
+def job_status(job):
+    """
+    JSON-friendly view of a job for the status endpoint.
+    """
+    return {
+        'job_id': str(job.id),
+        'status': job.status,
+        'file_name': job.file_name,
+        'rows_processed': job.rows_processed,
+        'mode': job.mode,
+        'created': job.created_items,
+        'updated': job.updated_items,
+        'unchanged': job.unchanged_items,
+        'error_count': job.error_count,
+        'errors': job.errors,
+        'rows_per_second': round(job.rows_per_second, 1),
+        'attempts': job.attempts,
+        'message': job.message,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
@@ -0,0 +1,55 @@
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.timezone import now
+from .models import InventoryState
+import hashlib
+
+STATE_ID = 1
+
+
+def bump_inventory_version():
+    """
+    Marks the inventory as changed. Call it in the same transaction as the item
+    writes; the row stays locked until commit, so concurrent writers queue here.
+    """
+    updated = InventoryState.objects.filter(id=STATE_ID).update(version=F('version') + 1, updated_at=now())
+    if not updated:
+        InventoryState.objects.get_or_create(id=STATE_ID)
+
+
+def get_inventory_state():
+    state = InventoryState.objects.filter(id=STATE_ID).first()
+    return state or InventoryState(id=STATE_ID, version=0, updated_at=None)
+
+
+class InventoryValidators:
+    """
+    ETag / Last-Modified for a response built from the whole inventory.
+
+    The ETag is the inventory version plus a hash of `variant` (whatever else
+    changes the body: query string, format...), so one query answers whether a
+    client's copy is still current.
+    """
+    def __init__(self, request, *variant):
+        self.request = request
+        state = get_inventory_state()
+        digest = hashlib.sha1(repr(variant).encode()).hexdigest()[:12]
+        self.etag = quote_etag(f'{state.version}-{digest}')
+        self.last_modified = int(state.updated_at.timestamp()) if state.updated_at else None
+
+    def not_modified(self):
+        """
+        A 304 when the request's If-None-Match / If-Modified-Since still match, else None.
+        """
+        response = get_conditional_response(self.request, etag=self.etag, last_modified=self.last_modified)
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        # Always revalidate, and never from a shared cache: the data is per admin
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept', 'Cookie'])
+        return response
@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .aggregates import AggregateChanges
+from .changes import log_item_changes
+from .helper_functions import ITEM_EDITABLE_FIELDS, clean_item_fields
+from .inventory_state import bump_inventory_version
+from .models import Item
+import uuid
+
+OPERATIONS = ('create', 'update', 'delete')
+
+
+class BatchResult:
+    """
+    Per-operation results of a batch, in the order the operations were sent.
+    """
+    def __init__(self, count):
+        self.results = [None] * count
+        self.applied = False
+
+    @property
+    def has_errors(self):
+        return any(r['status'] == 'error' for r in self.results)
+
+    def ok(self, index, op, item_id, status, **extra):
+        self.results[index] = {'index': index, 'op': op, 'id': str(item_id), 'status': status, **extra}
+
+    def error(self, index, op, item_id, message):
+        self.results[index] = {
+            'index': index, 'op': op, 'id': str(item_id) if item_id else None,
+            'status': 'error', 'error': message,
+        }
+
+    def as_dict(self):
+        return {
+            'applied': self.applied,
+            'results': self.results,
+            'error_count': sum(1 for r in self.results if r['status'] == 'error'),
+        }
+
+
+class BatchConflict(Exception):
+    """
+    The database rejected the batch (e.g. a serial number taken concurrently).
+    """
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+def _parse(index, operation, result):
+    """
+    Checks the shape of one operation. Returns (op, item_id, fields, version) or None.
+    """
+    if not isinstance(operation, dict):
+        result.error(index, None, None, 'Operation must be an object')
+        return None
+    op = operation.get('op')
+    if op not in OPERATIONS:
+        result.error(index, op, None, f"op must be one of {', '.join(OPERATIONS)}")
+        return None
+
+    item_id = None
+    if op != 'create':
+        try:
+            item_id = uuid.UUID(str(operation.get('id')))
+        except ValueError:
+            result.error(index, op, operation.get('id'), 'Invalid item id')
+            return None
+
+    fields = {}
+    if op != 'delete':
+        data = operation.get('fields', {})
+        if not isinstance(data, dict):
+            result.error(index, op, item_id, 'fields must be an object')
+            return None
+        try:
+            fields = clean_item_fields(data, partial=op == 'update')
+        except (ValueError, TypeError):
+            result.error(index, op, item_id, 'Formate invalido de precio')
+            return None
+        if op == 'create' and not fields['serial_number']:
+            result.error(index, op, None, 'Numero de serie es obligatorio')
+            return None
+        if op == 'update' and not fields:
+            result.error(index, op, item_id, 'No fields to update')
+            return None
+
+    version = operation.get('version')
+    # bool is an int subclass, but true/false is not a version
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+        result.error(index, op, item_id, 'version must be an integer')
+        return None
+    return op, item_id, fields, version
+
+
+def apply_item_batch(operations):
+    """
+    Validates and applies a list of create/update/delete operations on items.
+
+    Everything runs in one transaction: the targeted rows are locked and loaded
+    with one query, serial numbers are checked with one more, and the writes are a
+    single DELETE ... WHERE id IN (...), one bulk_update and one bulk_create.
+    If any operation is invalid nothing is applied.
+    """
+    result = BatchResult(len(operations))
+    parsed = []
+    for index, operation in enumerate(operations):
+        entry = _parse(index, operation, result)
+        if entry is not None:
+            parsed.append((index, *entry))
+
+    try:
+        with transaction.atomic():
+            target_ids = {item_id for _, op, item_id, _, _ in parsed if item_id is not None}
+            current = Item.objects.select_for_update().in_bulk(target_ids) if target_ids else {}
+
+            delete_ids = []
+            updates = {}
+            creates = []
+            # item_id -> serial number it will hold after the batch, for the uniqueness check
+            serials = {}
+            touched = set()
+            totals = AggregateChanges()
+            for index, op, item_id, fields, version in parsed:
+                if item_id is not None:
+                    item = current.get(item_id)
+                    if item is None:
+                        result.error(index, op, item_id, 'Item does not exist')
+                        continue
+                    if item_id in touched:
+                        result.error(index, op, item_id, 'Item appears more than once in the batch')
+                        continue
+                    touched.add(item_id)
+                    if version is not None and version != item.version:
+                        result.error(index, op, item_id, f'Version conflict, current version is {item.version}')
+                        continue
+
+                if op == 'delete':
+                    delete_ids.append(item_id)
+                    totals.remove(item)
+                    result.ok(index, op, item_id, 'deleted')
+                elif op == 'update':
+                    totals.remove(item)
+                    for field, value in fields.items():
+                        setattr(item, field, value)
+                    item.version += 1
+                    totals.add(item)
+                    updates[item_id] = set(fields)
+                    serials[item_id] = item.serial_number
+                    result.ok(index, op, item_id, 'updated', version=item.version)
+                else:
+                    item = Item(id=uuid.uuid4(), version=1, **fields)
+                    creates.append(item)
+                    totals.add(item)
+                    serials[item.id] = item.serial_number
+                    result.ok(index, op, item.id, 'created', version=1)
+
+            _check_serial_numbers(parsed, serials, set(delete_ids), result)
+            if result.has_errors:
+                return result
+
+            batch_size = settings.ITEM_BATCH_WRITE_SIZE
+            if delete_ids:
+                Item.objects.filter(id__in=delete_ids).delete()
+            if updates:
+                changed_fields = set().union(*updates.values())
+                Item.objects.bulk_update(
+                    [current[item_id] for item_id in updates],
+                    [f for f in ITEM_EDITABLE_FIELDS if f in changed_fields] + ['version'],
+                    batch_size=batch_size,
+                )
+            if creates:
+                Item.objects.bulk_create(creates, batch_size=batch_size)
+            totals.apply()
+            bump_inventory_version()
+            log_item_changes(
+                upserted_ids=[*updates, *(item.id for item in creates)],
+                deleted=[current[item_id] for item_id in delete_ids],
+            )
+            result.applied = True
+    except IntegrityError as e:
+        result.applied = False
+        raise BatchConflict(str(e), result)
+    return result
+
+
+def _check_serial_numbers(parsed, serials, delete_ids, result):
+    """
+    Flags operations that would leave two items with the same serial number.
+    """
+    owners = {}
+    for item_id, serial_number in serials.items():
+        owners.setdefault(serial_number, []).append(item_id)
+    taken = Item.objects.filter(serial_number__in=list(owners)).values_list('serial_number', 'id')
+    for serial_number, owner_id in taken:
+        # Fine if the current holder is deleted or is the item keeping / giving up the number
+        if owner_id in delete_ids or owner_id in serials:
+            continue
+        owners[serial_number].append(owner_id)
+
+    for index, op, item_id, fields, version in parsed:
+        if op == 'delete' or result.results[index]['status'] == 'error':
+            continue
+        target = item_id if op == 'update' else uuid.UUID(result.results[index]['id'])
+        if len(owners.get(serials.get(target), [])) > 1:
+            result.error(index, op, item_id, f'Numero de serie {serials[target]} ya existe')
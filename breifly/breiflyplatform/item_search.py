@@ -0,0 +1,95 @@
+from django.db.models import Count, Lookup, Q
+from django.db.models.lookups import IContains
+from .helper_functions import sanitize
+from .models import Item
+
+# Query parameters understood by the item listing
+SEARCH_PARAMS = ('q', 'serial', 'category', 'min_price', 'max_price')
+# Categories returned in the facet counts
+FACET_LIMIT = 20
+
+
+class SubstringILike(Lookup):
+    """
+    field__ilike=word: case-insensitive substring match. On Postgres it is a plain
+    `field ILIKE '%word%'`, which the trigram GIN indexes from migration 0006 can
+    serve; icontains compiles to UPPER(field::text) LIKE UPPER(...), which they
+    can't. Elsewhere it is icontains.
+    """
+    lookup_name = 'ilike'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        return IContains(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        pattern = f'%{connection.ops.prep_for_like_query(self.rhs)}%'
+        return f'{lhs} ILIKE %s', [*lhs_params, pattern]
+
+
+# Only the indexed columns get the lookup
+for _field in ('name', 'provider'):
+    Item._meta.get_field(_field).register_lookup(SubstringILike)
+
+
+def parse_item_filters(params):
+    """
+    Reads the search parameters out of a QueryDict.
+    Raises ValueError on a malformed price bound.
+    """
+    filters = {
+        'q': sanitize(params.get('q')),
+        'serial': sanitize(params.get('serial')),
+        # ?category=a&category=b or ?category=a,b
+        'category': [
+            sanitize(c) for value in params.getlist('category') for c in value.split(',') if sanitize(c)
+        ],
+    }
+    for bound in ('min_price', 'max_price'):
+        value = params.get(bound)
+        filters[bound] = float(value) if value not in [None, ''] else None
+    return filters
+
+
+def has_filters(filters):
+    return bool(filters) and any(filters.values())
+
+
+def filter_items(queryset, filters, skip_category=False):
+    """
+    Applies the search filters. Each lookup is backed by an index from migration 0006:
+    - q: every word must appear in the name or provider (trigram GIN, ILIKE '%word%',
+      see SubstringILike)
+    - serial: serial number prefix (text_pattern_ops, LIKE 'prefix%')
+    - category: one or more exact categories
+    - min_price / max_price: inclusive price range
+    """
+    if not filters:
+        return queryset
+    for word in filters.get('q', '').split():
+        queryset = queryset.filter(Q(name__ilike=word) | Q(provider__ilike=word))
+    if filters.get('serial'):
+        queryset = queryset.filter(serial_number__startswith=filters['serial'])
+    if filters.get('category') and not skip_category:
+        queryset = queryset.filter(category__in=filters['category'])
+    if filters.get('min_price') is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters.get('max_price') is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    return queryset
+
+
+def category_facets(queryset, filters):
+    """
+    Item counts per category for the current search, ignoring the category filter
+    itself so the other categories stay selectable.
+    """
+    rows = (
+        filter_items(queryset, filters, skip_category=True)
+        .order_by()
+        .values('category')
+        .annotate(count=Count('id'))
+        .order_by('-count', 'category')[:FACET_LIMIT]
+    )
+    return [{'category': row['category'], 'count': row['count']} for row in rows]
@@ -0,0 +1,352 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases
+from breiflyplatform.aggregates import rebuild_item_aggregates
+from breiflyplatform.auth_backends import LocalAuthBackend
+from breiflyplatform.models import Item, PreviousOffer, Role, User, UserRole
+from breiflyplatform.pagination import encode_cursor
+from breiflyplatform import pricing
+from breiflyplatform.token_verification import token_verifier
+from io import BytesIO
+import datetime
+import importlib
+import json
+import statistics
+import subprocess
+import time
+import uuid
+
+# The benchmark signs in through the local auth backend, so no request reaches Supabase
+BENCHMARK_JWT_SECRET = 'benchmark-secret'
+BENCHMARK_ADMIN = ('admin@benchmark.local', 'benchmark-password')
+UNMANAGED_MODELS = [User, Role, UserRole, Item, PreviousOffer]
+
+
+def csv_upload(rows, prefix):
+    lines = ['Serial Number,Provider,Name,Category,Price']
+    lines += [f'{prefix}-{i:09d},Provider {i % 50},Uploaded item {i},Category {i % 20},{i % 1000}.5' for i in range(rows)]
+    upload = BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+    upload.name = f'{prefix}.csv'
+    return upload
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the admin pages and the CSV import/export paths end to end, through the "
+        "full middleware stack, on a throwaway Postgres test database (from DATABASE_URL) "
+        "seeded with --users users and --items items. Sign in goes through the local "
+        "auth backend instead of Supabase. Results can be written with --json and compared with "
+        "--compare to catch regressions between commits."
+    )
+
+    SCENARIOS = ('items_page', 'items_page_deep', 'items_json', 'items_keyset', 'items_valuation', 'users_page', 'upload_csv', 'download_csv')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to seed.')
+        parser.add_argument('--items', type=int, default=1_000_000, help='Items to seed (also the export size).')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per page scenario.')
+        parser.add_argument(
+            '--csv-rows', default='10000,100000',
+            help='Comma separated row counts for the upload_csv scenario.',
+        )
+        parser.add_argument(
+            '--scenarios', default=','.join(self.SCENARIOS),
+            help=f"Comma separated subset of: {', '.join(self.SCENARIOS)}.",
+        )
+        parser.add_argument('--keepdb', action='store_true', help='Keep (and reuse) the seeded test database.')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file.')
+        parser.add_argument('--compare', help='Results file from an earlier run to compare against.')
+
+    def handle(self, *args, **options):
+        scenarios = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+        unknown = set(scenarios) - set(self.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark needs PostgreSQL, set DATABASE_URL to a Postgres server.')
+
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options['keepdb'], aliases={'default'}, serialized_aliases=set()
+        )
+        local_auth = override_settings(
+            AUTH_BACKEND='breiflyplatform.auth_backends.LocalAuthBackend', SUPABASE_JWT_SECRET=BENCHMARK_JWT_SECRET
+        )
+        local_auth.enable()
+        original_secret = token_verifier.secret
+        token_verifier.secret = BENCHMARK_JWT_SECRET.encode('utf-8')
+        try:
+            self.create_tables()
+            self.seed(options['users'], options['items'])
+            client = Client()
+            email, password = BENCHMARK_ADMIN
+            response = client.post(
+                '/login/', json.dumps({'email': email, 'password': password}), content_type='application/json'
+            )
+            if response.status_code != 200:
+                raise CommandError(f'Benchmark admin could not sign in: {response.content[:200]}')
+
+            results = []
+            for scenario in scenarios:
+                self.stdout.write(f'Running {scenario}...')
+                results += getattr(self, f'run_{scenario}')(client, options)
+        finally:
+            token_verifier.secret = original_secret
+            token_verifier.clear()
+            local_auth.disable()
+            if not options['keepdb']:
+                teardown_databases(old_config, verbosity=0)
+
+        report = {
+            'meta': {
+                'commit': self.git_commit(),
+                'vendor': connection.vendor,
+                'users': options['users'],
+                'items': options['items'],
+                'requests': options['requests'],
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            },
+            'results': results,
+        }
+        self.print_results(results)
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.print_comparison(json.load(f), report)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['json_path']}")
+
+    # --------------------------------
+    # Database
+    # --------------------------------
+    def create_tables(self):
+        """
+        The Supabase tables are unmanaged, so the test database doesn't get them.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE SCHEMA IF NOT EXISTS auth')
+        with connection.schema_editor() as editor:
+            for model in UNMANAGED_MODELS:
+                if not self.table_exists(model):
+                    editor.create_model(model)
+        # Same search indexes as production
+        search_indexes = importlib.import_module('breiflyplatform.migrations.0006_items_search_indexes')
+        with connection.schema_editor(atomic=False) as editor:
+            search_indexes.create_indexes(None, editor)
+
+    @staticmethod
+    def table_exists(model):
+        # With --keepdb the tables are already there from the previous run
+        try:
+            with transaction.atomic():
+                model.objects.exists()
+            return True
+        except DatabaseError:
+            return False
+
+    def seed(self, user_count, item_count):
+        Role.objects.get_or_create(id=1, defaults={'name': 'admin'})
+        user_role, _ = Role.objects.get_or_create(id=2, defaults={'name': 'user'})
+
+        existing_users = User.objects.count()
+        if existing_users < user_count:
+            users = User.objects.bulk_create(
+                (User(id=uuid.uuid4(), email=f'user{i:07d}@benchmark.local') for i in range(existing_users, user_count)),
+                batch_size=5000,
+            )
+            UserRole.objects.bulk_create((UserRole(user=u, role=user_role) for u in users), batch_size=5000)
+        LocalAuthBackend.create_user(*BENCHMARK_ADMIN, roles=('user', 'admin'))
+
+        existing_items = Item.objects.count()
+        if existing_items < item_count:
+            start = time.perf_counter()
+            self.seed_items(existing_items, item_count)
+            rebuild_item_aggregates()
+            self.stdout.write(f'Seeded {item_count - existing_items:,} items in {time.perf_counter() - start:.1f}s')
+
+    @staticmethod
+    def seed_items(start, stop):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO items (id, serial_number, provider, name, category, price, version) "
+                "SELECT md5('bench' || i)::uuid, 'SN-' || lpad(i::text, 9, '0'), 'Provider ' || (i %% 50), "
+                "'Item number ' || i, 'Category ' || (i %% 20), round(((i * 37) %% 100000) / 100.0, 2), 1 "
+                "FROM generate_series(%s, %s) AS i",
+                [start, stop - 1],
+            )
+
+    # --------------------------------
+    # Scenarios
+    # --------------------------------
+    def measure_requests(self, name, client, options, path, **headers):
+        """
+        Times `--requests` GETs of `path` after a few warm-up requests.
+        """
+        for _ in range(3):
+            response = client.get(path, **headers)
+            if response.status_code != 200:
+                raise CommandError(f'{name}: GET {path} returned {response.status_code}')
+
+        timings = []
+        queries = []
+        size = 0
+        for _ in range(options['requests']):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(path, **headers)
+                timings.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            size = len(response.content)
+
+        total = sum(timings)
+        return [{
+            'scenario': name,
+            'path': path,
+            'requests': len(timings),
+            'p50_ms': statistics.median(timings) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+            'max_ms': max(timings) * 1000,
+            'requests_per_second': len(timings) / total if total else 0.0,
+            'queries': max(queries),
+            'response_bytes': size,
+        }]
+
+    def run_items_page(self, client, options):
+        return self.measure_requests('items_page', client, options, '/custom-admin/dashboard/items')
+
+    def run_items_page_deep(self, client, options):
+        # OFFSET pagination near the end of the inventory
+        last_page = max(1, options['items'] // 5 - 1)
+        return self.measure_requests('items_page_deep', client, options, f'/custom-admin/dashboard/items?page={last_page}')
+
+    def run_items_json(self, client, options):
+        return self.measure_requests(
+            'items_json', client, options, '/custom-admin/dashboard/items?page=2', HTTP_ACCEPT='application/json'
+        )
+
+    def run_items_keyset(self, client, options):
+        # Keyset pagination from the middle of the inventory
+        middle = Item.objects.order_by('serial_number', 'id').values_list('serial_number', 'id')[options['items'] // 2]
+        cursor = encode_cursor([middle[0], str(middle[1])])
+        return self.measure_requests(
+            'items_keyset', client, options, f'/custom-admin/dashboard/items?after={cursor}', HTTP_ACCEPT='application/json'
+        )
+
+    def run_items_valuation(self, client, options):
+        # Cold: the price table is loaded from the items table; warm: served from memory
+        path = '/items/valuation/?by=category&discount=5&tax=21'
+        pricing.reset_price_tables()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(path)
+            seconds = time.perf_counter() - start
+        if response.status_code != 200:
+            raise CommandError(f'items_valuation: GET {path} returned {response.status_code}')
+        cold = {
+            'scenario': 'items_valuation_cold',
+            'path': path,
+            'rows': options['items'],
+            'seconds': seconds,
+            'rows_per_second': options['items'] / seconds if seconds else 0.0,
+            'queries': len(captured),
+        }
+        return [cold] + self.measure_requests('items_valuation', client, options, path)
+
+    def run_users_page(self, client, options):
+        return self.measure_requests('users_page', client, options, '/custom-admin/dashboard/users?page=2')
+
+    def run_upload_csv(self, client, options):
+        results = []
+        for rows in [int(r) for r in options['csv_rows'].split(',') if r.strip()]:
+            prefix = f'UP{rows}'
+            upload = csv_upload(rows, prefix)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.post('/upload/csv/', {'csv_file': upload}, HTTP_ACCEPT='application/json')
+                seconds = time.perf_counter() - start
+            if response.status_code != 201:
+                raise CommandError(f'upload_csv: {rows} rows returned {response.status_code}: {response.content[:200]}')
+            results.append({
+                'scenario': 'upload_csv',
+                'rows': rows,
+                'seconds': seconds,
+                'rows_per_second': rows / seconds if seconds else 0.0,
+                'queries': len(captured),
+            })
+            # Back to the seeded state for the next run
+            Item.objects.filter(serial_number__startswith=f'{prefix}-').delete()
+        rebuild_item_aggregates()
+        return results
+
+    def run_download_csv(self, client, options):
+        results = []
+        for export_format in ('csv', 'ndjson'):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(f'/download/csv/?format={export_format}')
+                size = sum(len(chunk) for chunk in response.streaming_content)
+                seconds = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f'download_csv: returned {response.status_code}')
+            results.append({
+                'scenario': 'download_csv',
+                'format': export_format,
+                'rows': options['items'],
+                'seconds': seconds,
+                'rows_per_second': options['items'] / seconds if seconds else 0.0,
+                'megabytes': size / 1e6,
+                'queries': len(captured),
+            })
+        return results
+
+    # --------------------------------
+    # Output
+    # --------------------------------
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def result_key(result):
+        return (result['scenario'], result.get('rows'), result.get('format'))
+
+    def print_results(self, results):
+        for r in results:
+            if 'p50_ms' in r:
+                self.stdout.write(
+                    f"{r['scenario']:<16} p50 {r['p50_ms']:>8.1f}ms  p95 {r['p95_ms']:>8.1f}ms  "
+                    f"{r['requests_per_second']:>8.1f} req/s  {r['queries']:>3} queries"
+                )
+            else:
+                label = f"{r['scenario']} {r.get('format') or r['rows']}"
+                self.stdout.write(
+                    f"{label:<24} {r['seconds']:>8.2f}s  {r['rows_per_second']:>12,.0f} rows/s  {r['queries']:>5} queries"
+                )
+
+    def print_comparison(self, baseline, report):
+        self.stdout.write(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('date')}):")
+        previous = {self.result_key(r): r for r in baseline['results']}
+        for r in report['results']:
+            before = previous.get(self.result_key(r))
+            if before is None:
+                continue
+            metric = 'p50_ms' if 'p50_ms' in r else 'seconds'
+            change = (r[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            self.stdout.write(
+                f"{' '.join(str(part) for part in self.result_key(r) if part is not None):<24} "
+                f"{metric} {before[metric]:.2f} -> {r[metric]:.2f} ({change:+.1f}%)  "
+                f"queries {before['queries']} -> {r['queries']}"
+            )
@@ -0,0 +1,119 @@
+from django.core.management.base import BaseCommand
+from breiflyplatform.exports import EXPORT_HEADER, iter_item_rows, stream_csv, gzip_stream
+from breiflyplatform.models import Item
+from io import StringIO
+import csv
+import json
+import time
+import tracemalloc
+import uuid
+
+
+def legacy_csv_stream(items):
+    """
+    The export path as it was before exports.py: model instances, one chunk per row.
+    """
+    def rows(items):
+        yield EXPORT_HEADER
+        for item in items:
+            yield [item.serial_number, item.provider, item.name, item.category, item.price]
+
+    output = StringIO()
+    writer = csv.writer(output)
+    for row in rows(items):
+        writer.writerow(row)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+
+
+def synthetic_rows(count):
+    for i in range(count):
+        yield (f'SN-{i:09d}', f'Provider {i % 50}', f'Item number {i}', f'Category {i % 20}', round(i * 0.37, 2))
+
+
+def synthetic_items(count):
+    # Same data as synthetic_rows, but paying for model instantiation like a queryset would
+    for row in synthetic_rows(count):
+        yield Item(uuid.uuid4(), *row)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the legacy CSV export path with the buffered exports.py pipeline "
+        "(throughput, chunk count and peak memory). Synthetic rows measure the per-row "
+        "overhead; use --source db to also see the cost of materializing the queryset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Rows to export with --source synthetic.')
+        parser.add_argument(
+            '--source', choices=['synthetic', 'db'], default='synthetic',
+            help='Generate rows in memory, or export the items table of the configured database.',
+        )
+        parser.add_argument('--skip-memory', action='store_true', help='Skip the (slow) tracemalloc pass.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if options['source'] == 'db':
+            rows = Item.objects.count()
+            pipelines = {
+                'legacy': lambda: legacy_csv_stream(Item.objects.order_by('serial_number')),
+                'buffered': lambda: stream_csv(iter_item_rows()),
+                'buffered_gzip': lambda: gzip_stream(stream_csv(iter_item_rows())),
+            }
+        else:
+            pipelines = {
+                'legacy': lambda: legacy_csv_stream(synthetic_items(rows)),
+                'buffered': lambda: stream_csv(synthetic_rows(rows)),
+                'buffered_gzip': lambda: gzip_stream(stream_csv(synthetic_rows(rows))),
+            }
+
+        results = []
+        for name, pipeline in pipelines.items():
+            result = {'pipeline': name, 'source': options['source']}
+            result.update(self.measure_throughput(pipeline, rows))
+            if not options['skip_memory']:
+                result['peak_memory_mb'] = self.measure_peak_memory(pipeline)
+            results.append(result)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for r in results:
+            line = (
+                f"{r['pipeline']:<14} {r['seconds']:>8.2f}s  {r['rows_per_second']:>12,.0f} rows/s  "
+                f"{r['chunks']:>9,} chunks  {r['megabytes']:>8.1f} MB out"
+            )
+            if 'peak_memory_mb' in r:
+                line += f"  peak {r['peak_memory_mb']:.1f} MB"
+            self.stdout.write(line)
+
+    @staticmethod
+    def measure_throughput(pipeline, rows):
+        chunks = 0
+        size = 0
+        start = time.perf_counter()
+        for chunk in pipeline():
+            chunks += 1
+            size += len(chunk)
+        seconds = time.perf_counter() - start
+        return {
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_second': rows / seconds if seconds else 0.0,
+            'chunks': chunks,
+            'megabytes': size / 1e6,
+        }
+
+    @staticmethod
+    def measure_peak_memory(pipeline):
+        tracemalloc.start()
+        try:
+            for _ in pipeline():
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak / 1e6
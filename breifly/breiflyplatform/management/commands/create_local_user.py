@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from breiflyplatform.auth_backends import LocalAuthBackend
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds a user who can sign in with AUTH_BACKEND=local (or resets their password). "
+        "Needs the auth.users, roles and user_roles tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('password')
+        parser.add_argument('--admin', action='store_true', help='Also give the user the admin role.')
+
+    def handle(self, *args, **options):
+        if len(options['password']) < 8:
+            raise CommandError('The password must be at least 8 characters long.')
+        roles = ('user', 'admin') if options['admin'] else ('user',)
+        user = LocalAuthBackend.create_user(options['email'], options['password'], roles=roles)
+        self.stdout.write(f"Local user {user.email} ({user.id}) with roles: {', '.join(roles)}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from breiflyplatform.aggregates import get_item_aggregates, rebuild_item_aggregates
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the per-category / per-provider stock totals from the items table. "
+        "Only needed if items were changed outside the app (e.g. from the Supabase dashboard)."
+    )
+
+    def handle(self, *args, **options):
+        rebuild_item_aggregates()
+        totals = get_item_aggregates()['totals']
+        self.stdout.write(f"Rebuilt item aggregates: {totals['item_count']} items, total value {totals['price_total']}")
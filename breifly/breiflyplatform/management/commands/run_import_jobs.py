@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from breiflyplatform.import_jobs import run_pending_jobs
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued CSV import jobs, and re-queues or fails the ones left behind by a "
+        "worker that stopped (see IMPORT_JOB_STALE_AFTER). Runs until stopped, or once "
+        "with --once (e.g. from cron, or at startup)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Recover and drain the queue once, then exit.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls of the queue.')
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(f'Ran {count} import job(s)')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
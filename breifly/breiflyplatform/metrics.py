@@ -0,0 +1,290 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseNotFound
+import hmac
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Request duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Where the time of one request went. Filled in by the hooks below while the
+    request runs; sync_to_async copies the context, so work done in threads counts too.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.db_connects = 0
+        self.db_connect_seconds = 0.0
+        self.auth_seconds = 0.0
+        self.render_seconds = 0.0
+        # service -> [calls, seconds]
+        self.external = {}
+
+    def server_timing(self, total):
+        entries = [f'total;dur={total * 1000:.1f}']
+        if self.auth_seconds:
+            entries.append(f'auth;dur={self.auth_seconds * 1000:.1f}')
+        if self.db_queries:
+            entries.append(f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"')
+        if self.db_connects:
+            entries.append(f'db-connect;dur={self.db_connect_seconds * 1000:.1f};desc="{self.db_connects} connects"')
+        for service, (calls, seconds) in self.external.items():
+            entries.append(f'{service};dur={seconds * 1000:.1f};desc="{calls} calls"')
+        if self.render_seconds:
+            entries.append(f'render;dur={self.render_seconds * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def timed(field):
+    """
+    Adds the time spent in the block to a RequestMetrics field (auth_seconds, render_seconds...).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            setattr(metrics, field, getattr(metrics, field) + time.perf_counter() - start)
+
+
+@contextmanager
+def timed_external(service):
+    """
+    Times a call to an external service (e.g. Supabase Auth), per request and per process.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics = _current.get()
+        if metrics is not None:
+            calls, total = metrics.external.get(service, (0, 0.0))
+            metrics.external[service] = [calls + 1, total + seconds]
+        registry.observe_external(service, seconds)
+
+
+def record_db_connect(seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.db_connects += 1
+        metrics.db_connect_seconds += seconds
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+# --------------------------------
+# Process-wide registry
+# --------------------------------
+def metric_lines(name, help_text, kind, samples):
+    """
+    One metric in the Prometheus text format; `samples` are (labels dict, value) pairs.
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+    return lines
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms in the Prometheus text format. Each worker process has
+    its own registry, so scrape every worker (or sum them) for a full picture.
+
+    Stats kept elsewhere (token verifier, role cache, DB connects) are added with
+    register(): a function returning their lines, called on every render.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.collectors = []
+        self.reset()
+
+    def register(self, collector):
+        self.collectors.append(collector)
+
+    def reset(self):
+        # (view, method, status) -> [bucket counts..., count, sum]
+        self.requests = {}
+        # view -> [queries, db seconds, render seconds, auth seconds, response bytes]
+        self.views = {}
+        # service -> [calls, seconds]
+        self.external = {}
+
+    def observe_request(self, view, method, status, duration, metrics, size):
+        with self._lock:
+            key = (view, method, f'{status // 100}xx')
+            histogram = self.requests.setdefault(key, [0] * len(DURATION_BUCKETS) + [0, 0.0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += duration
+            totals = self.views.setdefault(view, [0, 0.0, 0.0, 0.0, 0])
+            totals[0] += metrics.db_queries
+            totals[1] += metrics.db_seconds
+            totals[2] += metrics.render_seconds
+            totals[3] += metrics.auth_seconds
+            totals[4] += size
+
+    def observe_external(self, service, seconds):
+        with self._lock:
+            calls, total = self.external.get(service, (0, 0.0))
+            self.external[service] = (calls + 1, total + seconds)
+
+    def render(self):
+        lines = [
+            '# HELP breifly_request_duration_seconds Time to produce a response, per view.',
+            '# TYPE breifly_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            for (view, method, status), histogram in sorted(self.requests.items()):
+                labels = f'view="{view}",method="{method}",status="{status}"'
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    lines.append(f'breifly_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'breifly_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[-2]}')
+                lines.append(f'breifly_request_duration_seconds_count{{{labels}}} {histogram[-2]}')
+                lines.append(f'breifly_request_duration_seconds_sum{{{labels}}} {histogram[-1]:.6f}')
+
+            counters = (
+                ('breifly_db_queries_total', 'Database queries run, per view.', 0, 'd'),
+                ('breifly_db_query_seconds_total', 'Time spent in database queries, per view.', 1, '.6f'),
+                ('breifly_template_render_seconds_total', 'Time spent rendering templates, per view.', 2, '.6f'),
+                ('breifly_auth_seconds_total', 'Time spent authenticating the caller, per view.', 3, '.6f'),
+                ('breifly_response_bytes_total', 'Response body bytes (non-streaming), per view.', 4, 'd'),
+            )
+            for name, help_text, index, fmt in counters:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for view, totals in sorted(self.views.items()):
+                    lines.append(f'{name}{{view="{view}"}} {totals[index]:{fmt}}')
+
+            lines += [
+                '# HELP breifly_external_calls_total Calls to external services.',
+                '# TYPE breifly_external_calls_total counter',
+            ]
+            for service, (calls, _) in sorted(self.external.items()):
+                lines.append(f'breifly_external_calls_total{{service="{service}"}} {calls}')
+            lines += [
+                '# HELP breifly_external_call_seconds_total Time spent waiting on external services.',
+                '# TYPE breifly_external_call_seconds_total counter',
+            ]
+            for service, (_, seconds) in sorted(self.external.items()):
+                lines.append(f'breifly_external_call_seconds_total{{service="{service}"}} {seconds:.6f}')
+        for collector in self.collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+# --------------------------------
+# Middleware and endpoint
+# --------------------------------
+class MetricsMiddleware:
+    """
+    Measures every request: view, duration, DB queries, DB connects, auth, external
+    calls, template rendering and response size. Adds a Server-Timing header
+    (settings.SERVER_TIMING_HEADER) and logs requests running more than
+    settings.METRICS_QUERY_WARNING queries, the usual sign of an N+1.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+
+    @staticmethod
+    def finish(request, response, metrics):
+        duration = time.perf_counter() - metrics.started
+        view = metrics.view or 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        registry.observe_request(view, request.method, response.status_code, duration, metrics, size)
+
+        if metrics.db_queries > settings.METRICS_QUERY_WARNING:
+            logger.warning(
+                f"{request.method} {request.path} ({view}) ran {metrics.db_queries} queries "
+                f"in {metrics.db_seconds * 1000:.1f}ms"
+            )
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = metrics.server_timing(duration)
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Disabled unless settings.METRICS_TOKEN is set; the
+    scraper sends it as a bearer token.
+    """
+    expected = settings.METRICS_TOKEN
+    if not expected:
+        return HttpResponseNotFound()
+    provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(provided.encode(), expected.encode()):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4')
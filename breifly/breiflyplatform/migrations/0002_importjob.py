@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2025-04-02 10:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('file_name', models.TextField()),
+                ('file_path', models.TextField()),
+                ('on_error', models.CharField(default='abort', max_length=8)),
+                ('created_by', models.UUIDField(blank=True, null=True)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('created_items', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+                ('errors', models.JSONField(default=list)),
+                ('rows_per_second', models.FloatField(default=0)),
+                ('message', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'import_jobs',
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Unique index on items.serial_number, needed by the upsert CSV import
+# (INSERT ... ON CONFLICT (serial_number) DO UPDATE).
+#
+# `items` is not managed by Django, so the index is created by hand, only when
+# the table exists (it doesn't in a fresh test database).
+
+from django.db import migrations
+
+INDEX_NAME = 'items_serial_number_key'
+
+
+def table_exists(connection, table):
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if not table_exists(connection, 'items'):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT serial_number FROM items GROUP BY serial_number HAVING COUNT(*) > 1 LIMIT 10'
+        )
+        duplicates = [row[0] for row in cursor.fetchall()]
+        if duplicates:
+            raise RuntimeError(
+                f"Cannot add a unique index on items.serial_number, duplicated serial numbers: {duplicates}"
+            )
+        concurrently = 'CONCURRENTLY ' if connection.vendor == 'postgresql' else ''
+        cursor.execute(
+            f'CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS {INDEX_NAME} ON items (serial_number)'
+        )
+
+
+def drop_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if not table_exists(connection, 'items'):
+        return
+    concurrently = 'CONCURRENTLY ' if connection.vendor == 'postgresql' else ''
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP INDEX {concurrently}IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('breiflyplatform', '0002_importjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2025-04-09 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0003_items_serial_number_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='mode',
+            field=models.CharField(default='insert', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='updated_items',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='unchanged_items',
+            field=models.IntegerField(default=0),
+        ),
+    ]
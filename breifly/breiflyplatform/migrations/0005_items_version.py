@@ -0,0 +1,40 @@
+# Version counter on items, used for optimistic concurrency on item updates.
+#
+# `items` is not managed by Django, so the column is added by hand, only when
+# the table exists (it doesn't in a fresh test database).
+
+from django.db import migrations
+
+
+def table_exists(connection, table):
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
+
+
+def add_column(apps, schema_editor):
+    connection = schema_editor.connection
+    if not table_exists(connection, 'items'):
+        return
+    with connection.cursor() as cursor:
+        columns = [c.name for c in connection.introspection.get_table_description(cursor, 'items')]
+        if 'version' not in columns:
+            cursor.execute('ALTER TABLE items ADD COLUMN version integer NOT NULL DEFAULT 1')
+
+
+def drop_column(apps, schema_editor):
+    connection = schema_editor.connection
+    if not table_exists(connection, 'items'):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE items DROP COLUMN IF EXISTS version')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0004_importjob_mode'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_column, drop_column),
+    ]
@@ -0,0 +1,73 @@
+# Indexes behind the item search (see item_search.py):
+# - trigram GIN indexes on name and provider for `name ILIKE '%word%'`, as written
+#   by item_search.SubstringILike (not icontains, which wraps the column in UPPER())
+# - text_pattern_ops on serial_number for prefix LIKE 'SN%'
+# - plain btree indexes on category and price for the facets and range filters
+#
+# `items` is not managed by Django, so the indexes are created by hand, only when
+# the table exists and the database is Postgres. The trigram indexes need the
+# pg_trgm extension; without it they are skipped and substring search falls back
+# to a sequential scan.
+
+from django.db import migrations
+import warnings
+
+TRIGRAM_INDEXES = {
+    'items_name_trgm': 'USING gin (name gin_trgm_ops)',
+    'items_provider_trgm': 'USING gin (provider gin_trgm_ops)',
+}
+BTREE_INDEXES = {
+    'items_serial_number_pattern': '(serial_number text_pattern_ops)',
+    'items_category': '(category)',
+    'items_price': '(price)',
+}
+
+
+def table_exists(connection, table):
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
+
+
+def enable_trigram(cursor):
+    cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    if cursor.fetchone() is None:
+        return False
+    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    return True
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not table_exists(connection, 'items'):
+        return
+    with connection.cursor() as cursor:
+        indexes = dict(BTREE_INDEXES)
+        if enable_trigram(cursor):
+            indexes.update(TRIGRAM_INDEXES)
+        else:
+            warnings.warn('pg_trgm is not available, skipping the trigram indexes on items.')
+        for name, definition in indexes.items():
+            cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON items {definition}')
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not table_exists(connection, 'items'):
+        return
+    with connection.cursor() as cursor:
+        for name in [*TRIGRAM_INDEXES, *BTREE_INDEXES]:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('breiflyplatform', '0005_items_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,49 @@
+# Per-category / per-provider stock totals (see aggregates.py), filled from the
+# current items. `items` is not managed by Django and doesn't exist in a fresh
+# test database, in which case the table starts empty.
+
+from django.db import migrations, models
+
+
+def table_exists(connection, table):
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
+
+
+def populate(apps, schema_editor):
+    connection = schema_editor.connection
+    if not table_exists(connection, 'items'):
+        return
+    with connection.cursor() as cursor:
+        for dimension in ('category', 'provider'):
+            cursor.execute(
+                f"INSERT INTO item_aggregates (dimension, value, item_count, price_total) "
+                f"SELECT %s, COALESCE({dimension}, ''), COUNT(*), COALESCE(SUM(price), 0) "
+                f"FROM items GROUP BY COALESCE({dimension}, '')",
+                [dimension],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0006_items_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=16)),
+                ('value', models.TextField()),
+                ('item_count', models.BigIntegerField(default=0)),
+                ('price_total', models.FloatField(default=0)),
+            ],
+            options={
+                'db_table': 'item_aggregates',
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'value'), name='item_aggregates_dimension_value')],
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Inventory version used for ETag / Last-Modified on item listings and exports.
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_state(apps, schema_editor):
+    InventoryState = apps.get_model('breiflyplatform', 'InventoryState')
+    InventoryState.objects.using(schema_editor.connection.alias).get_or_create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0007_item_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryState',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'inventory_state',
+            },
+        ),
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Credentials table for the local auth backend.
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0008_inventorystate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocalCredential',
+            fields=[
+                ('user_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('password', models.CharField(max_length=128)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'local_credentials',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# User list version used to key the cached user management fragments.
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_state(apps, schema_editor):
+    UserDirectoryState = apps.get_model('breiflyplatform', 'UserDirectoryState')
+    UserDirectoryState.objects.using(schema_editor.connection.alias).get_or_create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0009_localcredential'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDirectoryState',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'user_directory_state',
+            },
+        ),
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Offer history (see offers.py):
+# - created_at, total and line_count columns on previous_offers, so the history
+#   is listed without reading the (large) items JSON
+# - (user_id, created_at, id) index for the newest-first keyset pagination
+# - GIN jsonb_path_ops index on items for "offers containing item X" (items @> ...)
+#
+# `previous_offers` is not managed by Django, so this is done by hand, only when
+# the table exists. The indexes are Postgres only, and the GIN index needs `items`
+# to be jsonb.
+
+from django.db import migrations
+
+COLUMNS = {
+    'created_at': 'timestamp with time zone NOT NULL DEFAULT now()',
+    'total': 'double precision NOT NULL DEFAULT 0',
+    'line_count': 'integer NOT NULL DEFAULT 0',
+}
+
+
+def table_exists(connection, table):
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
+
+
+def add_columns(apps, schema_editor):
+    connection = schema_editor.connection
+    if not table_exists(connection, 'previous_offers'):
+        return
+    with connection.cursor() as cursor:
+        columns = [c.name for c in connection.introspection.get_table_description(cursor, 'previous_offers')]
+        for name, definition in COLUMNS.items():
+            if name not in columns:
+                cursor.execute(f'ALTER TABLE previous_offers ADD COLUMN {name} {definition}')
+
+
+def drop_columns(apps, schema_editor):
+    connection = schema_editor.connection
+    if not table_exists(connection, 'previous_offers'):
+        return
+    with connection.cursor() as cursor:
+        for name in COLUMNS:
+            cursor.execute(f'ALTER TABLE previous_offers DROP COLUMN IF EXISTS {name}')
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not table_exists(connection, 'previous_offers'):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS previous_offers_user_created '
+            'ON previous_offers (user_id, created_at DESC, id DESC)'
+        )
+        cursor.execute(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = 'previous_offers' AND column_name = 'items' AND table_schema = current_schema()"
+        )
+        if cursor.fetchone() == ('jsonb',):
+            cursor.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS previous_offers_items_gin '
+                'ON previous_offers USING gin (items jsonb_path_ops)'
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not table_exists(connection, 'previous_offers'):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DROP INDEX CONCURRENTLY IF EXISTS previous_offers_items_gin')
+        cursor.execute('DROP INDEX CONCURRENTLY IF EXISTS previous_offers_user_created')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('breiflyplatform', '0010_userdirectorystate'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_columns, drop_columns),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
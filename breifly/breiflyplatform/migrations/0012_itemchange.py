@@ -0,0 +1,27 @@
+# Change log of the items table, read by the /items/changes/ feed.
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0011_previous_offers_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('item_id', models.UUIDField()),
+                ('action', models.CharField(max_length=8)),
+                ('serial_number', models.TextField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'item_changes',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Stock totals are summed in integer cents instead of a float (see aggregates.py).
+# Recomputed from the items when the table exists, otherwise converted from the
+# float totals.
+
+from django.db import migrations, models
+
+
+def table_exists(connection, table):
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
+
+
+def to_cents(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if not table_exists(connection, 'items'):
+            cursor.execute("UPDATE item_aggregates SET price_cents = ROUND(price_total * 100)")
+            return
+        cursor.execute("DELETE FROM item_aggregates")
+        for dimension in ('category', 'provider'):
+            cursor.execute(
+                # price_total has no database default and is dropped right after
+                f"INSERT INTO item_aggregates (dimension, value, item_count, price_total, price_cents) "
+                f"SELECT %s, COALESCE({dimension}, ''), COUNT(*), 0, "
+                f"COALESCE(SUM(CAST(ROUND(CAST(price AS numeric) * 100) AS bigint)), 0) "
+                f"FROM items GROUP BY COALESCE({dimension}, '')",
+                [dimension],
+            )
+
+
+def to_price_total(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("UPDATE item_aggregates SET price_total = price_cents / 100.0")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breiflyplatform', '0013_importjob_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemaggregate',
+            name='price_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(to_cents, to_price_total),
+        migrations.RemoveField(
+            model_name='itemaggregate',
+            name='price_total',
+        ),
+    ]
@@ -37,11 +37,12 @@ class UserRole(models.Model):
 # Item Model
 class Item(models.Model):
     id = models.UUIDField(primary_key=True)  
-    serial_number = models.TextField()
+    serial_number = models.TextField(unique=True)  # Unique index added by migration 0003
     provider = models.TextField(blank=True, null=True)
     name = models.TextField()
     category = models.TextField(blank=True, null=True)
     price = models.FloatField(blank=True, null=True)
+    version = models.IntegerField(default=1)  # Bumped on every update, added by migration 0005
 
     class Meta:
         db_table = 'items'
@@ -50,11 +51,117 @@ class Item(models.Model):
 # Previous Offer Model
 class PreviousOffer(models.Model):
     id = models.UUIDField(primary_key=True)  
-    items = models.JSONField()
+    items = models.JSONField()  # Price snapshot of every line, see offers.py
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, db_column='user_id', related_name='previous_offers'
     )
+    # Added by migration 0011
+    created_at = models.DateTimeField(default=now)
+    total = models.FloatField(default=0)
+    line_count = models.IntegerField(default=0)
 
     class Meta:
         db_table = 'previous_offers'
         managed = False  
+
+# CSV Import Job Model (lives in the 'jobs' database, see routers.py)
+class ImportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    file_name = models.TextField()
+    file_path = models.TextField()
+    on_error = models.CharField(max_length=8, default='abort')
+    mode = models.CharField(max_length=8, default='insert')
+    created_by = models.UUIDField(blank=True, null=True)
+    rows_processed = models.IntegerField(default=0)
+    created_items = models.IntegerField(default=0)
+    updated_items = models.IntegerField(default=0)
+    unchanged_items = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list)
+    rows_per_second = models.FloatField(default=0)
+    message = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Queue bookkeeping, see import_jobs.claim_next_job / recover_stale_jobs
+    worker = models.CharField(max_length=255, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'import_jobs'
+
+
+# Stock count and value per category / provider, kept up to date by aggregates.py
+class ItemAggregate(models.Model):
+    CATEGORY = 'category'
+    PROVIDER = 'provider'
+
+    dimension = models.CharField(max_length=16)
+    value = models.TextField()  # Items without a category / provider are counted under ''
+    item_count = models.BigIntegerField(default=0)
+    price_cents = models.BigIntegerField(default=0)  # Summed in cents so the totals don't drift
+
+    class Meta:
+        db_table = 'item_aggregates'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'value'], name='item_aggregates_dimension_value'),
+        ]
+
+
+# Single row counting changes to the items, see inventory_state.py
+class InventoryState(models.Model):
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    version = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = 'inventory_state'
+
+
+# Single row counting changes to the users and their roles, see page_cache.py
+class UserDirectoryState(models.Model):
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    version = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = 'user_directory_state'
+
+
+# Passwords for the local auth backend (see auth_backends.py), not used with Supabase
+class LocalCredential(models.Model):
+    user_id = models.UUIDField(primary_key=True)  # id of the auth.users row
+    email = models.EmailField(unique=True)
+    password = models.CharField(max_length=128)
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = 'local_credentials'
+
+
+# Feed of item writes for incremental syncs, see changes.py
+class ItemChange(models.Model):
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+
+    id = models.BigAutoField(primary_key=True)  # The feed cursor, in commit order
+    item_id = models.UUIDField()
+    action = models.CharField(max_length=8)
+    serial_number = models.TextField(blank=True, null=True)  # Kept on deletes only
+    changed_at = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = 'item_changes'
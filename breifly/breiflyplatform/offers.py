@@ -0,0 +1,100 @@
+from django.conf import settings
+from .models import Item, PreviousOffer
+from .pagination import keyset_page
+from .pricing import from_cents, line_totals, to_cents
+import uuid
+
+# Item columns copied into every offer line, as they were when the offer was made
+SNAPSHOT_FIELDS = ('serial_number', 'name', 'provider', 'category', 'price')
+# Columns listed in the offer history (the lines are only read for a single offer)
+HISTORY_FIELDS = ('id', 'user_id', 'created_at', 'total', 'line_count')
+
+
+class OfferError(ValueError):
+    """
+    The offer request is invalid; the message is safe to show to the caller.
+    """
+
+
+def parse_offer_lines(data):
+    """
+    Reads {"items": [{"id": ..., "quantity": n}, ...]} (or plain ids, quantity 1).
+    Returns {item_id: quantity}; repeated items are merged.
+    """
+    lines = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(lines, list) or not lines:
+        raise OfferError('items must be a non-empty list')
+    if len(lines) > settings.OFFER_MAX_LINES:
+        raise OfferError(f'An offer can have at most {settings.OFFER_MAX_LINES} lines')
+
+    quantities = {}
+    for line in lines:
+        item_id, quantity = (line.get('id'), line.get('quantity', 1)) if isinstance(line, dict) else (line, 1)
+        try:
+            item_id = uuid.UUID(str(item_id))
+        except ValueError:
+            raise OfferError(f'Invalid item id {item_id}')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise OfferError('quantity must be a positive integer')
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
+
+
+def build_offer(user_id, quantities):
+    """
+    Snapshots the current price of every line with one query and saves the offer.
+    Raises OfferError if some items don't exist.
+    """
+    items = Item.objects.filter(id__in=list(quantities)).values('id', *SNAPSHOT_FIELDS)
+    found = {row['id']: row for row in items}
+    missing = [str(item_id) for item_id in quantities if item_id not in found]
+    if missing:
+        raise OfferError(f"Items not found: {', '.join(missing)}")
+
+    # Same order as requested; totals in cents so hundreds of lines add up exactly
+    rows = [found[item_id] for item_id in quantities]
+    totals = line_totals([to_cents(row['price']) for row in rows], quantities.values())
+    lines = [
+        {
+            'item_id': str(row['id']),
+            **{field: row[field] for field in SNAPSHOT_FIELDS},
+            'quantity': quantity,
+            'line_total': from_cents(line_total),
+        }
+        for row, quantity, line_total in zip(rows, quantities.values(), totals)
+    ]
+
+    return PreviousOffer.objects.create(
+        id=uuid.uuid4(),
+        user_id=user_id,
+        items=lines,
+        total=from_cents(sum(totals)),
+        line_count=len(lines),
+    )
+
+
+def offer_history(cursor=None, per_page=None, user_id=None, item_id=None):
+    """
+    Offers newest first, without their lines. `user_id` narrows to one user's offers,
+    `item_id` to the offers that contained that item (a GIN lookup on the lines,
+    see migration 0011).
+    """
+    offers = PreviousOffer.objects.values(*HISTORY_FIELDS)
+    if user_id is not None:
+        offers = offers.filter(user_id=user_id)
+    if item_id is not None:
+        offers = offers.filter(items__contains=[{'item_id': str(item_id)}])
+    return keyset_page(offers, ('created_at', 'id'), cursor, per_page or settings.OFFERS_PER_PAGE, descending=True)
+
+
+def offer_as_dict(offer, with_lines=True):
+    data = {
+        'id': str(offer.id),
+        'user_id': str(offer.user_id),
+        'created_at': offer.created_at.isoformat(),
+        'total': offer.total,
+        'line_count': offer.line_count,
+    }
+    if with_lines:
+        data['items'] = offer.items
+    return data
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db.models import F
+from django.utils.functional import SimpleLazyObject
+from django.utils.timezone import now
+from .inventory_state import get_inventory_state
+from .models import UserDirectoryState
+import hashlib
+
+# The admin pages cache their data heavy parts ({% cache %} blocks in the templates)
+# under a key made of the caller's roles, the page / filters and the version of the
+# data shown. Writes bump the version (bump_inventory_version for items,
+# bump_user_directory_version for users and roles), so the next GET misses and
+# stale fragments simply age out. The rest of the page (CSRF token, navbar) is
+# rendered on every request.
+
+STATE_ID = 1
+
+
+def bump_user_directory_version():
+    """
+    Marks the users or their roles as changed. Call it in the same transaction as the writes.
+    """
+    updated = UserDirectoryState.objects.filter(id=STATE_ID).update(version=F('version') + 1, updated_at=now())
+    if not updated:
+        UserDirectoryState.objects.get_or_create(id=STATE_ID)
+
+
+def get_user_directory_version():
+    return UserDirectoryState.objects.filter(id=STATE_ID).values_list('version', flat=True).first() or 0
+
+
+def get_items_version():
+    return get_inventory_state().version
+
+
+def fragment_context(roles, version, *variant):
+    """
+    Template context for a {% cache fragment_timeout <name> fragment_key %} block.
+    """
+    key = repr((sorted(roles), version, variant))
+    return {
+        'fragment_key': hashlib.sha1(key.encode()).hexdigest()[:16],
+        'fragment_timeout': settings.PAGE_FRAGMENT_CACHE_TIMEOUT,
+    }
+
+
+def lazy(func):
+    """
+    Defers a query until the template reads the value, i.e. until a cache miss.
+    """
+    return SimpleLazyObject(func)
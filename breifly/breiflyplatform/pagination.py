@@ -0,0 +1,112 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+import base64
+import json
+
+
+# --------------------------------
+# Keyset (seek) pagination
+# --------------------------------
+def encode_cursor(values):
+    """
+    Encodes the sort key of the last row on a page into an opaque, URL safe cursor.
+    """
+    raw = json.dumps([str(v) for v in values], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """
+    Decodes a cursor produced by encode_cursor. Returns None if it is not valid.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+class InvalidCursor(ValueError):
+    """
+    The `after` cursor was not produced by this listing; callers answer 400.
+    """
+
+
+def check_cursor(cursor, *fields):
+    """
+    Raises InvalidCursor unless `cursor` is empty or holds a valid value for each of
+    `fields`, for views that only run the paginated query later (e.g. on a cache miss).
+    """
+    if not cursor:
+        return
+    values = decode_cursor(cursor, len(fields))
+    if values is None:
+        raise InvalidCursor('Invalid cursor')
+    try:
+        for field, value in zip(fields, values):
+            field.to_python(value)
+    except ValidationError:
+        raise InvalidCursor('Invalid cursor')
+
+
+class KeysetPage:
+    """
+    One page of a keyset paginated queryset.
+    Unlike a Paginator page it has no total count or page numbers, only a way forward.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor, has_previous):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous or self.has_next()
+
+
+def keyset_page(queryset, key_fields, cursor, per_page, descending=False):
+    """
+    Returns the page of `queryset` that follows `cursor`, ordered by `key_fields`
+    (newest first with `descending`, e.g. on a timestamp).
+    The last key field must be unique so ties on the leading fields are broken.
+    Cost depends on the page size only, not on how deep the page is.
+    Raises InvalidCursor for a cursor that can't be decoded or doesn't fit the keys.
+    """
+    first, tiebreak = key_fields
+    if descending:
+        queryset = queryset.order_by(f'-{first}', f'-{tiebreak}')
+    else:
+        queryset = queryset.order_by(first, tiebreak)
+    after = decode_cursor(cursor, 2)
+    if cursor and after is None:
+        raise InvalidCursor('Invalid cursor')
+    if after is not None:
+        beyond, before = ('lte', 'gte') if descending else ('gte', 'lte')
+        try:
+            queryset = queryset.filter(**{f'{first}__{beyond}': after[0]}).exclude(
+                Q(**{first: after[0]}) & Q(**{f'{tiebreak}__{before}': after[1]})
+            )
+        except ValidationError:
+            raise InvalidCursor('Invalid cursor')
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[first], last[tiebreak]])
+    return KeysetPage(rows, next_cursor, has_previous=after is not None)
@@ -0,0 +1,187 @@
+from array import array
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from django.conf import settings
+from django.db.models import BigIntegerField, DecimalField, F, Func, TextField, Value
+from django.db.models.functions import Cast, Coalesce, Round
+from operator import mul
+from .inventory_state import get_inventory_state
+from .models import Item
+import threading
+
+# Money is handled as integer cents so sums don't drift, and rates (discount, tax)
+# as integer basis points (1% = 100). Prices are still stored as floats in
+# items.price; they are converted once, when read.
+CENTS = 100
+BASIS_POINTS = 10000  # 100%
+
+
+
+class Numeric(Func):
+    """
+    CAST(... AS numeric). Postgres converts a double through its first 15
+    significant digits, so 2.675 becomes 2.675 rather than 2.67499999...
+    """
+    template = 'CAST(%(expressions)s AS numeric)'
+    output_field = DecimalField()
+
+
+# items.price in cents: ROUND(price::numeric * 100), i.e. half away from zero on
+# the decimal value, the same rule as to_cents on Postgres. SQLite (used in some
+# tests) has no numeric type and rounds the double, so 1.005 gives 100 there
+# instead of 101. The numeric arithmetic makes a full scan (a cold PriceTable.load)
+# noticeably slower than float math would, which is paid once per inventory version.
+PRICE_CENTS = Cast(Round(Numeric(Coalesce(F('price'), Value(0.0))) * CENTS), BigIntegerField())
+
+
+class PricingError(ValueError):
+    """
+    A rate or amount is invalid; the message is safe to show to the caller.
+    """
+
+
+def to_cents(price):
+    """
+    A price in cents, rounded half away from zero (ROUND_HALF_UP) from its first
+    15 significant digits, exactly as PRICE_CENTS does on Postgres.
+    """
+    if price is None:
+        return 0
+    return int((Decimal(format(float(price), '.15g')) * CENTS).to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    # n / 100 prints as the exact two decimal amount
+    return cents / CENTS
+
+
+def parse_rate(value, maximum=None):
+    """
+    A percentage ("7.5", 7.5) as basis points. Empty means 0.
+    """
+    if value in (None, ''):
+        return 0
+    try:
+        rate = Decimal(str(value)) * CENTS
+    except InvalidOperation:
+        raise PricingError(f'Invalid rate {value}')
+    if not rate.is_finite() or rate < 0:
+        raise PricingError('Rates can not be negative')
+    if maximum is not None and rate > maximum * CENTS:
+        raise PricingError(f'Rate can be at most {maximum}%')
+    return int(rate.to_integral_value(ROUND_HALF_UP))
+
+
+def apply_rate(cents, basis_points):
+    """
+    `basis_points` of `cents`, rounded half up to the cent.
+    """
+    amount = (abs(cents) * basis_points + BASIS_POINTS // 2) // BASIS_POINTS
+    return amount if cents >= 0 else -amount
+
+
+class Quote:
+    """
+    A subtotal with a discount and then tax applied, all in cents.
+    """
+    def __init__(self, subtotal, discount_rate=0, tax_rate=0):
+        self.subtotal = subtotal
+        self.discount = apply_rate(subtotal, discount_rate)
+        self.tax = apply_rate(subtotal - self.discount, tax_rate)
+        self.total = subtotal - self.discount + self.tax
+
+    def as_dict(self):
+        return {
+            'subtotal': from_cents(self.subtotal),
+            'discount': from_cents(self.discount),
+            'tax': from_cents(self.tax),
+            'total': from_cents(self.total),
+        }
+
+
+def line_totals(unit_cents, quantities):
+    """
+    Unit price times quantity for every line, in one pass.
+    """
+    return array('q', map(mul, unit_cents, quantities))
+
+
+# --------------------------------
+# Inventory valuation
+# --------------------------------
+class PriceTable:
+    """
+    Every item's price in cents in one array('q') (8 bytes per item), ordered by
+    `dimension` so each category / provider is a contiguous slice. Totals are
+    then sums over slices, which run in C.
+    """
+    def __init__(self, dimension, groups, cents, version=None):
+        self.dimension = dimension
+        self.groups = groups  # [(value, start, end)]
+        self.cents = cents
+        self.version = version
+
+    @classmethod
+    def load(cls, dimension, version=None, chunk_size=None):
+        rows = (
+            Item.objects.annotate(group=Coalesce(dimension, Value(''), output_field=TextField()), cents=PRICE_CENTS)
+            .order_by()
+            .values_list('group', 'cents')
+            .iterator(chunk_size=chunk_size or settings.EXPORT_FETCH_SIZE)
+        )
+        # Grouped here rather than with ORDER BY: sorting a million rows costs the
+        # database more than appending them to one array per group
+        by_group = {}
+        for value, price in rows:
+            prices = by_group.get(value)
+            if prices is None:
+                prices = by_group[value] = array('q')
+            prices.append(price)
+
+        cents = array('q')
+        groups = []
+        for value in sorted(by_group):
+            start = len(cents)
+            cents.extend(by_group.pop(value))
+            groups.append((value, start, len(cents)))
+        return cls(dimension, groups, cents, version)
+
+    def valuation(self, discount_rate=0, tax_rate=0):
+        """
+        Item count and value per group and overall, largest value first.
+        """
+        cents = memoryview(self.cents)
+        groups = []
+        for value, start, end in self.groups:
+            quote = Quote(sum(cents[start:end]), discount_rate, tax_rate)
+            groups.append({'value': value, 'item_count': end - start, **quote.as_dict()})
+        groups.sort(key=lambda group: (-group['total'], group['value']))
+        return {
+            self.dimension: groups,
+            'totals': {'item_count': len(self.cents), **Quote(sum(cents), discount_rate, tax_rate).as_dict()},
+        }
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def get_price_table(dimension):
+    """
+    The PriceTable for the current inventory version. Loaded once per process and
+    version; item writes bump the version (see inventory_state.py), so the next
+    call reloads.
+    """
+    version = get_inventory_state().version
+    table = _tables.get(dimension)
+    if table is not None and table.version == version:
+        return table
+    with _tables_lock:
+        table = _tables.get(dimension)
+        if table is None or table.version != version:
+            table = _tables[dimension] = PriceTable.load(dimension, version)
+    return table
+
+
+def reset_price_tables():
+    with _tables_lock:
+        _tables.clear()
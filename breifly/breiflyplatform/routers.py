@@ -0,0 +1,28 @@
+class JobsRouter:
+    """
+    Keeps the background job tables in the 'jobs' database.
+
+    Progress is written while the import itself is still inside its transaction on
+    'default', so it has to go through a separate connection to be visible.
+    """
+    job_models = {'importjob'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.model_name in self.job_models:
+            return 'jobs'
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.model_name in self.job_models:
+            return 'jobs'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name in self.job_models:
+            return db == 'jobs'
+        if db == 'jobs':
+            return False
+        return None
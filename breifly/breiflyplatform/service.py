@@ -1,12 +1,30 @@
-from .supabase_client import supabase
-
-from .helper_functions import get_access_token, sanitize, wants_json_response
+from .auth_backends import get_auth_backend
+from .user_context import get_user_context, user_context_for
+from .helper_functions import clean_item_fields, sanitize, wants_json_response
+from .authorization import invalidate_user_roles
+from .pagination import InvalidCursor, keyset_page
+from .csv_import import CsvItemImporter
+from .import_jobs import enqueue_import, job_status
+from .exports import iter_item_rows
+from .item_batch import BatchConflict, apply_item_batch
+from .pricing import PricingError, get_price_table, parse_rate
+from .offers import OfferError, build_offer, offer_as_dict, offer_history, parse_offer_lines
+from .item_search import filter_items
+from .aggregates import AGGREGATE_FIELDS, DIMENSIONS, get_item_aggregates, record_item_changes
+from .inventory_state import bump_inventory_version
+from .changes import changes_since, get_changes_cursor, log_item_changes
+from .page_cache import bump_user_directory_version
 from .models import (
     UserRole,
     User,
     Item,
-    PreviousOffer
+    PreviousOffer,
+    ImportJob
 )
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
 from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.http import JsonResponse, HttpResponseNotFound, HttpResponseForbidden
@@ -15,39 +33,27 @@ import csv
 import logging
 import json
 import uuid
-from io import TextIOWrapper
 logger = logging.getLogger(__name__)
 
+USERS_PER_PAGE = 5
+ITEMS_PER_PAGE = 5
+# Columns shown on the stock management page
+ITEM_LIST_FIELDS = ('serial_number', 'provider', 'name', 'category', 'price', 'version')
+
 # --------------------------------
 # User Service
 # --------------------------------
 def get_current_user():
     """
-    Gets the current user from the active session 
+    Gets the user making the current request (None if anonymous), see user_context.py
     """
-    try:
-        session = supabase.auth.get_session()
-        if session:
-            user = session.user
-            return user
-        else:
-            return None
-    except Exception as e:
-        print(f"Error getting user: {e}")
-        return None
+    return get_user_context().user
 
 def get_role_by_id(request):
     """
-    Gets the role of the user by id 
+    Gets the role of the user by id. Resolved once per request, see user_context.py
     """
-    user_authenticated, user_data = get_access_token(request)
-
-    user_id = user_data.id
-    # Get Role of the user
-    user_roles = UserRole.objects.filter(user_id=user_id).select_related('role')
-    # Get the name of the role
-    roles = [user_role.role.name for user_role in user_roles]
-    return user_authenticated, user_data, roles, 
+    return user_context_for(request).as_tuple()
 
 
 
@@ -59,12 +65,12 @@ def perform_login(request, email, password):
     Performs login 
     """
     try:
-        response = supabase.auth.sign_in_with_password({"email": email, "password": password})
-        if response.user:
-            request.session['access_token'] = response.session.access_token
+        session = get_auth_backend().sign_in(email, password)
+        if session:
+            request.session['access_token'] = session.access_token
             request.session['user'] = {
-                "id": response.user.id,
-                "email": response.user.email,
+                "id": session.user_id,
+                "email": session.email,
             }
             return JsonResponse({'success': True, 'redirect_url': '/en-us/home/'}, status=200)
 
@@ -93,62 +99,54 @@ def process_login_request(request):
 # --------------------------------
 # Admin Service
 # --------------------------------
-def get_all_users(request):
+def get_users_page(request, page=None, per_page=USERS_PER_PAGE):
     """
-    Gets all active users.
+    Gets one page of active users with their roles.
+    Runs a constant number of queries (count, page of users, their roles)
+    regardless of how many users exist.
     """
     # Check the role of the user
-    user = get_current_user()
-    user_id = user.id
-    user_roles = UserRole.objects.filter(user_id=user_id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
+    user_authenticated, user_data, roles = get_role_by_id(request)
     if "admin" in roles:
-            all_users = User.objects.all()
-            user_data = []
-
-            for u in all_users:
-                user_roles_data = UserRole.objects.filter(user_id=u.id).select_related('role')
-                roles_data = [{"id": ur.role.id, "name": ur.role.name} for ur in user_roles_data]
-                user_data.append({
+            all_users = User.objects.order_by('email').prefetch_related(
+                Prefetch('user_roles', queryset=UserRole.objects.select_related('role'))
+            )
+            users_page = Paginator(all_users, per_page).get_page(page)
+            users_page.object_list = [
+                {
                     "id": u.id,
                     "email": u.email,
-                    "roles": roles_data,
-                })
-            return user_data
+                    "roles": [{"id": ur.role.id, "name": ur.role.name} for ur in u.user_roles.all()],
+                }
+                for u in users_page.object_list
+            ]
+            return users_page
     else:
         request.session.flush()
         if wants_json_response(request):
             return JsonResponse({'error': 'Not authorized'}, status=403) 
         return render(request, '404.html', status=403) 
 
-def get_all_items(request):
+def get_items_page(request, page=None, cursor=None, per_page=ITEMS_PER_PAGE, filters=None):
     """
-    Gets all items.
+    Gets one page of items, paginated in the database.
+    Only the displayed columns are fetched. With a `cursor` the page is found by
+    seeking on (serial_number, id) instead of OFFSET, which stays fast on deep pages.
+    `filters` narrows the listing, see item_search.filter_items.
     """
     # Check the role of the user
-    user = get_current_user()
-    if not user:
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
         if wants_json_response(request):
             return JsonResponse({'error': 'Unauthorized'}, status=401)
         else:
             return render(request, '404.html', status=401)
 
-    user_id = user.id
-    user_roles = UserRole.objects.filter(user_id=user_id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
     if "admin" in roles:
-        item_data = []
-        all_items = Item.objects.order_by('serial_number')
-        for i in all_items:
-            item_data.append({
-                'item_id': i.id,
-                'serial_number': i.serial_number,
-                'provider': i.provider,
-                'name': i.name,
-                'category': i.category,
-                'price': i.price
-            })
-        return item_data
+        items = filter_items(Item.objects.values(*ITEM_LIST_FIELDS, item_id=F('id')), filters)
+        if cursor:
+            return keyset_page(items, ('serial_number', 'item_id'), cursor, per_page)
+        return Paginator(items.order_by('serial_number', 'id'), per_page).get_page(page)
     else:
         if wants_json_response(request):
             return JsonResponse({'error': 'Not authorized'}, status=403)
@@ -158,21 +156,20 @@ def get_all_items(request):
 # --------------------------------
 # User Management
 # --------------------------------
-def delete_user(id):
+def delete_user(request, id):
     """
     Deletes a user by id. 
     """
-    user = get_current_user()
-    if not user:
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
         return JsonResponse({'error': 'Unauthorized'}, status=401)
 
-    user_id = user.id
-    user_roles = UserRole.objects.filter(user_id=user_id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
-
     if "admin" in roles:
         if User.objects.filter(id=id).exists():
-            User.objects.filter(id=id).delete()
+            with transaction.atomic():
+                User.objects.filter(id=id).delete()
+                bump_user_directory_version()
+            invalidate_user_roles(id)
             return JsonResponse({'message': 'User deleted successfully'})
         else:
             return JsonResponse({'error': 'User does not exist'}, status=404)
@@ -183,14 +180,10 @@ def update_role(request, id):
     """
     Updates the user's role (using integer IDs for roles).
     """
-    user = get_current_user()
-    if not user:
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
         return JsonResponse({'error': 'Unauthorized'}, status=401)
 
-    user_id = user.id
-    user_roles = UserRole.objects.filter(user_id=user_id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
-
     if "admin" in roles:
         try:
             
@@ -204,8 +197,11 @@ def update_role(request, id):
             new_role_id = 1 if new_role_name == 'admin' else 2  
 
             # Delete existing UserRoles and create the new one
-            UserRole.objects.filter(user_id=user_to_update.id).delete()
-            UserRole.objects.create(user_id=user_to_update.id, role_id=new_role_id) 
+            with transaction.atomic():
+                UserRole.objects.filter(user_id=user_to_update.id).delete()
+                UserRole.objects.create(user_id=user_to_update.id, role_id=new_role_id)
+                bump_user_directory_version()
+            invalidate_user_roles(user_to_update.id)
 
             return JsonResponse({'message': 'User role updated successfully'})
         except User.DoesNotExist:
@@ -221,22 +217,22 @@ def update_role(request, id):
 # --------------------------------
 # Item Management
 # --------------------------------
-def delete_item(id):
+def delete_item(request, id):
     """
     Deletes an item by id.
     """
-    user = get_current_user()  
-    if not user:
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
         return JsonResponse({'error': 'Unauthorized'}, status=401)
 
-    user_id = user.id
-    user_roles = UserRole.objects.filter(user_id=user_id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
-
     if "admin" in roles:
         try:
-            item = Item.objects.get(id=id)
-            item.delete()
+            with transaction.atomic():
+                item = Item.objects.select_for_update().get(id=id)
+                item.delete()
+                record_item_changes(removed=[item])
+                bump_inventory_version()
+                log_item_changes(deleted=[item])
             return JsonResponse({'message': 'Item deleted successfully'})
         except Item.DoesNotExist:
             return JsonResponse({'error': 'Item does not exist'}, status=404)
@@ -246,53 +242,103 @@ def delete_item(id):
         return JsonResponse({'error': 'Not authorized'}, status=403)
 
 
+def parse_etag(value):
+    """
+    Reads an item version out of an If-Match / ETag header value like "3" or W/"3".
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        return None
+
+
 def update_item(request, id):
-    user = get_current_user()
-    if not user:
-        return JsonResponse({'error': 'Unauthorized'}, status=401)
+    """
+    Updates the fields sent in the body with a single UPDATE, leaving the rest untouched.
 
-    user_id = user.id
-    user_roles = UserRole.objects.filter(user_id=user_id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
+    Send the item version in an If-Match header (or as "version" in the body) to
+    only apply the update if nobody changed the item since; otherwise 412 is
+    returned with the current version. The new version is returned as the ETag.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
 
     if "admin" in roles:
         try:
             data = json.loads(request.body)
-
-            # Delete the existing item
-            Item.objects.filter(id=id).delete()
-
-            # Create a new item with the updated data
-            Item.objects.create(
-                id=id, 
-                serial_number=sanitize(data.get('serial_number', '')),
-                provider=sanitize(data.get('provider', '')),
-                name=sanitize(data.get('name', '')),
-                category=sanitize(data.get('category', '')),
-                price=sanitize(float(data.get('price', 0)) if data.get('price') not in [None, ''] else 0),
-            )
-
-            return JsonResponse({'message': 'Item updated successfully'})
+            if not isinstance(data, dict):
+                return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+            changes = clean_item_fields(data, partial=True)
+            if not changes:
+                return JsonResponse({'error': 'No fields to update'}, status=400)
+
+            if_match = request.headers.get('If-Match', '').strip()
+            expected_version = parse_etag(if_match)
+            if if_match not in ['', '*'] and expected_version is None:
+                return JsonResponse({'error': 'Invalid If-Match header, send the item version'}, status=400)
+            if expected_version is None and data.get('version') not in [None, '']:
+                try:
+                    expected_version = int(data['version'])
+                except (ValueError, TypeError):
+                    return JsonResponse({'error': 'version must be an integer'}, status=400)
+
+            items = Item.objects.filter(id=id)
+            if expected_version is not None:
+                items = items.filter(version=expected_version)
+            with transaction.atomic():
+                if AGGREGATE_FIELDS.isdisjoint(changes):
+                    updated = items.update(**changes, version=F('version') + 1)
+                else:
+                    # The stock totals need the values being replaced
+                    old = items.select_for_update().values(*AGGREGATE_FIELDS).first()
+                    updated = items.update(**changes, version=F('version') + 1) if old else 0
+                    if updated:
+                        record_item_changes(added=[{**old, **changes}], removed=[old])
+                if updated:
+                    bump_inventory_version()
+                    log_item_changes(upserted_ids=[id])
+
+            if expected_version is not None and updated:
+                version = expected_version + 1
+            else:
+                version = Item.objects.filter(id=id).values_list('version', flat=True).first()
+                if version is None:
+                    return JsonResponse({'error': 'Item does not exist'}, status=404)
+                if not updated:
+                    response = JsonResponse({
+                        'error': 'El articulo fue modificado por otro usuario',
+                        'version': version,
+                    }, status=412)
+                    response['ETag'] = f'"{version}"'
+                    return response
+
+            response = JsonResponse({'message': 'Item updated successfully', 'version': version})
+            response['ETag'] = f'"{version}"'
+            return response
 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+        except IntegrityError:
+            return JsonResponse({'error': 'Numero de seria ya existe'}, status=400)
         except (ValueError, TypeError):  # Handle price conversion errors
             return JsonResponse({'error': 'Invalid price format'}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     else:
         return JsonResponse({'error': 'Not authorized'}, status=403)
-    
 
 
 def create_item(request):
-    user = get_current_user()
-    if not user:
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
         return JsonResponse({'error': 'Unauthorized'}, status=401)
 
-    user_roles = UserRole.objects.filter(user_id=user.id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
-
     if "admin" not in roles:
         return JsonResponse({'error': 'Not authorized'}, status=403)
 
@@ -314,42 +360,143 @@ def create_item(request):
         return JsonResponse({'error': 'Numero de seria ya existe'}, status=400)
 
     try:
-        new_item = Item.objects.create(
-            id=uuid.uuid4(), 
-            serial_number=serial_number,
-            provider=provider,
-            name=name,
-            category=category,
-            price=price
-        )
+        with transaction.atomic():
+            new_item = Item.objects.create(
+                id=uuid.uuid4(),
+                serial_number=serial_number,
+                provider=provider,
+                name=name,
+                category=category,
+                price=price
+            )
+            record_item_changes(added=[new_item])
+            bump_inventory_version()
+            log_item_changes(upserted_ids=[new_item.id])
         item_data = {
             'item_id': str(new_item.id),
             'name': new_item.name,
             'serial_number': new_item.serial_number,
             'provider': new_item.provider,
             'category': new_item.category,
-            'price': new_item.price
+            'price': new_item.price,
+            'version': new_item.version,
         }
         return JsonResponse(item_data, status=201)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def batch_items(request):
+    """
+    Applies a batch of item operations sent as
+    {"operations": [{"op": "create"|"update"|"delete", "id": ..., "version": ..., "fields": {...}}]}.
+    All or nothing, see item_batch.apply_item_batch.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    if "admin" not in roles:
+        return JsonResponse({'error': 'Not authorized'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'error': 'operations must be a non-empty list'}, status=400)
+    if len(operations) > settings.ITEM_BATCH_MAX_OPERATIONS:
+        return JsonResponse({
+            'error': f'A batch can have at most {settings.ITEM_BATCH_MAX_OPERATIONS} operations'
+        }, status=400)
+
+    try:
+        result = apply_item_batch(operations)
+    except BatchConflict as e:
+        return JsonResponse({'error': str(e), **e.result.as_dict()}, status=409)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+    return JsonResponse(result.as_dict(), status=200 if result.applied else 400)
+
+
+def get_inventory_aggregates(request):
+    """
+    Stock count and value per category and provider, see aggregates.get_item_aggregates.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    if "admin" not in roles:
+        return JsonResponse({'error': 'Not authorized'}, status=403)
+
+    return JsonResponse(get_item_aggregates())
+
+
+def get_inventory_valuation(request):
+    """
+    Stock value per category (or ?by=provider) and overall, with an optional
+    ?discount= and ?tax= percentage applied, see pricing.PriceTable.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    if "admin" not in roles:
+        return JsonResponse({'error': 'Not authorized'}, status=403)
+
+    dimension = request.GET.get('by', DIMENSIONS[0])
+    if dimension not in DIMENSIONS:
+        return JsonResponse({'error': f"by must be one of {', '.join(DIMENSIONS)}"}, status=400)
+    try:
+        discount_rate = parse_rate(request.GET.get('discount'), maximum=100)
+        tax_rate = parse_rate(request.GET.get('tax'))
+    except PricingError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse(get_price_table(dimension).valuation(discount_rate, tax_rate))
+
+
+def get_item_changes(request):
+    """
+    Item changes after ?after=<cursor> (0 for the start of the log), see
+    changes.changes_since. ?limit= sets the page size.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    if "admin" not in roles:
+        return JsonResponse({'error': 'Not authorized'}, status=403)
+
+    try:
+        cursor = int(request.GET.get('after') or 0)
+        limit = int(request.GET.get('limit') or settings.ITEM_CHANGES_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'after and limit must be integers'}, status=400)
+    if cursor < 0:
+        return JsonResponse({'error': 'after can not be negative'}, status=400)
+    if not 0 < limit <= settings.ITEM_CHANGES_MAX_PAGE_SIZE:
+        return JsonResponse({'error': f'limit must be between 1 and {settings.ITEM_CHANGES_MAX_PAGE_SIZE}'}, status=400)
+
+    return JsonResponse(changes_since(cursor, limit).as_dict())
+
+
 def get_download_all_items(request):
     """
-    Gets all items.
+    Gets all items as export rows, streamed from a server-side cursor.
     """
-    user = get_current_user()
-    if not user:
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
         if wants_json_response(request):
             return JsonResponse({'error': 'Unauthorized'}, status=401)
         else:
             return render(request, '404.html', status=401)
 
-    user_id = user.id
-    user_roles = UserRole.objects.filter(user_id=user_id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
     if "admin" in roles:
-        return Item.objects.order_by('serial_number')
+        return iter_item_rows()
     else:
         if wants_json_response(request):
             return JsonResponse({'error': 'Not authorized'}, status=403)
@@ -359,52 +506,162 @@ def get_download_all_items(request):
 
 def import_csv(request):
     """
-    Imports items from a CSV file.
+    Imports items from a CSV file, see csv_import.CsvItemImporter.
+    Send on_error=skip to import the valid rows of a file with bad rows,
+    and mode=upsert to update items whose serial number already exists.
     """
-    user = get_current_user()
-    if not user:
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
         return JsonResponse({'error': 'Unauthorized'}, status=401)
 
-    user_roles = UserRole.objects.filter(user_id=user.id).select_related('role')
-    roles = [user_role.role.name for user_role in user_roles]
+    if "admin" not in roles:
+        return JsonResponse({'error': 'Not authorized'}, status=403)
+
+    if 'csv_file' not in request.FILES:
+        return JsonResponse({'error': 'No se ha enviado ningun archivo CSV.'}, status=400)
+
+    try:
+        importer = CsvItemImporter(
+            on_error=request.POST.get('on_error', 'abort'),
+            mode=request.POST.get('mode', 'insert'),
+        )
+        result = importer.run(request.FILES['csv_file'].file)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"CSV import failed: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if not result.committed:
+        return JsonResponse({
+            'error': f'CSV no importado: {result.error_count} filas con errores.',
+            **result.as_dict(),
+        }, status=400)
+    message = 'CSV importado correctamente.'
+    if result.error_count:
+        message = f'CSV importado con {result.error_count} filas omitidas.'
+    return JsonResponse({'message': message, **result.as_dict()}, status=201)
+
+
+def enqueue_csv_import(request):
+    """
+    Stores the CSV file and queues it for a background worker.
+    Returns the job id to poll with get_import_job.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
 
     if "admin" not in roles:
         return JsonResponse({'error': 'Not authorized'}, status=403)
 
+    if 'csv_file' not in request.FILES:
+        return JsonResponse({'error': 'No se ha enviado ningun archivo CSV.'}, status=400)
+
     try:
-        csv_file = TextIOWrapper(request.FILES['csv_file'].file, encoding='utf-8')
-        reader = csv.reader(csv_file)
-        next(reader)  # Skip header row
+        job = enqueue_import(
+            request.FILES['csv_file'],
+            user_id=user_data.id,
+            on_error=request.POST.get('on_error', 'abort'),
+            mode=request.POST.get('mode', 'insert'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-        created_items = []
-        for row in reader:
-            serial_number = sanitize(row[0])
-            provider = sanitize(row[1])
-            name = sanitize(row[2])
-            category = sanitize(row[3])
-            price = float(row[4])
+    return JsonResponse({
+        'job_id': str(job.id),
+        'status': job.status,
+        'status_url': f'/upload/csv/jobs/{job.id}/',
+    }, status=202)
 
-            if Item.objects.filter(serial_number=serial_number).exists():
-                return JsonResponse({'error': f'Numero de serie {serial_number} ya existe.'}, status=400)
 
-            new_item = Item.objects.create(
-                id=uuid.uuid4(),
-                serial_number=serial_number,
-                provider=provider,
-                name=name,
-                category=category,
-                price=price
-            )
-            created_items.append({
-                'item_id': str(new_item.id),
-                'name': new_item.name,
-                'serial_number': new_item.serial_number,
-                'provider': new_item.provider,
-                'category': new_item.category,
-                'price': new_item.price
-            })
+def get_import_job(request, job_id):
+    """
+    Reports the progress of a background CSV import. Only reads: stale jobs are
+    recovered by `manage.py run_import_jobs`.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
 
-        return JsonResponse({'message': 'CSV importado correctamente.', 'items': created_items}, status=201)
+    if "admin" not in roles:
+        return JsonResponse({'error': 'Not authorized'}, status=403)
 
-    except Exception as e:
+    try:
+        job = ImportJob.objects.get(id=job_id)
+    except ImportJob.DoesNotExist:
+        return JsonResponse({'error': 'Import job does not exist'}, status=404)
+    return JsonResponse(job_status(job))
+
+
+# --------------------------------
+# Offers
+# --------------------------------
+def create_offer(request):
+    """
+    Builds an offer for the current user from
+    {"items": [{"id": ..., "quantity": n}, ...]}, snapshotting today's prices.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+
+    try:
+        offer = build_offer(user_data.id, parse_offer_lines(data))
+    except OfferError as e:
         return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(offer_as_dict(offer), status=201)
+
+
+def list_offers(request):
+    """
+    The current user's offers, newest first (?after=<cursor> for the next page).
+    ?item=<id> keeps the offers containing that item; admins see every user's
+    offers, or one user's with ?user=<id>.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    try:
+        item_id = uuid.UUID(request.GET['item']) if request.GET.get('item') else None
+        if "admin" in roles:
+            user_id = uuid.UUID(request.GET['user']) if request.GET.get('user') else None
+        else:
+            user_id = user_data.id
+    except ValueError:
+        return JsonResponse({'error': 'Invalid id'}, status=400)
+
+    try:
+        offers = offer_history(cursor=request.GET.get('after'), user_id=user_id, item_id=item_id)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'offers': [
+            {**row, 'id': str(row['id']), 'user_id': str(row['user_id']), 'created_at': row['created_at'].isoformat()}
+            for row in offers
+        ],
+        'next_cursor': offers.next_cursor,
+    })
+
+
+def get_offer(request, id):
+    """
+    One offer with its lines. Users only see their own offers.
+    """
+    user_authenticated, user_data, roles = get_role_by_id(request)
+    if not user_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    offers = PreviousOffer.objects.all()
+    if "admin" not in roles:
+        offers = offers.filter(user_id=user_data.id)
+    offer = offers.filter(id=id).first()
+    if offer is None:
+        return JsonResponse({'error': 'Offer does not exist'}, status=404)
+    return JsonResponse(offer_as_dict(offer))
@@ -7,6 +7,11 @@ function handleFileUpload(event) {
   const formData = new FormData();
   formData.append('csv_file', file);
 
+  // Large files are imported in the background and polled for progress
+  if (file.size > ASYNC_IMPORT_THRESHOLD) {
+    formData.append('async', '1');
+  }
+
   fetch('/upload/csv/', { 
     method: 'POST',
     body: formData,
@@ -17,10 +22,18 @@ function handleFileUpload(event) {
   .then(response => {
     if (response.ok) {
       return response.json();
-    } else {
-      throw new Error('Upload failed.');
     }
+    return response.json()
+      .catch(() => ({}))
+      .then(data => {
+        let message = data.error || 'Upload failed.';
+        if (data.errors && data.errors.length) {
+          message += ' ' + data.errors.slice(0, 5).map(e => `Fila ${e.row}: ${e.error}`).join(' ');
+        }
+        throw new Error(message);
+      });
   })
+  .then(data => data.job_id ? pollImportJob(data.status_url) : data)
   .then(data => {
     Swal.fire(
       '¡Importado!',
@@ -39,6 +52,40 @@ function handleFileUpload(event) {
   });
 }
 
+const ASYNC_IMPORT_THRESHOLD = 2 * 1024 * 1024;
+
+function pollImportJob(statusUrl) {
+  Swal.fire({
+    title: 'Importando...',
+    text: '0 filas procesadas',
+    allowOutsideClick: false,
+    didOpen: () => Swal.showLoading(),
+  });
+
+  return new Promise((resolve, reject) => {
+    const check = () => {
+      fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+        .then(response => response.json())
+        .then(job => {
+          if (job.status === 'succeeded') {
+            resolve(job);
+          } else if (job.status === 'failed') {
+            let message = job.message || 'Upload failed.';
+            if (job.errors && job.errors.length) {
+              message += ' ' + job.errors.slice(0, 5).map(e => `Fila ${e.row}: ${e.error}`).join(' ');
+            }
+            reject(new Error(message));
+          } else {
+            Swal.update({ text: `${job.rows_processed} filas procesadas` });
+            setTimeout(check, 1000);
+          }
+        })
+        .catch(reject);
+    };
+    check();
+  });
+}
+
 // Function to get CSRF token from cookies
 function getCSRFToken() {
   let cookieValue = null;
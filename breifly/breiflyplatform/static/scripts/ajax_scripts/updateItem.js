@@ -11,6 +11,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const itemPrice = this.dataset.itemPrice;
 
             document.getElementById('editItemId').value = itemId;
+            document.getElementById('editItemVersion').value = this.dataset.itemVersion || '';
             document.getElementById('editItemName').value = itemName;
             document.getElementById('editItemSerial').value = itemSerial;
             document.getElementById('editItemProvider').value = itemProvider;
@@ -31,13 +32,20 @@ document.addEventListener('DOMContentLoaded', function() {
         const itemProvider = document.getElementById('editItemProvider').value;
         const itemCategory = document.getElementById('editItemCategory').value;
         const itemPrice = document.getElementById('editItemPrice').value;
+        const itemVersion = document.getElementById('editItemVersion').value;
+
+        const headers = {
+            "Content-Type": "application/json",
+            "X-CSRFToken": getCSRFToken(),
+        };
+        // Only apply the update if nobody changed the item since the page was loaded
+        if (itemVersion) {
+            headers["If-Match"] = `"${itemVersion}"`;
+        }
 
         fetch(`/update-item/${itemId}/`, {
-            method: 'PUT',
-            headers: {
-                "Content-Type": "application/json",
-                "X-CSRFToken": getCSRFToken(),
-            },
+            method: 'PATCH',
+            headers: headers,
             body: JSON.stringify({
                 name: itemName,
                 serial_number: itemSerial,
@@ -46,7 +54,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 price: itemPrice
             })
         })
-        .then(response => {
+        .then(response => response.json().catch(() => ({})).then(data => ({ response, data })))
+        .then(({ response, data }) => {
+            const newVersion = data.version || '';
             if (response.ok) {
                 Swal.fire(
                     '¡Actualizado!',
@@ -71,6 +81,7 @@ document.addEventListener('DOMContentLoaded', function() {
                            data-item-provider="${itemProvider}"
                            data-item-category="${itemCategory}"
                            data-item-price="${itemPrice}"
+                           data-item-version="${newVersion}"
                            style="width: 80px; display: inline-block;">Editar</a> <br>
                         <a href="#" class="btn btn-sm btn-danger mx-1 delete-user-btn"
                            onclick="deleteItem('${itemId}')"
@@ -88,6 +99,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     const itemPrice = this.dataset.itemPrice;
                     
                     document.getElementById('editItemId').value = itemId;
+                    document.getElementById('editItemVersion').value = this.dataset.itemVersion || '';
                     document.getElementById('editItemName').value = itemName;
                     document.getElementById('editItemSerial').value = itemSerial;
                     document.getElementById('editItemProvider').value = itemProvider;
@@ -101,6 +113,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 const editModalElement = document.getElementById('editItemModal');
                 const modalInstance = bootstrap.Modal.getInstance(editModalElement);
                 modalInstance.hide();
+            } else if (response.status === 412) {
+                Swal.fire(
+                    'Conflicto',
+                    'Otro usuario modificó este producto. Recargue la página para ver los cambios.',
+                    'warning'
+                );
             } else {
                 Swal.fire(
                     'Error',
@@ -1,4 +1,131 @@
-from supabase import create_client
 from django.conf import settings
+from .metrics import timed_external
+import asyncio
+import httpx
+import threading
+import weakref
 
-supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
\ No newline at end of file
+
+class SupabaseAuth:
+    """
+    Calls to the Supabase Auth endpoints used by the views.
+
+    The supabase-py client keeps the signed in session on the client object itself,
+    so sharing one between requests (or threads) mixes up who is signed in. This one
+    keeps no session state: the caller's token is passed on every call, and one pooled
+    httpx.Client (thread safe) serves every request in the process.
+    """
+    def __init__(self, url, key, timeout=10, max_connections=100):
+        self.base_url = f"{url.rstrip('/')}/auth/v1"
+        self.key = key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        base_url=self.base_url,
+                        headers={'apikey': self.key},
+                        timeout=self.timeout,
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                        ),
+                    )
+        return self._client
+
+    def sign_in_with_password(self, email, password):
+        """
+        Returns the session (access_token, user, ...) as a dict, or None on bad credentials.
+        """
+        with timed_external('supabase'):
+            response = self.client().post(
+                '/token', params={'grant_type': 'password'}, json={'email': email, 'password': password}
+            )
+        if response.status_code in (400, 401):
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def get_user(self, access_token):
+        """
+        Returns the user the token belongs to as a dict, or None if Supabase rejects it.
+        """
+        with timed_external('supabase'):
+            response = self.client().get('/user', headers={'Authorization': f'Bearer {access_token}'})
+        if response.status_code in (401, 403):
+            return None
+        response.raise_for_status()
+        return response.json()
+
+
+class AsyncSupabaseAuth:
+    """
+    Non-blocking version of SupabaseAuth, for the async views. Each event loop gets its own pooled httpx.AsyncClient, reused
+    across requests (keep-alive, bounded by `max_connections`).
+    """
+    def __init__(self, url, key, timeout=10, max_connections=100):
+        self.base_url = f"{url.rstrip('/')}/auth/v1"
+        self.key = key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={'apikey': self.key},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._clients[loop] = client
+        return client
+
+    async def sign_in_with_password(self, email, password):
+        """
+        Returns the session (access_token, user, ...) as a dict, or None on bad credentials.
+        """
+        with timed_external('supabase'):
+            response = await self.client().post(
+                '/token', params={'grant_type': 'password'}, json={'email': email, 'password': password}
+            )
+        if response.status_code in (400, 401):
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    async def get_user(self, access_token):
+        """
+        Returns the user the token belongs to as a dict, or None if Supabase rejects it.
+        """
+        with timed_external('supabase'):
+            response = await self.client().get('/user', headers={'Authorization': f'Bearer {access_token}'})
+        if response.status_code in (401, 403):
+            return None
+        response.raise_for_status()
+        return response.json()
+
+
+supabase_auth = SupabaseAuth(
+    settings.SUPABASE_URL,
+    settings.SUPABASE_KEY,
+    timeout=settings.SUPABASE_HTTP_TIMEOUT,
+    max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+)
+
+async_supabase_auth = AsyncSupabaseAuth(
+    settings.SUPABASE_URL,
+    settings.SUPABASE_KEY,
+    timeout=settings.SUPABASE_HTTP_TIMEOUT,
+    max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+)
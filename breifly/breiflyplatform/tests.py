@@ -1,3 +1,1113 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from unittest import mock, skipIf
+import uuid
 
-# Create your tests here.
+from .models import User, Role, UserRole, Item, ItemAggregate, PreviousOffer, ImportJob
+from .aggregates import AggregateChanges, get_item_aggregates, rebuild_item_aggregates
+from .item_batch import apply_item_batch
+from .item_search import filter_items
+from .changes import changes_since
+from .csv_import import CsvItemImporter
+from .import_jobs import claim_next_job, enqueue_import, recover_stale_jobs, run_import_job
+from .exports import stream_csv
+from .offers import build_offer, offer_history
+from .pagination import InvalidCursor, encode_cursor, keyset_page
+from .pricing import Quote, get_price_table, reset_price_tables, to_cents
+from .inventory_state import get_inventory_state
+from .token_verification import TokenVerifier, VerifiedUser
+from .auth_backends import AuthBackend, LocalAuthBackend
+from .authorization import get_user_roles
+from .metrics import MetricsMiddleware, registry
+from .user_context import UserContext, UserContextMiddleware
+from . import async_views, connection_metrics, exports, service, token_verification, views
+from importlib import import_module
+from io import BytesIO
+import base64
+import contextlib
+import csv
+import datetime
+import gzip
+import hashlib
+import hmac
+import json
+import tempfile
+import threading
+import time
+
+
+class UnmanagedTablesTestCase(TestCase):
+    """
+    The Supabase tables are `managed = False`, so the test database doesn't get them.
+    Creates them for the duration of the test case.
+    """
+    unmanaged_models = []
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('CREATE SCHEMA IF NOT EXISTS auth')
+            elif connection.vendor == 'sqlite':
+                # "auth"."users" resolves to a database attached under the name auth
+                cursor.execute('PRAGMA database_list')
+                if 'auth' not in [row[1] for row in cursor.fetchall()]:
+                    cursor.execute("ATTACH DATABASE ':memory:' AS auth")
+        with connection.schema_editor() as editor:
+            foreign_keys = contextlib.nullcontext()
+            if connection.vendor == 'sqlite':
+                # SQLite can't reference a table in another attached database, so the
+                # tables are created without foreign keys there
+                editor.sql_create_inline_fk = None
+                foreign_keys = mock.patch.object(connection.features, 'supports_foreign_keys', False)
+            with foreign_keys:
+                for model in cls.unmanaged_models:
+                    editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in reversed(cls.unmanaged_models):
+                editor.delete_model(model)
+
+
+# --------------------------------
+# User Service
+# --------------------------------
+class UsersPageQueryCountTests(UnmanagedTablesTestCase):
+    unmanaged_models = [User, Role, UserRole]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_role = Role.objects.create(id=1, name='admin')
+        cls.user_role = Role.objects.create(id=2, name='user')
+
+    def setUp(self):
+        self.request = RequestFactory().get('/custom-admin/dashboard/users')
+        patcher = mock.patch.object(service, 'get_role_by_id', return_value=(True, None, ['admin']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_users(self, count):
+        start = User.objects.count()
+        users = User.objects.bulk_create(
+            User(id=uuid.uuid4(), email=f'user{start + i}@example.com') for i in range(count)
+        )
+        UserRole.objects.bulk_create(
+            UserRole(user=u, role=self.admin_role if i % 2 else self.user_role) for i, u in enumerate(users)
+        )
+
+    def test_query_count_does_not_grow_with_user_count(self):
+        # count, page of users, prefetched roles
+        self.create_users(3)
+        with self.assertNumQueries(3):
+            service.get_users_page(self.request, page=1)
+
+        self.create_users(50)
+        with self.assertNumQueries(3):
+            users_page = service.get_users_page(self.request, page=2)
+
+        self.assertEqual(len(users_page.object_list), service.USERS_PER_PAGE)
+        self.assertEqual(users_page.paginator.count, 53)
+        for user in users_page.object_list:
+            self.assertEqual(len(user['roles']), 1)
+
+    def test_out_of_range_page_returns_last_page(self):
+        self.create_users(7)
+        users_page = service.get_users_page(self.request, page=99)
+        self.assertEqual(users_page.number, 2)
+        self.assertEqual(len(users_page.object_list), 2)
+
+
+@override_settings(ROLE_CACHE_SHARED=True)
+class RoleCacheTests(UnmanagedTablesTestCase):
+    unmanaged_models = [User, Role, UserRole]
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create(id=uuid.uuid4(), email='roles@example.com')
+        self.admin = Role.objects.create(id=1, name='admin')
+        self.role = Role.objects.create(id=2, name='user')
+        UserRole.objects.create(user=self.user, role=self.admin)
+
+    def test_cached_roles_cost_no_queries(self):
+        self.assertEqual(get_user_roles(self.user.id), ['admin'])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_roles(self.user.id), ['admin'])
+        self.assertIn('breifly_authz_role_lookups_total{source="cache"}', registry.render())
+
+    def test_update_role_takes_effect_at_once(self):
+        get_user_roles(self.user.id)
+        request = RequestFactory().post(
+            '/update-user/', json.dumps({'new_role': 'user'}), content_type='application/json'
+        )
+        with mock.patch.object(service, 'get_role_by_id', return_value=(True, None, ['admin'])):
+            self.assertEqual(service.update_role(request, self.user.id).status_code, 200)
+        self.assertEqual(get_user_roles(self.user.id), ['user'])
+
+    def test_without_a_shared_cache_roles_are_read_every_time(self):
+        get_user_roles(self.user.id)
+        # Changed by another worker, whose cache delete would not reach this process
+        UserRole.objects.filter(user=self.user).update(role=self.role)
+        with override_settings(ROLE_CACHE_SHARED=False), self.assertNumQueries(1):
+            self.assertEqual(get_user_roles(self.user.id), ['user'])
+
+
+class UserContextMiddlewareTests(SimpleTestCase):
+    def test_concurrent_requests_each_see_their_own_user(self):
+        barrier = threading.Barrier(2)
+
+        def resolve(request):
+            return True, VerifiedUser({'sub': request.GET['user']}), ['user']
+
+        def view(request):
+            # Both requests are in flight before either reads the current user
+            barrier.wait(timeout=5)
+            return HttpResponse(service.get_current_user().id)
+
+        middleware = UserContextMiddleware(view)
+        results = {}
+
+        def handle(user):
+            results[user] = middleware(RequestFactory().get('/', {'user': user})).content.decode()
+
+        with mock.patch('breiflyplatform.user_context.resolve_request_roles', side_effect=resolve):
+            threads = [threading.Thread(target=handle, args=(user,)) for user in ('user-1', 'user-2')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(results, {'user-1': 'user-1', 'user-2': 'user-2'})
+        self.assertIsNone(service.get_current_user())
+
+
+# --------------------------------
+# Login Service
+# --------------------------------
+def _encode(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b'=').decode()
+
+
+def make_token(secret, **claims):
+    signing_input = f"{_encode({'alg': 'HS256', 'typ': 'JWT'})}.{_encode(claims)}"
+    signature = hmac.new(secret, signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+class TokenVerifierTests(SimpleTestCase):
+    def setUp(self):
+        self.verifier = TokenVerifier(secret='secret', audience='authenticated', ttl=300)
+
+    def token(self, **claims):
+        return make_token(b'secret', **{'sub': 'user-1', 'aud': 'authenticated', 'exp': int(time.time()) + 60, **claims})
+
+    def test_rejects_invalid_tokens(self):
+        now = int(time.time())
+        for token in (
+            self.token(exp=now - 10),
+            self.token(aud='someone-else'),
+            make_token(b'other', sub='user-1', aud='authenticated', exp=now + 60),
+            self.token(nbf=now + 60),
+            'not-a-token',
+        ):
+            self.assertIsNone(self.verifier.verify(token))
+        self.assertEqual(self.verifier.stats()['rejections'], 5)
+        self.assertEqual(self.verifier.stats()['size'], 0)
+
+    def test_leeway_applies_to_exp_and_nbf(self):
+        verifier = TokenVerifier(secret='secret', audience='authenticated', leeway=30)
+        now = int(time.time())
+        self.assertIsNotNone(verifier.verify(self.token(exp=now - 10)))
+        self.assertIsNotNone(verifier.verify(self.token(nbf=now + 10)))
+
+    def test_cache_evicts_least_recently_used(self):
+        verifier = TokenVerifier(secret='secret', audience='authenticated', max_size=2)
+        first, second, third = (self.token(sub=f'user-{i}') for i in range(3))
+        verifier.verify(first)
+        verifier.verify(second)
+        verifier.verify(first)  # second is now the least recently used
+        verifier.verify(third)
+        self.assertEqual(verifier.stats()['size'], 2)
+
+        hits = verifier.stats()['hits']
+        verifier.verify(first)
+        verifier.verify(third)
+        self.assertEqual(verifier.stats()['hits'], hits + 2)
+        verifier.verify(second)
+        self.assertEqual(verifier.stats()['local_verifications'], 4)
+
+    def test_cache_entries_end_at_the_token_expiry(self):
+        now = time.time()
+        token = self.token(exp=int(now) + 5)
+        self.assertIsNotNone(self.verifier.verify(token))
+        with mock.patch('breiflyplatform.token_verification.time.time', return_value=now + 6):
+            # Past exp but well within the cache ttl: verified again, and rejected
+            self.assertIsNone(self.verifier.verify(token))
+        self.assertEqual(self.verifier.stats()['hits'], 0)
+
+    def test_counters_are_exact_across_threads_and_exported(self):
+        tokens = [make_token(b'other', sub=f'user-{i}', exp=int(time.time()) + 60) for i in range(200)]
+        threads = [threading.Thread(target=lambda: [self.verifier.verify(t) for t in tokens]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.verifier.stats()['rejections'], 1600)
+
+        with mock.patch.object(token_verification, 'token_verifier', self.verifier):
+            rendered = registry.render()
+        self.assertIn('breifly_token_rejections_total 1600', rendered)
+        self.assertIn('breifly_token_cache_lookups_total{result="miss"} 1600', rendered)
+
+
+class AsyncTokenVerifierTests(SimpleTestCase):
+    async def test_hs256_tokens_are_verified_without_network(self):
+        verifier = TokenVerifier(secret='secret', audience='authenticated')
+        token = make_token(b'secret', sub='user-1', aud='authenticated', exp=int(time.time()) + 60)
+
+        with mock.patch('breiflyplatform.token_verification.get_auth_backend') as remote:
+            user = await verifier.averify(token)
+            self.assertEqual(user.id, 'user-1')
+            self.assertIs(await verifier.averify(token), user)
+            self.assertIsNone(await verifier.averify(make_token(b'other', sub='user-1', exp=int(time.time()) + 60)))
+            remote.assert_not_called()
+        self.assertEqual(verifier.stats()['hits'], 1)
+
+
+class LoginCsrfTests(SimpleTestCase):
+    def post(self):
+        return RequestFactory().post('/login/', json.dumps({'email': 'a@b.c', 'password': 'x'}), content_type='application/json')
+
+    async def test_async_login_checks_csrf_like_the_sync_view(self):
+        self.assertEqual(views.login_view(self.post()).status_code, 403)
+        with mock.patch.object(async_views, 'get_auth_backend') as backend:
+            self.assertEqual((await async_views.login_view(self.post())).status_code, 403)
+        backend.assert_not_called()
+
+
+class AuthBackendTests(SimpleTestCase):
+    def test_incomplete_backend_fails_when_created(self):
+        class SignInOnly(AuthBackend):
+            def sign_in(self, email, password):
+                return None
+
+        with self.assertRaisesMessage(TypeError, 'get_user'):
+            SignInOnly()
+
+        class Complete(SignInOnly):
+            def get_user(self, access_token):
+                return None
+
+        self.assertIsNone(Complete().get_user('token'))
+
+
+@override_settings(
+    AUTH_BACKEND='breiflyplatform.auth_backends.LocalAuthBackend',
+    SUPABASE_JWT_SECRET='local-secret',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class LocalAuthBackendTests(UnmanagedTablesTestCase):
+    unmanaged_models = [User, Role, UserRole]
+
+    def test_login_issues_a_token_that_verifies_offline(self):
+        user = LocalAuthBackend.create_user('local@example.com', 'correct horse', roles=('user', 'admin'))
+
+        response = self.client.post(
+            '/login/', json.dumps({'email': 'local@example.com', 'password': 'wrong'}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            '/login/', json.dumps({'email': 'local@example.com', 'password': 'correct horse'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        verified = TokenVerifier(secret='local-secret', audience='authenticated').verify(
+            self.client.session['access_token']
+        )
+        self.assertEqual(verified.id, str(user.id))
+        self.assertEqual(set(UserRole.objects.filter(user=user).values_list('role__name', flat=True)), {'user', 'admin'})
+
+    def test_added_roles_take_effect_at_once(self):
+        caches['default'].clear()
+        user = LocalAuthBackend.create_user('local@example.com', 'correct horse')
+        self.assertEqual(get_user_roles(user.id), ['user'])
+        with mock.patch('breiflyplatform.authorization.invalidate_user_roles') as invalidate:
+            LocalAuthBackend.create_user('local@example.com', 'correct horse', roles=('admin',))
+        invalidate.assert_called_once_with(user.id)
+        self.assertEqual(sorted(get_user_roles(user.id)), ['admin', 'user'])
+
+
+@override_settings(
+    AUTH_BACKEND='breiflyplatform.auth_backends.LocalAuthBackend',
+    SUPABASE_JWT_SECRET='local-secret',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class SessionBackendTests(UnmanagedTablesTestCase):
+    unmanaged_models = [User, Role, UserRole]
+
+    def setUp(self):
+        LocalAuthBackend.create_user('local@example.com', 'correct horse')
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.file_caches = {
+            **settings.CACHES,
+            'sessions': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+        }
+
+    def login(self):
+        response = self.client.post(
+            '/login/', json.dumps({'email': 'local@example.com', 'password': 'correct horse'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def load(self, session_key):
+        store = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        with CaptureQueriesContext(connection) as queries:
+            user = store.get('user')
+        return user, [q['sql'] for q in queries if 'django_session' in q['sql']]
+
+    def test_cached_sessions_are_read_from_the_file_cache(self):
+        for engine, stored_rows in [('cached_db', 1), ('cache', 0)]:
+            with self.subTest(engine=engine), self.settings(
+                SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}', CACHES=self.file_caches
+            ):
+                # A new client, as the session middleware keeps the engine it started with
+                self.client = self.client_class()
+                Session.objects.all().delete()
+                session_key = self.login()
+                self.assertEqual(Session.objects.count(), stored_rows)
+                user, session_queries = self.load(session_key)
+                self.assertEqual((user['email'], session_queries), ('local@example.com', []))
+
+                self.client.get('/logout/')
+                self.assertIsNone(self.load(session_key)[0])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_need_no_storage(self):
+        user, session_queries = self.load(self.login())
+        self.assertEqual((user['email'], session_queries), ('local@example.com', []))
+        self.assertFalse(Session.objects.exists())
+
+
+# --------------------------------
+# Item Management
+# --------------------------------
+class CsvUpsertTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def test_upsert_keeps_the_id_and_bumps_the_stored_version(self):
+        item = Item.objects.create(id=uuid.uuid4(), serial_number='U1', name='old', price=1, version=4)
+        result = CsvItemImporter(mode='upsert').run(
+            BytesIO(b'Serial Number,Provider,Name,Category,Price\nU1,p,new,c,2\nU2,p,added,c,3\n')
+        )
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual(
+            list(Item.objects.order_by('serial_number').values_list('id', 'name', 'version'))[0], (item.id, 'new', 5)
+        )
+        self.assertEqual(Item.objects.get(serial_number='U2').version, 1)
+
+
+class CsvImportErrorModeTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    CSV = (
+        b'Serial Number,Provider,Name,Category,Price\n'
+        b'C1,p,good,c,1.5\n'
+        b'C2,p,bad price,c,abc\n'
+        b'C1,p,duplicate,c,2\n'
+        b',p,no serial,c,1\n'
+        b'C3,p,good,c,2.5\n'
+    )
+
+    def setUp(self):
+        patcher = mock.patch.object(service, 'get_role_by_id', return_value=(True, None, ['admin']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, **data):
+        request = RequestFactory().post(
+            '/upload/csv/', {'csv_file': SimpleUploadedFile('items.csv', self.CSV, 'text/csv'), **data}
+        )
+        response = service.import_csv(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_default_mode_rolls_back_the_whole_file(self):
+        status, body = self.upload()
+        self.assertEqual(status, 400)
+        self.assertFalse(body['committed'])
+        self.assertEqual((body['created'], body['error_count'], body['rows_processed']), (0, 3, 5))
+        self.assertFalse(Item.objects.exists())
+
+    def test_skip_commits_the_valid_rows_and_reports_the_rest(self):
+        status, body = self.upload(on_error='skip')
+        self.assertEqual(status, 201)
+        self.assertTrue(body['committed'])
+        self.assertEqual((body['created'], body['error_count']), (2, 3))
+        self.assertEqual(
+            [(error['row'], error['serial_number']) for error in body['errors']], [(3, 'C2'), (4, 'C1'), (5, '')]
+        )
+        self.assertIn('duplicado', body['errors'][1]['error'])
+        self.assertEqual(
+            list(Item.objects.order_by('serial_number').values_list('serial_number', 'name')), [('C1', 'good'), ('C3', 'good')]
+        )
+
+    def test_unknown_mode_is_rejected(self):
+        self.assertEqual(self.upload(on_error='ignore')[0], 400)
+
+
+class UpdateItemVersionTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def setUp(self):
+        self.item = Item.objects.create(id=uuid.uuid4(), serial_number='V1', name='a', price=1, version=3)
+        patcher = mock.patch.object(service, 'get_role_by_id', return_value=(True, None, ['admin']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def update(self, item_id, body, **headers):
+        request = RequestFactory().patch('/update-items/', json.dumps(body), content_type='application/json', **headers)
+        return service.update_item(request, item_id)
+
+    def test_matching_version_applies_and_returns_the_new_etag(self):
+        response = self.update(self.item.id, {'name': 'b'}, HTTP_IF_MATCH='W/"3"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"4"')
+        response = self.update(self.item.id, {'name': 'c', 'version': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Item.objects.get(id=self.item.id).name, 'c')
+
+    def test_stale_version_is_rejected_with_the_current_one(self):
+        response = self.update(self.item.id, {'name': 'b'}, HTTP_IF_MATCH='"2"')
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(json.loads(response.content)['version'], 3)
+        self.assertEqual(response['ETag'], '"3"')
+        self.assertEqual(Item.objects.get(id=self.item.id).name, 'a')
+
+    def test_missing_item_and_bad_versions(self):
+        self.assertEqual(self.update(uuid.uuid4(), {'name': 'b'}).status_code, 404)
+        self.assertEqual(self.update(uuid.uuid4(), {'name': 'b'}, HTTP_IF_MATCH='"1"').status_code, 404)
+        response = self.update(self.item.id, {'name': 'b', 'version': 'abc'})
+        self.assertEqual((response.status_code, json.loads(response.content)['error']), (400, 'version must be an integer'))
+        self.assertEqual(self.update(self.item.id, {'name': 'b'}, HTTP_IF_MATCH='abc').status_code, 400)
+
+    def test_non_object_body_is_rejected(self):
+        for body in [[], 'x', 1, None]:
+            response = self.update(self.item.id, body)
+            self.assertEqual((response.status_code, json.loads(response.content)['error']), (400, 'Body must be a JSON object'))
+        self.assertEqual(Item.objects.get(id=self.item.id).version, 3)
+
+
+class ItemKeysetPaginationTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def setUp(self):
+        caches['default'].clear()
+        Item.objects.bulk_create(
+            Item(id=uuid.uuid4(), serial_number=f'K{i % 4}-{i:02d}', name='k', category=f'c{i % 3}') for i in range(13)
+        )
+
+    def get_items(self, accept='application/json', **params):
+        request = RequestFactory().get('/custom-admin/dashboard/items', params, HTTP_ACCEPT=accept)
+        request.user_context = UserContext(True, None, ['admin'])
+        return views.item_management_page(request)
+
+    def test_following_next_cursor_returns_every_item_once_in_order(self):
+        seen = []
+        payload = json.loads(self.get_items().content)
+        while True:
+            seen += [(row['serial_number'], row['item_id']) for row in payload['items']]
+            if payload['next_cursor'] is None:
+                break
+            payload = json.loads(self.get_items(after=payload['next_cursor']).content)
+        expected = Item.objects.order_by('serial_number', 'id').values_list('serial_number', 'id')
+        self.assertEqual(seen, [(serial, str(item_id)) for serial, item_id in expected])
+
+    def test_ties_on_the_leading_key_are_broken_by_the_last_one(self):
+        # serial_number is unique, so ties are exercised on category
+        for descending in (False, True):
+            seen, cursor = [], None
+            while True:
+                page = keyset_page(Item.objects.values('category', 'id'), ('category', 'id'), cursor, 2, descending)
+                seen += [(row['category'], row['id']) for row in page]
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+            order = ('-category', '-id') if descending else ('category', 'id')
+            self.assertEqual(seen, list(Item.objects.order_by(*order).values_list('category', 'id')))
+
+    def test_bad_cursor_is_a_400(self):
+        for cursor in ('not-a-cursor', encode_cursor(['K0-00', 'not-a-uuid']), encode_cursor(['only-one'])):
+            self.assertEqual(self.get_items(after=cursor).status_code, 400)
+            self.assertEqual(self.get_items(accept='text/html', after=cursor).status_code, 400)
+        with self.assertRaises(InvalidCursor):
+            keyset_page(Item.objects.values('serial_number', 'id'), ('serial_number', 'id'), 'not-a-cursor', 2)
+
+
+class ItemSearchTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def test_words_match_as_ilike_on_the_plain_columns(self):
+        # The trigram indexes are on name and provider themselves; UPPER(name) can't use them
+        sql, params = filter_items(Item.objects.all(), {'q': 'Drill 5%'}).query.sql_with_params()
+        if connection.vendor == 'postgresql':
+            self.assertIn('"items"."name" ILIKE %s', sql)
+            self.assertIn('"items"."provider" ILIKE %s', sql)
+            self.assertNotIn('UPPER(', sql)
+        self.assertIn('%5\\%%', params)
+
+    def test_words_match_any_case_and_wildcards_are_literal(self):
+        Item.objects.create(id=uuid.uuid4(), serial_number='S1', name='Cordless DRILL', provider='Acme', price=1)
+        Item.objects.create(id=uuid.uuid4(), serial_number='S2', name='Drill bit 5%', provider='Bosch', price=1)
+        search = lambda q: sorted(filter_items(Item.objects.all(), {'q': q}).values_list('serial_number', flat=True))
+        self.assertEqual(search('drill'), ['S1', 'S2'])
+        self.assertEqual(search('drill acme'), ['S1'])
+        self.assertEqual(search('5%'), ['S2'])
+        self.assertEqual(search('l_d'), [])
+
+
+class ItemBatchTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def setUp(self):
+        self.item = Item.objects.create(id=uuid.uuid4(), serial_number='B1', name='a', price=1, version=2)
+
+    def post(self, operations):
+        request = RequestFactory().post('/items/batch/', json.dumps({'operations': operations}), content_type='application/json')
+        roles = (True, None, ['admin'])
+        with mock.patch.object(views, 'get_role_by_id', return_value=roles), \
+                mock.patch.object(service, 'get_role_by_id', return_value=roles):
+            response = views.item_batch_page(request)
+        return response, json.loads(response.content)
+
+    def test_results_come_back_per_operation(self):
+        response, body = self.post([
+            {'op': 'create', 'fields': {'serial_number': 'B2', 'name': 'b'}},
+            {'op': 'update', 'id': str(self.item.id), 'version': 2, 'fields': {'name': 'c'}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((body['applied'], body['error_count']), (True, 0))
+        self.assertEqual([(r['index'], r['op'], r['status']) for r in body['results']], [(0, 'create', 'created'), (1, 'update', 'updated')])
+        self.assertEqual(body['results'][1]['version'], 3)
+        self.assertEqual(Item.objects.get(id=self.item.id).name, 'c')
+        self.assertTrue(Item.objects.filter(serial_number='B2').exists())
+
+    def test_one_invalid_operation_applies_nothing(self):
+        response, body = self.post([
+            {'op': 'create', 'fields': {'serial_number': 'B2', 'name': 'b'}},
+            {'op': 'delete', 'id': str(self.item.id)},
+            {'op': 'update', 'id': 'not-a-uuid', 'fields': {'name': 'c'}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((body['applied'], body['error_count']), (False, 1))
+        self.assertEqual(body['results'][2]['error'], 'Invalid item id')
+        self.assertEqual(list(Item.objects.values_list('serial_number', flat=True)), ['B1'])
+
+    def test_stale_version_is_a_conflict(self):
+        response, body = self.post([{'op': 'update', 'id': str(self.item.id), 'version': 1, 'fields': {'name': 'c'}}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(body['applied'])
+        self.assertEqual(body['results'][0]['error'], 'Version conflict, current version is 2')
+        self.assertEqual(Item.objects.get(id=self.item.id).name, 'a')
+
+    def test_boolean_version_is_rejected(self):
+        response, body = self.post([{'op': 'delete', 'id': str(self.item.id), 'version': True}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(body['results'][0]['error'], 'version must be an integer')
+        self.assertTrue(Item.objects.filter(id=self.item.id).exists())
+
+    @override_settings(ITEM_BATCH_MAX_OPERATIONS=2)
+    def test_operation_limit(self):
+        create = {'op': 'create', 'fields': {'serial_number': 'B9', 'name': 'x'}}
+        response, body = self.post([create] * 3)
+        self.assertEqual((response.status_code, body['error']), (400, 'A batch can have at most 2 operations'))
+        self.assertEqual(Item.objects.count(), 1)
+        response, body = self.post([create])
+        self.assertEqual(response.status_code, 200)
+
+
+# --------------------------------
+# Exports
+# --------------------------------
+class ExportTestCase(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def setUp(self):
+        Item.objects.bulk_create(
+            Item(id=uuid.uuid4(), serial_number=f'X{i:03d}', provider='p', name=f'item {i}', category='c', price=i + 0.25)
+            for i in range(40)
+        )
+
+    def download(self, params=None, **headers):
+        request = RequestFactory().get('/download/items/', params or {}, **headers)
+        roles = (True, None, ['admin'])
+        with mock.patch.object(views, 'get_role_by_id', return_value=roles), \
+                mock.patch.object(service, 'get_role_by_id', return_value=roles):
+            response = views.download_csv(request)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+
+class CsvExportTests(ExportTestCase):
+    def test_rows_are_buffered_into_chunks_of_the_configured_size(self):
+        rows = ((f'S{i:05d}', 'provider', 'name', 'category', 1.5) for i in range(6000))
+        chunks = list(stream_csv(rows, buffer_size=16 * 1024))
+        self.assertGreater(len(chunks), 3)
+        # Rows are written WRITE_BATCH_SIZE at a time, so a chunk overshoots by less than a batch
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk), 16 * 1024)
+            self.assertLess(len(chunk), 16 * 1024 + 500 * 40)
+        lines = ''.join(chunks).splitlines()
+        self.assertEqual((len(lines), lines[1]), (6001, 'S00000,provider,name,category,1.5'))
+
+    def test_download_streams_every_item_and_gzip_matches(self):
+        response, content = self.download()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(content.decode().splitlines()))
+        self.assertEqual(rows[0], ['Serial Number', 'Provider', 'Name', 'Category', 'Price'])
+        self.assertEqual(rows[1], ['X000', 'p', 'item 0', 'c', '0.25'])
+        self.assertEqual(len(rows), 41)
+
+        response, compressed = self.download({'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.csv.gz"'))
+        self.assertEqual(gzip.decompress(compressed), content)
+
+
+class ExportFormatTests(ExportTestCase):
+    def test_ndjson_keeps_prices_numeric(self):
+        response, content = self.download({'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(len(rows), 40)
+        self.assertEqual(
+            rows[1], {'serial_number': 'X001', 'provider': 'p', 'name': 'item 1', 'category': 'c', 'price': 1.25}
+        )
+
+    def test_format_comes_from_the_query_string_then_accept(self):
+        cases = [
+            ({}, '', 'text/csv'),
+            ({}, 'application/x-ndjson', 'application/x-ndjson'),
+            ({}, 'application/ndjson', 'application/x-ndjson'),
+            ({'format': 'csv'}, 'application/x-ndjson', 'text/csv'),
+            ({}, 'text/html', 'text/csv'),
+        ]
+        for params, accept, content_type in cases:
+            response, _ = self.download(params, HTTP_ACCEPT=accept)
+            self.assertEqual(response['Content-Type'], content_type, (params, accept))
+        self.assertEqual(self.download({'format': 'xml'})[0].status_code, 406)
+
+    def test_columnar_formats_are_406_without_pyarrow(self):
+        with mock.patch.object(exports, 'pyarrow', None):
+            response, content = self.download({'format': 'parquet'})
+            self.assertEqual(response.status_code, 406)
+            self.assertEqual(json.loads(content)['formats'], ['csv', 'ndjson'])
+            self.assertEqual(self.download(HTTP_ACCEPT='application/vnd.apache.arrow.stream')[0].status_code, 406)
+
+    @skipIf(exports.pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_and_arrow_round_trip(self):
+        _, content = self.download({'format': 'parquet'})
+        table = exports.pyarrow.parquet.read_table(exports.pyarrow.BufferReader(content))
+        self.assertEqual(table.num_rows, 40)
+        self.assertEqual(table.schema.field('price').type, exports.pyarrow.float64())
+        self.assertEqual(table.column('price')[3].as_py(), 3.25)
+
+        _, content = self.download({'format': 'arrow'})
+        table = exports.pyarrow.ipc.open_stream(content).read_all()
+        self.assertEqual(table.column('serial_number').to_pylist()[:2], ['X000', 'X001'])
+
+
+# --------------------------------
+# Item Aggregates
+# --------------------------------
+class ItemAggregatesTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def totals(self, dimension):
+        return {row['value']: (row['item_count'], row['price_total']) for row in get_item_aggregates()[dimension]}
+
+    def test_batch_keeps_totals_in_step_with_items(self):
+        result = apply_item_batch([
+            {'op': 'create', 'fields': {'serial_number': 'A1', 'provider': 'p1', 'name': 'a', 'category': 'c1', 'price': 10}},
+            {'op': 'create', 'fields': {'serial_number': 'A2', 'provider': 'p1', 'name': 'b', 'category': 'c1', 'price': 5}},
+            {'op': 'create', 'fields': {'serial_number': 'A3', 'provider': 'p2', 'name': 'c', 'price': 1}},
+        ])
+        self.assertTrue(result.applied)
+        self.assertEqual(self.totals('category'), {'c1': (2, 15.0), '': (1, 1.0)})
+
+        a1, a3 = Item.objects.get(serial_number='A1'), Item.objects.get(serial_number='A3')
+        apply_item_batch([
+            {'op': 'update', 'id': str(a1.id), 'fields': {'category': 'c2', 'price': 4}},
+            {'op': 'delete', 'id': str(a3.id)},
+        ])
+        self.assertEqual(self.totals('category'), {'c1': (1, 5.0), 'c2': (1, 4.0)})
+        self.assertEqual(self.totals('provider'), {'p1': (2, 9.0)})
+        self.assertEqual(get_item_aggregates()['totals'], {'item_count': 2, 'price_total': 9.0})
+
+        # Same totals when recomputed from scratch
+        rebuild_item_aggregates()
+        self.assertEqual(self.totals('category'), {'c1': (1, 5.0), 'c2': (1, 4.0)})
+
+    def test_inventory_version_only_moves_on_applied_batches(self):
+        version = get_inventory_state().version
+        apply_item_batch([{'op': 'create', 'fields': {'serial_number': 'V1', 'name': 'a'}}])
+        self.assertEqual(get_inventory_state().version, version + 1)
+
+        result = apply_item_batch([{'op': 'create', 'fields': {'serial_number': 'V1', 'name': 'b'}}])
+        self.assertFalse(result.applied)
+        self.assertEqual(get_inventory_state().version, version + 1)
+
+    def test_reading_totals_does_not_touch_items(self):
+        Item.objects.bulk_create(
+            Item(id=uuid.uuid4(), serial_number=f'S{i}', name='x', category=f'c{i % 3}', price=1) for i in range(30)
+        )
+        rebuild_item_aggregates()
+        with self.assertNumQueries(1):
+            aggregates = get_item_aggregates()
+        self.assertEqual(aggregates['totals']['item_count'], 30)
+
+    def test_csv_import_applies_totals_once_in_cents(self):
+        rows = ''.join(f'S{i},p,n,c{i % 2},0.1\n' for i in range(7))
+        with mock.patch.object(AggregateChanges, 'apply', autospec=True, side_effect=AggregateChanges.apply) as apply:
+            result = CsvItemImporter(batch_size=2).run(BytesIO(f'Serial Number,Provider,Name,Category,Price\n{rows}'.encode()))
+        self.assertEqual((result.created, apply.call_count), (7, 1))
+        self.assertEqual(ItemAggregate.objects.get(dimension='provider', value='p').price_cents, 70)
+        self.assertEqual(get_item_aggregates()['totals'], {'item_count': 7, 'price_total': 0.7})
+
+        # Upsert over several chunks: c0 items move to 0.2 each
+        rows = ''.join(f'S{i},p,n,c{i % 2},0.2\n' for i in range(0, 7, 2))
+        with mock.patch.object(AggregateChanges, 'apply', autospec=True, side_effect=AggregateChanges.apply) as apply:
+            CsvItemImporter(batch_size=2, mode='upsert').run(BytesIO(f'Serial Number,Provider,Name,Category,Price\n{rows}'.encode()))
+        self.assertEqual(apply.call_count, 1)
+        self.assertEqual(self.totals('category'), {'c0': (4, 0.8), 'c1': (3, 0.3)})
+
+
+# --------------------------------
+# Import jobs
+# --------------------------------
+class ImportJobQueueTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+    databases = {'default', 'jobs'}
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, IMPORT_JOB_MAX_ATTEMPTS=2))
+
+    def enqueue(self, serial_number):
+        upload = SimpleUploadedFile('items.csv', f'Serial Number,Provider,Name,Category,Price\n{serial_number},p,n,c,1\n'.encode())
+        return enqueue_import(upload)
+
+    def make_stale(self, job, attempts):
+        ImportJob.objects.filter(id=job.id).update(
+            status=ImportJob.RUNNING, attempts=attempts, heartbeat_at=now() - datetime.timedelta(hours=1),
+        )
+
+    def test_each_job_is_claimed_once_and_run(self):
+        first, second = self.enqueue('Q1'), self.enqueue('Q2')
+        claimed = [claim_next_job('worker-a'), claim_next_job('worker-b')]
+        self.assertEqual([job.id for job in claimed], [first.id, second.id])
+        self.assertIsNone(claim_next_job('worker-c'))
+
+        for job in claimed:
+            run_import_job(job)
+        self.assertEqual(
+            list(ImportJob.objects.order_by('created_at').values_list('status', 'worker', 'attempts')),
+            [(ImportJob.SUCCEEDED, 'worker-a', 1), (ImportJob.SUCCEEDED, 'worker-b', 1)],
+        )
+        self.assertEqual(Item.objects.filter(serial_number__in=['Q1', 'Q2']).count(), 2)
+        self.assertFalse(default_storage.exists(first.file_path))
+
+    def test_jobs_left_behind_are_requeued_then_failed(self):
+        retried, abandoned = self.enqueue('R1'), self.enqueue('R2')
+        self.make_stale(retried, attempts=1)
+        self.make_stale(abandoned, attempts=2)
+        # A job still reporting progress is left alone
+        running = self.enqueue('R3')
+        claim_next_job()
+
+        with self.assertLogs('breiflyplatform.import_jobs', 'WARNING'):
+            self.assertEqual(recover_stale_jobs(), (1, 1))
+        self.assertEqual(ImportJob.objects.get(id=running.id).status, ImportJob.RUNNING)
+        abandoned.refresh_from_db()
+        self.assertEqual(abandoned.status, ImportJob.FAILED)
+        self.assertFalse(default_storage.exists(abandoned.file_path))
+
+        job = claim_next_job()
+        self.assertEqual((job.id, job.attempts), (retried.id, 2))
+        run_import_job(job)
+        self.assertEqual(ImportJob.objects.get(id=retried.id).status, ImportJob.SUCCEEDED)
+
+    def test_polling_a_job_only_reads_it(self):
+        job = self.enqueue('S1')
+        self.make_stale(job, attempts=1)
+        request = RequestFactory().get(f'/upload/csv/jobs/{job.id}/')
+        with mock.patch.object(service, 'get_role_by_id', return_value=(True, None, ['admin'])), \
+                mock.patch('breiflyplatform.import_jobs.start_workers') as start_workers, \
+                self.assertNumQueries(1, using='jobs'):
+            response = service.get_import_job(request, job.id)
+        self.assertEqual(json.loads(response.content)['status'], ImportJob.RUNNING)
+        start_workers.assert_not_called()
+
+
+# --------------------------------
+# Offers
+# --------------------------------
+class OfferTests(UnmanagedTablesTestCase):
+    unmanaged_models = [User, Item, PreviousOffer]
+
+    def setUp(self):
+        self.user = User.objects.create(id=uuid.uuid4(), email='buyer@example.com')
+        self.items = [
+            Item.objects.create(id=uuid.uuid4(), serial_number=f'O{i}', name=f'item {i}', price=2.5 * (i + 1))
+            for i in range(3)
+        ]
+
+    def test_offer_keeps_the_prices_it_was_made_with(self):
+        first, second, _ = self.items
+        with self.assertNumQueries(2):  # one read for every line, one insert
+            offer = build_offer(self.user.id, {first.id: 2, second.id: 1})
+        self.assertEqual(offer.total, 10.0)
+        self.assertEqual([line['line_total'] for line in offer.items], [5.0, 5.0])
+
+        Item.objects.filter(id=first.id).update(price=100)
+        offer.refresh_from_db()
+        self.assertEqual(offer.items[0]['price'], 2.5)
+
+    def test_history_is_newest_first_and_filters_by_item(self):
+        first, second, third = self.items
+        offers = [build_offer(self.user.id, {item.id: 1}) for item in (first, second, first)]
+
+        page = offer_history(per_page=2)
+        self.assertEqual([row['id'] for row in page], [offers[2].id, offers[1].id])
+        page = offer_history(cursor=page.next_cursor, per_page=2)
+        self.assertEqual([row['id'] for row in page], [offers[0].id])
+        self.assertIsNone(page.next_cursor)
+
+        # The item filter is a JSON containment lookup, which SQLite doesn't have
+        if connection.vendor == 'postgresql':
+            self.assertEqual(
+                [row['id'] for row in offer_history(item_id=first.id)], [offers[2].id, offers[0].id]
+            )
+            self.assertEqual(list(offer_history(item_id=third.id)), [])
+
+
+# --------------------------------
+# Pricing
+# --------------------------------
+class PricingTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def setUp(self):
+        reset_price_tables()
+        Item.objects.bulk_create([
+            Item(id=uuid.uuid4(), serial_number='P1', name='a', category='c1', price=0.1),
+            Item(id=uuid.uuid4(), serial_number='P2', name='b', category='c1', price=0.2),
+            Item(id=uuid.uuid4(), serial_number='P3', name='c', category=None, price=2.675),
+        ])
+
+    def test_amounts_are_exact_cents(self):
+        self.assertEqual(to_cents(0.1) + to_cents(0.2), to_cents(0.3))
+        self.assertEqual(to_cents(2.675), 268)
+        quote = Quote(10005, discount_rate=1000, tax_rate=2100)  # 10% off, 21% tax
+        self.assertEqual((quote.discount, quote.tax, quote.total), (1001, 1891, 10895))
+
+    def test_valuation_follows_the_inventory_version(self):
+        valuation = get_price_table('category').valuation()
+        self.assertEqual(
+            [(group['value'], group['item_count'], group['total']) for group in valuation['category']],
+            [('', 1, 2.68), ('c1', 2, 0.3)],
+        )
+        with self.assertNumQueries(1):  # just the version check
+            get_price_table('category')
+
+        apply_item_batch([{'op': 'create', 'fields': {'serial_number': 'P4', 'name': 'd', 'category': 'c1', 'price': 5}}])
+        self.assertEqual(get_price_table('category').valuation()['totals']['total'], 7.98)
+
+    ROUNDING_CASES = [
+        (2.675, 268), (-2.675, -268), (1.005, 101), (-1.005, -101), (0.125, 13), (-0.125, -13),
+        (1234.565, 123457), (-0.005, -1), (0.1 + 0.2, 30), (None, 0),
+    ]
+
+    def test_to_cents_rounds_half_away_from_zero(self):
+        self.assertEqual([to_cents(price) for price, _ in self.ROUNDING_CASES], [cents for _, cents in self.ROUNDING_CASES])
+
+    # SQLite has no decimal type, so its ROUND works on the double (1.005 * 100 is 100.4999...)
+    @skipIf(connection.vendor != 'postgresql', 'PRICE_CENTS only matches to_cents on Postgres')
+    def test_database_and_python_round_the_same_way(self):
+        Item.objects.all().delete()
+        Item.objects.bulk_create(
+            Item(id=uuid.uuid4(), serial_number=f'R{i}', name='r', category=str(i), price=price)
+            for i, (price, _) in enumerate(self.ROUNDING_CASES)
+        )
+        table = get_price_table('category')
+        self.assertEqual(
+            [table.cents[start] for _, start, _ in sorted(table.groups, key=lambda group: int(group[0]))],
+            [to_cents(price) for price, _ in self.ROUNDING_CASES],
+        )
+
+
+# --------------------------------
+# Item change feed
+# --------------------------------
+class ItemChangeFeedTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def test_feed_replays_every_write_path(self):
+        apply_item_batch([
+            {'op': 'create', 'fields': {'serial_number': 'F1', 'name': 'a', 'price': 1}},
+            {'op': 'create', 'fields': {'serial_number': 'F2', 'name': 'b', 'price': 2}},
+        ])
+        first = changes_since(0)
+        self.assertEqual([(c['action'], c['serial_number']) for c in first.changes], [('upsert', 'F1'), ('upsert', 'F2')])
+
+        f1, f2 = Item.objects.get(serial_number='F1'), Item.objects.get(serial_number='F2')
+        apply_item_batch([{'op': 'delete', 'id': str(f2.id)}])
+        CsvItemImporter(mode='upsert').run(BytesIO(b'Serial Number,Provider,Name,Category,Price\nF1,p,renamed,c,5\n'))
+
+        page = changes_since(first.next_cursor, limit=1)
+        self.assertEqual(page.changes, [{'cursor': page.next_cursor, 'action': 'delete', 'id': str(f2.id), 'serial_number': 'F2'}])
+        self.assertTrue(page.has_more)
+        page = changes_since(page.next_cursor)
+        self.assertEqual([(c['id'], c['name'], c['version']) for c in page.changes], [(str(f1.id), 'renamed', 2)])
+        self.assertFalse(page.has_more)
+        self.assertEqual(changes_since(page.next_cursor).changes, [])
+
+    def test_repeated_changes_collapse_to_the_latest(self):
+        apply_item_batch([{'op': 'create', 'fields': {'serial_number': 'G1', 'name': 'a'}}])
+        item = Item.objects.get(serial_number='G1')
+        for price in (1, 2, 3):
+            apply_item_batch([{'op': 'update', 'id': str(item.id), 'fields': {'price': price}}])
+        with self.assertNumQueries(2):
+            changes = changes_since(0).changes
+        self.assertEqual([(c['serial_number'], c['price']) for c in changes], [('G1', 3.0)])
+
+
+# --------------------------------
+# Conditional requests
+# --------------------------------
+class InventoryValidatorsTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def setUp(self):
+        caches['default'].clear()
+        apply_item_batch([{'op': 'create', 'fields': {'serial_number': 'E1', 'name': 'a', 'price': 1}}])
+
+    def get_items(self, **headers):
+        request = RequestFactory().get('/custom-admin/dashboard/items', HTTP_ACCEPT='application/json', **headers)
+        request.user_context = UserContext(True, None, ['admin'])
+        return views.item_management_page(request)
+
+    def download(self, export_format='csv', **headers):
+        request = RequestFactory().get('/download/items/', {'format': export_format}, **headers)
+        roles = (True, None, ['admin'])
+        with mock.patch.object(views, 'get_role_by_id', return_value=roles), \
+                mock.patch.object(service, 'get_role_by_id', return_value=roles):
+            return views.download_csv(request)
+
+    def test_matching_etag_gets_304_until_a_write(self):
+        response = self.get_items()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # Only the inventory version is read
+        with self.assertNumQueries(1):
+            response = self.get_items(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag'], response.content), (304, etag, b''))
+
+        version = get_inventory_state().version
+        apply_item_batch([{'op': 'create', 'fields': {'serial_number': 'E2', 'name': 'b'}}])
+        self.assertEqual(get_inventory_state().version, version + 1)
+        response = self.get_items(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(json.loads(response.content)['items']), 2)
+
+    def test_download_revalidates_against_the_inventory_version(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.download(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Another format is another representation
+        self.assertNotEqual(self.download('ndjson')['ETag'], etag)
+
+        item = Item.objects.get(serial_number='E1')
+        apply_item_batch([{'op': 'update', 'id': str(item.id), 'fields': {'price': 2}}])
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'E1', b''.join(response.streaming_content))
+
+
+# --------------------------------
+# Page cache
+# --------------------------------
+class ItemListingFragmentCacheTests(UnmanagedTablesTestCase):
+    unmanaged_models = [Item]
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def get_page(self):
+        request = RequestFactory().get('/custom-admin/dashboard/items')
+        request.user_context = UserContext(True, None, ['admin'])
+        response = views.item_management_page(request)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_cached_list_is_refreshed_by_item_writes(self):
+        apply_item_batch([{'op': 'create', 'fields': {'serial_number': 'A1', 'name': 'first'}}])
+        self.assertIn('first', self.get_page())
+
+        # Only the inventory version is read on a hit
+        with self.assertNumQueries(1):
+            self.assertIn('first', self.get_page())
+
+        apply_item_batch([{'op': 'create', 'fields': {'serial_number': 'A2', 'name': 'second'}}])
+        self.assertIn('second', self.get_page())
+
+
+# --------------------------------
+# Metrics
+# --------------------------------
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_queries_are_counted_per_request(self):
+        def view(request):
+            with connection.cursor() as cursor:
+                for _ in range(3):
+                    cursor.execute('SELECT 1')
+            return HttpResponse('ok')
+
+        # Called straight, without URL resolution, so the view is reported as unresolved
+        response = MetricsMiddleware(view)(RequestFactory().get('/somewhere'))
+
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+        self.assertEqual(registry.views['unresolved'][0], 3)
+        self.assertIn('breifly_db_queries_total{view="unresolved"} 3', registry.render())
+
+    def test_connects_are_exported_per_alias(self):
+        stats = connection_metrics.ConnectionStats()
+        stats.record('default', 0.25)
+        stats.record('default', 0.5)
+        stats.record('jobs', 0.125)
+        with mock.patch.object(connection_metrics, 'connection_stats', stats):
+            rendered = registry.render()
+        self.assertIn('breifly_db_connects_total{alias="default"} 2', rendered)
+        self.assertIn('breifly_db_connects_total{alias="jobs"} 1', rendered)
+        self.assertIn('breifly_db_connect_seconds_total{alias="default"} 0.75', rendered)
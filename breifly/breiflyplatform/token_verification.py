@@ -0,0 +1,387 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .metrics import metric_lines, registry, timed_external
+from .auth_backends import get_auth_backend
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+from collections import OrderedDict
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class TokenVerificationError(Exception):
+    """
+    Raised when a token is well formed enough to check and fails the check
+    (bad signature, expired, wrong audience).
+    """
+
+
+class UnknownSigningKey(Exception):
+    """
+    Raised when the token was signed with a key we can't verify locally.
+    The caller falls back to asking Supabase.
+    """
+
+
+class VerifiedUser:
+    """
+    Minimal stand-in for the Supabase User object, built from verified JWT claims.
+    Exposes the attributes the views and templates read from `user_data`.
+    """
+    def __init__(self, claims):
+        self.id = claims.get('sub')
+        self.email = claims.get('email')
+        self.phone = claims.get('phone')
+        self.role = claims.get('role')
+        self.aud = claims.get('aud')
+        self.app_metadata = claims.get('app_metadata') or {}
+        self.user_metadata = claims.get('user_metadata') or {}
+
+    @classmethod
+    def from_auth_user(cls, user):
+        """
+        Builds one from a user object returned by the Supabase Auth API.
+        """
+        return cls({**user, 'sub': user.get('id')})
+
+    def __repr__(self):
+        return f"VerifiedUser(id={self.id!r}, email={self.email!r})"
+
+
+def _b64decode(segment):
+    """
+    Decodes a base64url segment, restoring the padding JWTs strip off.
+    """
+    if isinstance(segment, str):
+        segment = segment.encode('ascii')
+    return base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4))
+
+
+def _b64_to_int(segment):
+    return int.from_bytes(_b64decode(segment), 'big')
+
+
+def split_token(token):
+    """
+    Splits a compact JWT into (header, claims, signing_input, signature).
+    """
+    try:
+        header_segment, payload_segment, signature_segment = token.split('.')
+        header = json.loads(_b64decode(header_segment))
+        claims = json.loads(_b64decode(payload_segment))
+        signature = _b64decode(signature_segment)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise TokenVerificationError(f"Malformed token: {e}")
+    signing_input = f"{header_segment}.{payload_segment}".encode('ascii')
+    return header, claims, signing_input, signature
+
+
+# --------------------------------
+# Signing keys
+# --------------------------------
+class JWKSKeyStore:
+    """
+    Caches the public keys published at the Supabase JWKS endpoint, keyed by `kid`.
+    Unknown key ids trigger a refetch, at most once per `min_refresh_interval`.
+    """
+    def __init__(self, url, ttl=600, min_refresh_interval=60):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, kid):
+        if not self.url:
+            return None
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        stale = now - self._fetched_at > self.ttl
+        if key is not None and not stale:
+            return key
+        if stale or now - self._fetched_at > self.min_refresh_interval:
+            self._refresh(self._fetched_at)
+        return self._keys.get(kid)
+
+    def _refresh(self, seen_fetched_at):
+        with self._lock:
+            # Another thread refreshed while we waited for the lock
+            if self._fetched_at != seen_fetched_at:
+                return
+            try:
+                with timed_external('supabase'):
+                    response = requests.get(self.url, timeout=5)
+                response.raise_for_status()
+                jwks = response.json()
+            except Exception as e:
+                logger.warning(f"Could not fetch JWKS from {self.url}: {e}")
+                # Don't hammer the endpoint when it's down
+                self._fetched_at = time.monotonic()
+                return
+
+            keys = {}
+            for jwk in jwks.get('keys', []):
+                try:
+                    keys[jwk.get('kid')] = self._load_key(jwk)
+                except (KeyError, ValueError) as e:
+                    logger.warning(f"Skipping unusable JWK {jwk.get('kid')}: {e}")
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    @staticmethod
+    def _load_key(jwk):
+        if jwk['kty'] == 'RSA':
+            return rsa.RSAPublicNumbers(_b64_to_int(jwk['e']), _b64_to_int(jwk['n'])).public_key()
+        if jwk['kty'] == 'EC' and jwk.get('crv') == 'P-256':
+            return ec.EllipticCurvePublicNumbers(
+                _b64_to_int(jwk['x']), _b64_to_int(jwk['y']), ec.SECP256R1()
+            ).public_key()
+        raise ValueError(f"Unsupported key type {jwk.get('kty')}/{jwk.get('crv')}")
+
+
+# --------------------------------
+# Verifier
+# --------------------------------
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens locally and caches the result.
+
+    HS256 tokens are checked against the project's JWT secret, RS256/ES256 tokens
+    against the JWKS key store. Verified tokens are kept in a bounded LRU cache until
+    the earlier of their `exp` or `ttl` seconds. Tokens we have no key for go to
+    the auth backend (Supabase Auth's /user) and the answer is cached the same way.
+
+    Note that a locally verified token stays valid until it expires, even if the
+    session was revoked on the Supabase side in the meantime.
+    """
+    def __init__(self, secret=None, audience=None, jwks_url=None, ttl=300, max_size=1024, leeway=0):
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.audience = audience
+        self.keys = JWKSKeyStore(jwks_url)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.leeway = leeway
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.local_verifications = 0
+        self.remote_calls = 0
+        self.rejections = 0
+
+    def verify(self, token):
+        """
+        Returns the user the token belongs to, or None if the token is not valid.
+        Errors from the remote fallback propagate to the caller.
+        """
+        cache_key = hashlib.sha256(token.encode('utf-8')).digest()
+        user = self._cache_get(cache_key)
+        if user is not None:
+            return user
+
+        try:
+            user, expires_at = self._verify_locally(token)
+            self._count('local_verifications')
+        except TokenVerificationError as e:
+            self._count('rejections')
+            logger.info(f"Rejected access token: {e}")
+            return None
+        except UnknownSigningKey:
+            user, expires_at = self._verify_remotely(token)
+            if user is None:
+                self._count('rejections')
+                return None
+
+        self._cache_set(cache_key, user, expires_at)
+        return user
+
+    async def averify(self, token):
+        """
+        Async version of verify(). Local checks run in a worker thread (a JWKS
+        refresh may block); the remote fallback goes through the non-blocking
+        auth client.
+        """
+        cache_key = hashlib.sha256(token.encode('utf-8')).digest()
+        user = self._cache_get(cache_key)
+        if user is not None:
+            return user
+
+        try:
+            user, expires_at = await sync_to_async(self._verify_locally, thread_sensitive=False)(token)
+            self._count('local_verifications')
+        except TokenVerificationError as e:
+            self._count('rejections')
+            logger.info(f"Rejected access token: {e}")
+            return None
+        except UnknownSigningKey:
+            self._count('remote_calls')
+            data = await get_auth_backend().aget_user(token)
+            if data is None:
+                self._count('rejections')
+                return None
+            user, expires_at = VerifiedUser.from_auth_user(data), self._claimed_expiry(token)
+
+        self._cache_set(cache_key, user, expires_at)
+        return user
+
+    def invalidate(self, token):
+        with self._lock:
+            self._cache.pop(hashlib.sha256(token.encode('utf-8')).digest(), None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'local_verifications': self.local_verifications,
+                'remote_calls': self.remote_calls,
+                'rejections': self.rejections,
+                'size': len(self._cache),
+            }
+
+    def _count(self, counter):
+        # Request threads verify concurrently; += on an attribute is not atomic
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    # Cache ------------------------------------------------------------
+
+    def _cache_get(self, cache_key):
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                user, expires_at = entry
+                if expires_at > time.time():
+                    self._cache.move_to_end(cache_key)
+                    self.hits += 1
+                    return user
+                del self._cache[cache_key]
+            self.misses += 1
+            return None
+
+    def _cache_set(self, cache_key, user, expires_at):
+        expires_at = min(expires_at, time.time() + self.ttl)
+        with self._lock:
+            self._cache[cache_key] = (user, expires_at)
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    # Verification -----------------------------------------------------
+
+    def _verify_locally(self, token):
+        header, claims, signing_input, signature = split_token(token)
+        self._check_signature(header, signing_input, signature)
+        self._check_claims(claims)
+        if not claims.get('sub'):
+            raise TokenVerificationError("Token has no subject")
+        return VerifiedUser(claims), float(claims['exp'])
+
+    def _check_signature(self, header, signing_input, signature):
+        alg = header.get('alg')
+        if alg == 'HS256':
+            if not self.secret:
+                raise UnknownSigningKey(alg)
+            expected = hmac.new(self.secret, signing_input, hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, signature):
+                raise TokenVerificationError("Invalid signature")
+            return
+
+        if alg not in ('RS256', 'ES256'):
+            raise UnknownSigningKey(alg)
+        key = self.keys.get(header.get('kid'))
+        if key is None:
+            raise UnknownSigningKey(header.get('kid'))
+        try:
+            if alg == 'RS256' and isinstance(key, rsa.RSAPublicKey):
+                key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+            elif alg == 'ES256' and isinstance(key, ec.EllipticCurvePublicKey):
+                if len(signature) != 64:
+                    raise TokenVerificationError("Invalid signature length")
+                der_signature = encode_dss_signature(
+                    int.from_bytes(signature[:32], 'big'), int.from_bytes(signature[32:], 'big')
+                )
+                key.verify(der_signature, signing_input, ec.ECDSA(hashes.SHA256()))
+            else:
+                raise TokenVerificationError(f"Key type does not match algorithm {alg}")
+        except InvalidSignature:
+            raise TokenVerificationError("Invalid signature")
+
+    def _check_claims(self, claims):
+        now = time.time()
+        exp = claims.get('exp')
+        if not isinstance(exp, (int, float)):
+            raise TokenVerificationError("Token has no expiry")
+        if exp + self.leeway < now:
+            raise TokenVerificationError("Token expired")
+        nbf = claims.get('nbf')
+        if isinstance(nbf, (int, float)) and nbf - self.leeway > now:
+            raise TokenVerificationError("Token not yet valid")
+        if self.audience:
+            aud = claims.get('aud')
+            audiences = aud if isinstance(aud, list) else [aud]
+            if self.audience not in audiences:
+                raise TokenVerificationError("Invalid audience")
+
+    def _verify_remotely(self, token):
+        self._count('remote_calls')
+        data = get_auth_backend().get_user(token)
+        if data is None:
+            return None, 0
+
+        return VerifiedUser.from_auth_user(data), self._claimed_expiry(token)
+
+    def _claimed_expiry(self, token):
+        # We didn't check the signature, but Supabase did; the claimed expiry bounds the cache entry
+        try:
+            _, claims, _, _ = split_token(token)
+            return float(claims.get('exp', 0)) or time.time() + self.ttl
+        except TokenVerificationError:
+            return time.time() + self.ttl
+
+
+token_verifier = TokenVerifier(
+    secret=settings.SUPABASE_JWT_SECRET,
+    audience=settings.SUPABASE_JWT_AUDIENCE,
+    jwks_url=settings.SUPABASE_JWKS_URL,
+    ttl=settings.TOKEN_CACHE_TTL,
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    leeway=settings.TOKEN_CLOCK_LEEWAY,
+)
+
+
+def token_metrics():
+    """
+    The verifier's counters for /metrics/ (see metrics.py).
+    """
+    stats = token_verifier.stats()
+    return [
+        *metric_lines(
+            'breifly_token_cache_lookups_total', 'Access token cache lookups.', 'counter',
+            [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])],
+        ),
+        *metric_lines(
+            'breifly_token_verifications_total', 'Access tokens verified, locally or by the auth backend.', 'counter',
+            [({'method': 'local'}, stats['local_verifications']), ({'method': 'remote'}, stats['remote_calls'])],
+        ),
+        *metric_lines('breifly_token_rejections_total', 'Access tokens rejected.', 'counter', [({}, stats['rejections'])]),
+        *metric_lines('breifly_token_cache_entries', 'Verified tokens in the cache.', 'gauge', [({}, stats['size'])]),
+    ]
+
+
+registry.register(token_metrics)
@@ -0,0 +1,90 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextvars import ContextVar
+from django.utils.functional import SimpleLazyObject
+from .authorization import resolve_request_roles
+
+_current = ContextVar('user_context', default=None)
+
+
+class UserContext:
+    """
+    Who is making the current request: whether their token checked out, the verified
+    user and their role names. Bound to the request by UserContextMiddleware, never
+    to a shared client, so concurrent requests in one process can't see each other's user.
+    """
+    def __init__(self, authenticated=False, user=None, roles=()):
+        self.authenticated = authenticated
+        self.user = user
+        self.roles = list(roles)
+
+    @property
+    def user_id(self):
+        return self.user.id if self.user is not None else None
+
+    @property
+    def is_admin(self):
+        return 'admin' in self.roles
+
+    def as_tuple(self):
+        # The (user_authenticated, user_data, roles) triple the views unpack
+        return self.authenticated, self.user, self.roles
+
+    def __repr__(self):
+        return f"UserContext(user_id={self.user_id!r}, roles={self.roles!r})"
+
+
+ANONYMOUS = UserContext()
+
+
+def user_context_for(request):
+    """
+    The request's UserContext. Resolved from the session token the first time it is
+    read (see authorization.resolve_request_roles), then reused for the rest of the request.
+    """
+    context = getattr(request, 'user_context', None)
+    if context is None:
+        context = request.user_context = SimpleLazyObject(lambda: UserContext(*resolve_request_roles(request)))
+    return context
+
+
+def get_user_context():
+    """
+    The UserContext of the request being handled by this thread / task, for code
+    that isn't handed the request. Anonymous outside a request.
+    """
+    context = _current.get()
+    return context if context is not None else ANONYMOUS
+
+
+class UserContextMiddleware:
+    """
+    Attaches the caller's UserContext to the request and makes it the current one
+    for the duration of the request. Needs SessionMiddleware before it.
+
+    The context is lazy, so requests that never look at the user (static files, the
+    metrics endpoint) don't verify a token. Async views resolve it with
+    authorization.aresolve_request_roles first, after which reading it costs nothing.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current.set(user_context_for(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        token = _current.set(user_context_for(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
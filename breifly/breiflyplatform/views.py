@@ -9,14 +9,16 @@ from django.shortcuts import render, redirect
 from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
 import pytz
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from .supabase_client import supabase
 from .helper_functions import wants_json_response
+from .pagination import InvalidCursor, check_cursor, encode_cursor
+from .exports import EXPORT_FORMATS, gzip_stream, negotiate_export_format
+from .item_search import category_facets, parse_item_filters
+from .inventory_state import InventoryValidators
+from .page_cache import fragment_context, get_items_version, get_user_directory_version, lazy
 import csv
 import os
 import logging
 from .service import *
-from io import StringIO  
 
 logger = logging.getLogger(__name__)
 
@@ -89,6 +91,9 @@ def admin_page(request):
                     'user': user_data,
                     'roles': roles,
                     'navbar_partial': 'partials/admin_authenticated_navbar.html',
+                    # Only queried when the cached totals are stale, see page_cache.py
+                    'aggregates': lazy(get_item_aggregates),
+                    **fragment_context(roles, get_items_version(), 'dashboard'),
                 })
             else:
                 return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -116,27 +121,21 @@ def user_management_page(request, id=None):
 
         if "admin" in roles:
             if request.method == "GET":
-                all_users = get_all_users(request=request)
-                paginator = Paginator(all_users, 5)
                 page = request.GET.get('page')
-                try:
-                    users = paginator.page(page)
-                except PageNotAnInteger:
-                    users = paginator.page(1)
-                except EmptyPage:
-                    users = paginator.page(paginator.num_pages)
                 return render(request, 'user_management.html', {
                     'title': 'Invecta - User Management',
                     'user_authenticated': user_authenticated,
                     'user': user_data,
                     'roles': roles,
                     'navbar_partial': 'partials/admin_authenticated_navbar.html',
-                    'users': users,
+                    # Only queried when the cached list is stale, see page_cache.py
+                    'users': lazy(lambda: get_users_page(request=request, page=page)),
+                    **fragment_context(roles, get_user_directory_version(), 'users', page),
                 })
             elif request.method == "PUT":
                 return update_role(request=request, id=id)
             elif request.method == "DELETE":
-                return delete_user(id=id)
+                return delete_user(request, id=id)
             else:
                 return JsonResponse({'error': 'Method not allowed'}, status=405)
         else:
@@ -150,7 +149,7 @@ def user_management_page(request, id=None):
 def item_management_page(request, id=None):
     """
     Item management page allowing admins to edit, add, view, and delete stock items.
-    Handles GET, PUT, DELETE, and POST requests.
+    Handles GET, PUT, PATCH, DELETE, and POST requests.
     """
     try:
         user_authenticated, user_data, roles = get_role_by_id(request=request)
@@ -167,31 +166,15 @@ def item_management_page(request, id=None):
             return render(request, '404.html', status=403)
 
         if request.method == "GET":
-            all_items = get_all_items(request=request)
-            paginator = Paginator(all_items, 5)
-            page = request.GET.get('page')
-            try:
-                items = paginator.page(page)
-            except PageNotAnInteger:
-                items = paginator.page(1)
-            except EmptyPage:
-                items = paginator.page(paginator.num_pages)
-            return render(request, 'stock_management.html', {
-                'title': 'Invecta - Stock Management',
-                'user_authenticated': user_authenticated,
-                'user': user_data,
-                'roles': roles,
-                'navbar_partial': 'partials/admin_authenticated_navbar.html',
-                'items': items,
-            })
-        elif request.method == "PUT":
+            return item_listing(request, user_authenticated, user_data, roles)
+        elif request.method in ("PUT", "PATCH"):
             if id is None:
-                return JsonResponse({'error': 'Item ID is required for PUT requests'}, status=400)
+                return JsonResponse({'error': f'Item ID is required for {request.method} requests'}, status=400)
             return update_item(request, id=id)
         elif request.method == "DELETE":
             if id is None:
                 return JsonResponse({'error': 'Item ID is required for DELETE requests'}, status=400)
-            return delete_item(id=id)
+            return delete_item(request, id=id)
         elif request.method == "POST":
             return create_item(request)
         else:
@@ -202,9 +185,196 @@ def item_management_page(request, id=None):
         return render(request, '404.html', status=500)
 
 
+def item_listing(request, user_authenticated, user_data, roles):
+    """
+    GET of the item management page: the HTML page or, for JSON clients, a page of items.
+    Shared by the sync and async views.
+    """
+    try:
+        filters = parse_item_filters(request.GET)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid price range'}, status=400)
+    # Checked here: the HTML page only runs the query on a fragment cache miss
+    try:
+        check_cursor(request.GET.get('after'), Item._meta.get_field('serial_number'), Item._meta.get_field('id'))
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    # JSON clients (sync scripts) can revalidate with If-None-Match / If-Modified-Since
+    validators = None
+    if wants_json_response(request):
+        validators = InventoryValidators(request, 'items', request.GET.urlencode())
+        not_modified = validators.not_modified()
+        if not_modified is not None:
+            return not_modified
+    def load_items():
+        return get_items_page(
+            request=request,
+            page=request.GET.get('page'),
+            cursor=request.GET.get('after'),
+            filters=filters,
+        )
+
+    if wants_json_response(request):
+        payload = items_page_payload(load_items())
+        if request.GET.get('facets') in ('1', 'true'):
+            payload['facets'] = {'category': category_facets(Item.objects.all(), filters)}
+        return validators.apply(JsonResponse(payload))
+    # The list is only queried when the cached fragment is stale, see page_cache.py
+    items = lazy(load_items)
+    # Filters are kept on the pagination links
+    query = request.GET.copy()
+    query.pop('page', None)
+    query.pop('after', None)
+    return render(request, 'stock_management.html', {
+        'title': 'Invecta - Stock Management',
+        'user_authenticated': user_authenticated,
+        'user': user_data,
+        'roles': roles,
+        'navbar_partial': 'partials/admin_authenticated_navbar.html',
+        'items': items,
+        'page_range': lazy(
+            lambda: [] if getattr(items, 'is_keyset', False) else list(items.paginator.get_elided_page_range(items.number))
+        ),
+        'filters': filters,
+        'query_string': query.urlencode(),
+        **fragment_context(roles, get_items_version(), 'items', request.GET.urlencode()),
+    })
+
+
+def items_page_payload(items):
+    """
+    JSON body for a page of items, for either pagination mode.
+    """
+    rows = list(items.object_list)
+    payload = {'items': rows}
+    if getattr(items, 'is_keyset', False):
+        payload['next_cursor'] = items.next_cursor
+    else:
+        payload.update({
+            'page': items.number,
+            'num_pages': items.paginator.num_pages,
+            'count': items.paginator.count,
+            'next_cursor': None,
+        })
+        if items.has_next() and rows:
+            last = rows[-1]
+            payload['next_cursor'] = encode_cursor([last['serial_number'], last['item_id']])
+    return payload
+
+
+def item_batch_page(request):
+    """
+    Applies many item creates, updates and deletes in one request and one transaction.
+    """
+    try:
+        user_authenticated, user_data, roles = get_role_by_id(request=request)
+
+        if not user_authenticated:
+            return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+        if "admin" not in roles:
+            return JsonResponse({'error': 'Not authorized'}, status=403)
+
+        if request.method == "POST":
+            return batch_items(request)
+        else:
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def offers_page(request, id=None):
+    """
+    Offers (quotes): GET lists the offer history, or one offer with its lines when
+    an id is given; POST builds a new offer.
+    """
+    try:
+        user_authenticated, user_data, roles = get_role_by_id(request=request)
+
+        if not user_authenticated:
+            return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+        if request.method == "GET":
+            if id is not None:
+                return get_offer(request, id=id)
+            return list_offers(request)
+        elif request.method == "POST" and id is None:
+            return create_offer(request)
+        else:
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def item_aggregates_page(request):
+    """
+    Stock count and value per category and provider, as JSON.
+    """
+    try:
+        user_authenticated, user_data, roles = get_role_by_id(request=request)
+
+        if not user_authenticated:
+            return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+        if "admin" not in roles:
+            return JsonResponse({'error': 'Not authorized'}, status=403)
+
+        if request.method == "GET":
+            return get_inventory_aggregates(request)
+        else:
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def item_valuation_page(request):
+    """
+    Stock value per category or provider, with optional discount and tax, as JSON.
+    """
+    try:
+        user_authenticated, user_data, roles = get_role_by_id(request=request)
+
+        if not user_authenticated:
+            return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+        if "admin" not in roles:
+            return JsonResponse({'error': 'Not authorized'}, status=403)
+
+        if request.method == "GET":
+            return get_inventory_valuation(request)
+        else:
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def item_changes_page(request):
+    """
+    Changes to the items since a cursor, for incremental syncs, as JSON.
+    """
+    try:
+        user_authenticated, user_data, roles = get_role_by_id(request=request)
+
+        if not user_authenticated:
+            return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+        if "admin" not in roles:
+            return JsonResponse({'error': 'Not authorized'}, status=403)
+
+        if request.method == "GET":
+            return get_item_changes(request)
+        else:
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
 def download_csv(request):
     """
-    Generates a CSV file to download.
+    Generates a file to download with every item.
+    CSV by default; ?format=ndjson|parquet|arrow (or a matching Accept header)
+    picks another format, see exports.EXPORT_FORMATS. The X-Changes-Cursor header
+    is where to follow /items/changes/ from to keep the copy up to date.
     """
     try:
         user_authenticated, user_data, roles = get_role_by_id(request=request)
@@ -220,29 +390,37 @@ def download_csv(request):
             return render(request, '404.html', status=403)
 
         if request.method == "GET":
-            items = get_download_all_items(request=request)
-
-            def rows(items):
-                yield ["Serial Number", "Provider", "Name", "Category", "Price"]
-                for item in items:
-                    yield [item.serial_number, item.provider, item.name, item.category, item.price]
-
-            def generate_csv(rows_generator):
-                output = StringIO()
-                writer = csv.writer(output)
-                for row in rows_generator:
-                    writer.writerow(row)
-                    yield output.getvalue()
-                    output.seek(0)
-                    output.truncate(0)
-
-            response = StreamingHttpResponse(
-                generate_csv(rows(items)),
-                content_type='text/csv'
+            export_format = negotiate_export_format(
+                request.GET.get('format'), request.headers.get('Accept', '')
             )
+            if export_format is None or not export_format.available:
+                return JsonResponse({
+                    'error': 'Formato de exportacion no disponible',
+                    'formats': [f.name for f in EXPORT_FORMATS.values() if f.available],
+                }, status=406)
+
+            compress = request.GET.get('compress') == 'gzip' and not export_format.columnar
+            validators = InventoryValidators(request, 'export', export_format.name, compress)
+            not_modified = validators.not_modified()
+            if not_modified is not None:
+                return not_modified
+
+            # Read before the export query runs, so following the change feed from
+            # here misses nothing the file doesn't have
+            changes_cursor = get_changes_cursor()
+            rows = get_download_all_items(request=request)
             date_str = datetime.datetime.now().strftime("%Y-%m-%d")
-            response['Content-Disposition'] = f'attachment; filename="exported_stock_item_data_{date_str}.csv"'
-            return response
+            filename = f"exported_stock_item_data_{date_str}.{export_format.extension}"
+
+            # ?compress=gzip downloads a .gz of the text formats instead
+            if compress:
+                response = StreamingHttpResponse(gzip_stream(export_format.stream(rows)), content_type='application/gzip')
+                filename += '.gz'
+            else:
+                response = StreamingHttpResponse(export_format.stream(rows), content_type=export_format.content_type)
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            response['X-Changes-Cursor'] = str(changes_cursor)
+            return validators.apply(response)
 
         else:
             return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -269,6 +447,9 @@ def upload_csv(request):
             return render(request, '404.html', status=403)
 
         if request.method == "POST":
+            # Large files can be imported in the background, see import_csv_status
+            if request.POST.get('async') in ('1', 'true'):
+                return enqueue_csv_import(request=request)
             response = import_csv(request=request)
             return response
 
@@ -279,6 +460,26 @@ def upload_csv(request):
             return JsonResponse({'error': str(e)}, status=500)
         return render(request, '404.html', status=500)
 
+def import_csv_status(request, job_id):
+    """
+    Reports progress of a background CSV import.
+    """
+    try:
+        user_authenticated, user_data, roles = get_role_by_id(request=request)
+
+        if not user_authenticated:
+            return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+        if "admin" not in roles:
+            return JsonResponse({'error': 'Not authorized'}, status=403)
+
+        if request.method == "GET":
+            return get_import_job(request=request, job_id=job_id)
+        else:
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
 # --------------------------------
 # Error View
 # --------------------------------